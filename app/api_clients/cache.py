@@ -0,0 +1,264 @@
+# app/api_clients/cache.py
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from functools import wraps
+
+from . import shared_cache, rate_limiter, circuit_breaker
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# When enabled, a cold key is fetched by one process on the host while the others
+# wait for the result to appear in the shared cache.
+CROSS_PROCESS_SINGLEFLIGHT = os.environ.get('FMP_CROSS_PROCESS_SINGLEFLIGHT', '0') == '1'
+LOCK_TTL_SECONDS = 20
+LOCK_WAIT_SECONDS = 10
+LOCK_POLL_INTERVAL = 0.05
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def is_cacheable(value):
+    """Default policy: never cache failed (None) or empty upstream results."""
+    return value is not None and value != {} and value != []
+
+
+def make_key(name, args, kwargs):
+    """
+    Builds the cache key for a call. The same string is used by the in-process
+    tier and the shared tier, so every process agrees on what an entry is.
+    """
+    payload = [list(args), sorted(kwargs.items())] if kwargs else list(args)
+    return f"{name}:{json.dumps(payload, default=str, separators=(',', ':'))}"
+
+
+class TTLCache:
+    """
+    Two-tier cache: a thread-safe in-process LRU in front of the host-wide shared cache.
+    Entries expire after `ttl` seconds. Expired entries stay readable for a further
+    `stale_ttl` seconds so callers can serve them while a refresh runs in the background.
+    Older entries are retained as last-known-good values for get_last_good().
+    """
+    def __init__(self, name, ttl, stale_ttl=0, maxsize=256, shared=True):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.shared = shared
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'stale_hits': 0, 'misses': 0, 'fallbacks': 0}
+        with _registry_lock:
+            _registry[name] = self
+
+    def key_for(self, *args, **kwargs):
+        return make_key(self.name, args, kwargs)
+
+    def _count(self, counter):
+        with self._lock:
+            self.stats[counter] += 1
+
+    def _get_local(self, key, now):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, None
+            value, expires_at, stale_until = entry
+            if now < expires_at:
+                self._data.move_to_end(key)
+                return value, 'fresh'
+            if now < stale_until:
+                return value, 'stale'
+            if now >= stale_until + shared_cache.LAST_GOOD_SECONDS:
+                del self._data[key]
+            return None, None
+
+    def _set_local(self, key, value, expires_at, stale_until):
+        with self._lock:
+            self._data[key] = (value, expires_at, stale_until)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key):
+        """Returns (value, state) where state is 'fresh', 'stale' or None on a miss."""
+        now = time.time()
+        value, state = self._get_local(key, now)
+        if state == 'fresh':
+            self._count('local_hits')
+            return value, state
+
+        if self.shared:
+            shared_value, shared_state, expires_at = shared_cache.get(key)
+            if shared_state == 'fresh':
+                self._set_local(key, shared_value, expires_at, expires_at + self.stale_ttl)
+                self._count('shared_hits')
+                return shared_value, shared_state
+            if state is None and shared_state == 'stale':
+                value, state = shared_value, shared_state
+
+        self._count('stale_hits' if state == 'stale' else 'misses')
+        return value, state
+
+    def get_last_good(self, key):
+        """Returns the most recent value stored for `key` however old it is, or None."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is not None:
+            value = entry[0]
+        elif self.shared:
+            value = shared_cache.get_last_good(key)
+        else:
+            value = None
+        if value is not None:
+            self._count('fallbacks')
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        stale_until = expires_at + self.stale_ttl
+        self._set_local(key, value, expires_at, stale_until)
+        if self.shared:
+            shared_cache.set(key, value, expires_at, stale_until)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.shared:
+            shared_cache.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.shared:
+            shared_cache.delete_prefix(f"{self.name}:")
+
+    def wait_for_peer(self, key):
+        """
+        Polls the shared tier while another process holds the fetch lock for `key`.
+        Returns the value it stored, or None if the peer gave up or the wait timed out.
+        """
+        deadline = time.time() + LOCK_WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value, state, expires_at = shared_cache.get(key)
+            if state == 'fresh':
+                self._set_local(key, value, expires_at, expires_at + self.stale_ttl)
+                return value
+            if not shared_cache.is_locked(key):
+                break
+        return None
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_cache_stats():
+    """Returns per-endpoint hit counters and hit rates for every registered cache."""
+    stats = {}
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        counters = dict(cache.stats)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['stale_hits'] + counters['misses']
+        hits = counters['local_hits'] + counters['shared_hits'] + counters['stale_hits']
+        counters['hit_rate'] = round(hits / lookups, 4) if lookups else None
+        counters['entries'] = len(cache)
+        stats[cache.name] = counters
+    return stats
+
+
+def ttl_cache(ttl, stale_ttl=0, maxsize=256, cache_if=is_cacheable, shared=True):
+    """
+    Decorator replacing functools.lru_cache for upstream calls.
+    - Results expire after `ttl` seconds; failed/empty results are never stored.
+    - Lookups check the in-process tier first, then the shared host-wide tier.
+    - Within `stale_ttl` after expiry the old value is returned and refreshed in the background.
+    - Call with fresh=True to bypass the cache and store the new result.
+    - If the upstream fails (or its circuit is open), the last known good value is
+      returned instead and the response is marked stale (see circuit_breaker.mark_stale).
+    - Concurrent misses for one key run a single fetch; other threads wait for its result,
+      and with FMP_CROSS_PROCESS_SINGLEFLIGHT=1 other processes on the host wait too.
+    - wrapper.invalidate(*args) drops one entry, wrapper.cache_clear() drops all.
+    """
+    def decorator(func):
+        cache = TTLCache(func.__name__, ttl, stale_ttl=stale_ttl, maxsize=maxsize, shared=shared)
+        inflight = SingleFlight(func.__name__)
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        def _fetch_and_store(key, args, kwargs, fresh):
+            locked = False
+            if shared and CROSS_PROCESS_SINGLEFLIGHT and not fresh:
+                locked = shared_cache.try_acquire_lock(key, LOCK_TTL_SECONDS)
+                if not locked:
+                    value = cache.wait_for_peer(key)
+                    if value is not None:
+                        return value, False
+            try:
+                with circuit_breaker.failure_scope() as failures:
+                    value = func(*args, **kwargs)
+                if cache_if(value):
+                    cache.set(key, value)
+                    return value, False
+                if failures and not fresh:
+                    last_good = cache.get_last_good(key)
+                    if last_good is not None:
+                        logger.warning(f"Upstream failed for {func.__name__}{args}; serving last known good value.")
+                        return last_good, True
+                return value, False
+            finally:
+                if locked:
+                    shared_cache.release_lock(key)
+
+        def _load(key, args, kwargs, fresh=False):
+            value, from_fallback = inflight.do(key, _fetch_and_store, key, args, kwargs, fresh)
+            if from_fallback:
+                circuit_breaker.mark_stale(func.__name__)
+            return value
+
+        def _refresh_in_background(key, args, kwargs):
+            with refreshing_lock:
+                if key in refreshing:
+                    return
+                refreshing.add(key)
+
+            def _run():
+                # Runs in a copy of the caller's context; the stale set belongs to the caller's response
+                circuit_breaker.track_stale()
+                try:
+                    with rate_limiter.priority('warming'):
+                        _load(key, args, kwargs)
+                except Exception:
+                    logger.error(f"Background refresh failed for {func.__name__}{args}", exc_info=True)
+                finally:
+                    with refreshing_lock:
+                        refreshing.discard(key)
+
+            threading.Thread(target=contextvars.copy_context().run, args=(_run,),
+                             name=f"refresh-{func.__name__}", daemon=True).start()
+
+        @wraps(func)
+        def wrapper(*args, fresh=False, **kwargs):
+            key = make_key(cache.name, args, kwargs)
+            if not fresh:
+                value, state = cache.get(key)
+                if state == 'fresh':
+                    return value
+                if state == 'stale':
+                    _refresh_in_background(key, args, kwargs)
+                    return value
+            return _load(key, args, kwargs, fresh)
+
+        wrapper.cache = cache
+        wrapper.invalidate = lambda *args, **kwargs: cache.invalidate(make_key(cache.name, args, kwargs))
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+# app/api_clients/circuit_breaker.py
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Consecutive failed (or slow) calls to one endpoint family before its breaker opens.
+FAILURE_THRESHOLD = int(os.environ.get('FMP_BREAKER_FAILURES', 5))
+# A call slower than this counts as a failure even if it succeeded.
+SLOW_CALL_SECONDS = float(os.environ.get('FMP_BREAKER_SLOW_SECONDS', 5.0))
+# How long an open breaker fails fast before letting a probe through.
+RECOVERY_SECONDS = float(os.environ.get('FMP_BREAKER_RECOVERY_SECONDS', 30))
+HALF_OPEN_PROBES = int(os.environ.get('FMP_BREAKER_HALF_OPEN_PROBES', 1))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker. Closed: calls pass and consecutive failures are counted.
+    Open: calls are refused until RECOVERY_SECONDS have passed. Half-open: a limited
+    number of probe calls pass; a success closes the breaker, a failure re-opens it.
+    """
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, slow_call_seconds=SLOW_CALL_SECONDS,
+                 recovery_seconds=RECOVERY_SECONDS, half_open_probes=HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.recovery_seconds = recovery_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probes_in_flight = 0
+        self.stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go upstream now; False means fail fast."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_seconds:
+                    self.stats['rejected'] += 1
+                    return False
+                self.state = HALF_OPEN
+                self.probes_in_flight = 0
+                logger.info(f"Circuit '{self.name}' half-open; probing upstream.")
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    self.stats['rejected'] += 1
+                    return False
+                self.probes_in_flight += 1
+            self.stats['calls'] += 1
+            return True
+
+    def record_neutral(self):
+        """A completed call that says nothing about upstream health (e.g. a 4xx); frees its probe."""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes_in_flight:
+                self.probes_in_flight -= 1
+
+    def release(self):
+        """Returns a permit from allow() that was never used (e.g. the call was rate-limit shed)."""
+        with self._lock:
+            self.stats['calls'] -= 1
+            if self.state == HALF_OPEN and self.probes_in_flight:
+                self.probes_in_flight -= 1
+
+    def record_success(self, elapsed):
+        if elapsed > self.slow_call_seconds:
+            with self._lock:
+                self.stats['slow_calls'] += 1
+            self.record_failure(f"slow call ({elapsed:.1f}s)")
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit '{self.name}' closed after a successful probe.")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probes_in_flight = 0
+
+    def record_failure(self, reason=''):
+        with self._lock:
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats['opened'] += 1
+                    logger.warning(f"Circuit '{self.name}' opened after {self.consecutive_failures} "
+                                   f"consecutive failures ({reason}).")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probes_in_flight = 0
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at)), 1)
+            return {'state': self.state, 'consecutive_failures': self.consecutive_failures,
+                    'retry_in_seconds': retry_in, **self.stats}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_breaker_stats():
+    """Metrics hook: {endpoint_family: state and counters} for this process."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+# --- Degradation tracking ---
+# A failure scope lets the response cache tell an upstream failure apart from a
+# legitimately empty result; the stale set records which responses were served from
+# last-known-good data so the web layer can flag them.
+
+_failures = ContextVar('fmp_upstream_failures', default=None)
+_stale_sources = ContextVar('fmp_stale_sources', default=None)
+
+
+@contextmanager
+def failure_scope():
+    failures = []
+    token = _failures.set(failures)
+    try:
+        yield failures
+    finally:
+        _failures.reset(token)
+
+
+def note_failure(name):
+    failures = _failures.get()
+    if failures is not None:
+        failures.append(name)
+
+
+def track_stale():
+    """Starts a fresh stale-source set for the current request (or job)."""
+    _stale_sources.set(set())
+
+
+def mark_stale(name):
+    sources = _stale_sources.get()
+    if sources is not None:
+        sources.add(name)
+
+
+def stale_sources():
+    return sorted(_stale_sources.get() or ())
@@ -0,0 +1,90 @@
+# app/api_clients/fmp_async_client.py
+import os
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import fmp_client, http_session
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Upper bound on simultaneous upstream calls from one process. Matches the per-host
+# connection pool so concurrent calls never wait on a socket.
+MAX_CONCURRENCY = int(os.environ.get('FMP_ASYNC_MAX_CONCURRENCY', http_session.POOL_MAXSIZE))
+
+# Calls run on a dedicated executor over the synchronous client, so they share its
+# keep-alive pool, response cache and in-flight coalescing.
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='fmp-async')
+
+
+async def _run(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (e.g. its rate-limit priority lane) into the worker thread.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def _mirror(func):
+    """Wraps a public fmp_client function as a coroutine function with the same signature."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await _run(func, *args, **kwargs)
+    return wrapper
+
+
+# --- API Functions (async mirrors of fmp_client) ---
+get_quote = _mirror(fmp_client.get_quote)
+get_historical_data = _mirror(fmp_client.get_historical_data)
+get_historical_data_hourly = _mirror(fmp_client.get_historical_data_hourly)
+get_stock_rating = _mirror(fmp_client.get_stock_rating)
+get_company_profile = _mirror(fmp_client.get_company_profile)
+get_company_profiles = _mirror(fmp_client.get_company_profiles)
+search_symbol = _mirror(fmp_client.search_symbol)
+get_earnings_calendar = _mirror(fmp_client.get_earnings_calendar)
+get_economic_calendar = _mirror(fmp_client.get_economic_calendar)
+stock_screener = _mirror(fmp_client.stock_screener)
+get_market_gainers = _mirror(fmp_client.get_market_gainers)
+get_market_losers = _mirror(fmp_client.get_market_losers)
+get_market_active = _mirror(fmp_client.get_market_active)
+get_income_statement = _mirror(fmp_client.get_income_statement)
+get_balance_sheet = _mirror(fmp_client.get_balance_sheet)
+get_stock_news = _mirror(fmp_client.get_stock_news)
+
+
+async def gather_async(coros, limit=MAX_CONCURRENCY):
+    """
+    Awaits coroutines with at most `limit` running at once, preserving order.
+    A call that raises is logged and yields None, matching the sync client's error contract.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _bounded(coro):
+        async with semaphore:
+            return await coro
+
+    results = await asyncio.gather(*(_bounded(c) for c in coros), return_exceptions=True)
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"Async FMP call {i} failed: {result}", exc_info=result)
+            results[i] = None
+    return results
+
+
+def gather(*coros, limit=MAX_CONCURRENCY):
+    """
+    Sync entry point for Flask views: runs the given coroutines concurrently and
+    returns their results in order, e.g.
+        quotes, news = gather(get_quote("AAPL,MSFT"), get_stock_news("AAPL"))
+    """
+    return asyncio.run(gather_async(coros, limit=limit))
+
+
+def map_concurrent(async_func, items, limit=MAX_CONCURRENCY):
+    """Sync helper: calls `async_func(item)` for every item concurrently; results keep item order."""
+    items = list(items)
+    if not items:
+        return []
+    return gather(*(async_func(item) for item in items), limit=limit)
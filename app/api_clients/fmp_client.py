@@ -1,20 +1,62 @@
 # app/api_clients/fmp_client.py
 import os
+import time
 import requests
 import logging
-from functools import lru_cache
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import http_session, rate_limiter, fmp_replay, circuit_breaker
+from .cache import ttl_cache, get_cache_stats, TTLCache
+from .singleflight import SingleFlight
+from .quote_batcher import QuoteBatcher
 
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 FMP_API_KEY = os.environ.get('FMP_API_KEY')
-BASE_URL = "https://financialmodelingprep.com/api/v3"
-REQUEST_TIMEOUT = 15
+# Point FMP_BASE_URL at a stand-in (run_fmp_standin.py) for offline benchmarks and load tests.
+BASE_URL = os.environ.get('FMP_BASE_URL', "https://financialmodelingprep.com/api/v3")
+# (connect, read) timeouts; configure with FMP_CONNECT_TIMEOUT / FMP_READ_TIMEOUT.
+REQUEST_TIMEOUT = http_session.get_timeout()
+
+# Cache lifetimes in seconds: (ttl, stale window). Override with e.g. FMP_CACHE_TTL_QUOTE=30.
+def _ttl(name, default):
+    return int(os.environ.get(f'FMP_CACHE_TTL_{name.upper()}', default))
+
+CACHE_TTLS = {
+    'quote': (_ttl('quote', 15), 30),
+    'historical': (_ttl('historical', 60 * 60), 6 * 60 * 60),
+    'hourly': (_ttl('hourly', 5 * 60), 15 * 60),
+    'rating': (_ttl('rating', 6 * 60 * 60), 24 * 60 * 60),
+    'profile': (_ttl('profile', 6 * 60 * 60), 24 * 60 * 60),
+    'statements': (_ttl('statements', 12 * 60 * 60), 24 * 60 * 60),
+    'movers': (_ttl('movers', 60), 5 * 60),
+    'symbol_list': (_ttl('symbol_list', 24 * 60 * 60), 24 * 60 * 60),
+    'earnings': (_ttl('earnings', 6 * 60 * 60), 24 * 60 * 60),
+}
+
+# Single-symbol quote requests are merged into /quote/A,B,C calls.
+QUOTE_BATCH_WINDOW_MS = float(os.environ.get('FMP_QUOTE_BATCH_WINDOW_MS', 5))
+QUOTE_BATCH_SIZE = int(os.environ.get('FMP_QUOTE_BATCH_SIZE', 50))
+PROFILE_BATCH_SIZE = int(os.environ.get('FMP_PROFILE_BATCH_SIZE', 50))
+PROFILE_FALLBACK_CONCURRENCY = 8
+
+# Identical concurrent upstream calls (same endpoint, params and priority lane) share one
+# HTTP request. The lane is part of the key so a caller never waits on a lower lane's call.
+_inflight = SingleFlight('fmp_request')
 
 def _fmp_request(endpoint, params=None):
     """
     Private helper function to make requests to the FMP API.
     Handles adding the API key and generic error handling to reduce code duplication.
+    Requests go through the pooled keep-alive session, which retries 429/5xx with backoff.
+    Concurrent identical calls in the same lane are coalesced so only one of them reaches the upstream.
+    Each upstream call spends a token from the shared budget in the caller's priority
+    lane (see rate_limiter.priority); a shed call returns None like any other failure.
+    Each endpoint family has a circuit breaker: while it is open, calls fail fast and
+    cached functions fall back to their last known good value.
     """
     if not FMP_API_KEY:
         logger.error("FMP_API_KEY is not set in environment variables.")
@@ -23,41 +65,132 @@ def _fmp_request(endpoint, params=None):
     if params is None:
         params = {}
     
+    key = fmp_replay.request_key(endpoint, params)
     params['apikey'] = FMP_API_KEY
-    
+    data, failed = _inflight.do((key, rate_limiter.current_lane()), _fetch, endpoint, params, key)
+    if failed:
+        circuit_breaker.note_failure(endpoint)
+    return data
+
+def _fetch(endpoint, params, key):
+    """
+    Performs a single upstream GET; only called by the in-flight leader for a request key.
+    Returns (data, failed), where failed means the upstream was unreachable or erroring.
+    """
+    breaker = circuit_breaker.get_breaker(rate_limiter.endpoint_family(endpoint))
+    if not breaker.allow():
+        logger.warning(f"Circuit for {breaker.name} is open; failing fast for {endpoint}")
+        return None, True
+    if not rate_limiter.acquire(endpoint):
+        breaker.release()
+        return None, False
+
     full_url = f"{BASE_URL}{endpoint}"
     logger.debug(f"Requesting FMP URL: {full_url}")
 
+    started = time.monotonic()
     try:
-        response = requests.get(full_url, params=params, timeout=REQUEST_TIMEOUT)
+        response = http_session.get_with_retries(full_url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         
         data = response.json()
+        # Only a parsed response shows the upstream is healthy
+        breaker.record_success(time.monotonic() - started)
         if isinstance(data, dict) and "Error Message" in data:
             logger.error(f"FMP API returned an error for {endpoint}: {data['Error Message']}")
-            return None
-            
-        return data
+            return None, False
+
+        if fmp_replay.RECORD_DIR:
+            fmp_replay.record(key, data)
+        return data, False
 
     except requests.exceptions.HTTPError as http_err:
         logger.error(f"HTTP Error for {full_url}: {http_err}")
-        return None
+        failed = http_err.response is not None and http_err.response.status_code >= 500
     except requests.exceptions.RequestException as req_err:
         logger.error(f"RequestException for {full_url}: {req_err}")
-        return None
+        failed = True
     except Exception as e:
         logger.error(f"An unexpected error occurred during FMP request for {full_url}", exc_info=True)
-        return None
+        failed = True
+    if failed:
+        breaker.record_failure(f"{time.monotonic() - started:.1f}s")
+    else:
+        breaker.record_neutral()
+    return None, failed
 
 # --- API Functions ---
 # The functions below have been updated to safely handle empty list responses.
+# Cached functions accept fresh=True to bypass the cache, and expose .invalidate(*args).
+
+# Quotes are cached per symbol, so "AAPL,MSFT" and "AAPL" share entries.
+_quote_cache = TTLCache('get_quote', *CACHE_TTLS['quote'], maxsize=2048)
 
-@lru_cache(maxsize=256)
-def get_quote(symbols):
-    """Fetches real-time quotes for one or more symbols."""
-    return _fmp_request(f"/quote/{symbols.upper()}")
+def _fetch_quote_batch(symbols):
+    """Fetches quotes in chunks of QUOTE_BATCH_SIZE and stores each one under its own symbol."""
+    quotes = {}
+    for i in range(0, len(symbols), QUOTE_BATCH_SIZE):
+        chunk = symbols[i:i + QUOTE_BATCH_SIZE]
+        data = _fmp_request(f"/quote/{','.join(chunk)}")
+        if not data or not isinstance(data, list):
+            continue
+        for quote in data:
+            if isinstance(quote, dict) and quote.get('symbol'):
+                symbol = quote['symbol'].upper()
+                quotes[symbol] = quote
+                _quote_cache.set(_quote_cache.key_for(symbol), quote)
+    return quotes
+
+_quote_batcher = QuoteBatcher(_fetch_quote_batch, window_ms=QUOTE_BATCH_WINDOW_MS)
+
+def _refresh_quotes_in_background(symbols):
+    def _run():
+        with rate_limiter.priority('warming'):
+            _quote_batcher.get_quotes(symbols)
+    threading.Thread(target=contextvars.copy_context().run, args=(_run,), name="refresh-quotes", daemon=True).start()
+
+def get_quote(symbols, fresh=False):
+    """
+    Fetches real-time quotes for one or more comma-separated symbols.
+    Cached symbols are served per symbol; the rest are fetched through the batcher.
+    Pass fresh=True to skip the cache (the alert checker does); fresh calls never fall
+    back to a last known good quote.
+    """
+    requested = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    found = {}
+    missing = []
+    stale = []
+    for symbol in requested:
+        if fresh:
+            missing.append(symbol)
+            continue
+        quote, state = _quote_cache.get(_quote_cache.key_for(symbol))
+        if state is None:
+            missing.append(symbol)
+            continue
+        found[symbol] = quote
+        if state == 'stale':
+            stale.append(symbol)
 
-@lru_cache(maxsize=128)
+    if stale:
+        _refresh_quotes_in_background(stale)
+    if missing:
+        found.update(_quote_batcher.get_quotes(missing))
+        if not fresh:
+            # Symbols the upstream failed to return fall back to their last known quote
+            for symbol in missing:
+                if symbol not in found:
+                    last_good = _quote_cache.get_last_good(_quote_cache.key_for(symbol))
+                    if last_good is not None:
+                        found[symbol] = last_good
+                        circuit_breaker.mark_stale('get_quote')
+    return [found[s] for s in requested if s in found]
+
+get_quote.cache = _quote_cache
+get_quote.invalidate = lambda symbol: _quote_cache.invalidate(_quote_cache.key_for(symbol.upper()))
+get_quote.cache_clear = _quote_cache.clear
+
+@ttl_cache(*CACHE_TTLS['historical'], maxsize=128)
 def get_historical_data(symbol, days=1300):
     """Fetches daily historical price data."""
     data = _fmp_request(f"/historical-price-full/{symbol.upper()}")
@@ -66,29 +199,101 @@ def get_historical_data(symbol, days=1300):
         return historical_data[-days:]
     return []
 
+def get_historical_series(symbol, days=1300):
+    """Daily history as a columnar PriceSeries (see app.services.price_series)."""
+    from ..services.price_series import PriceSeries
+    return PriceSeries.from_records(get_historical_data(symbol, days=days), symbol=symbol.upper())
+
+def get_historical_prices(symbol, from_date=None, to_date=None):
+    """
+    Fetches daily bars oldest-first, optionally limited to a date range. Uncached: the
+    local price store calls this with from_date set so only new bars are downloaded.
+    """
+    params = {}
+    if from_date:
+        params['from'] = str(from_date)
+    if to_date:
+        params['to'] = str(to_date)
+    data = _fmp_request(f"/historical-price-full/{symbol.upper()}", params=params)
+    if data is None:
+        return None
+    if isinstance(data, dict) and 'historical' in data:
+        return data['historical'][::-1]
+    return []
+
 def get_economic_calendar(from_date, to_date, limit=100):
     """Fetches economic calendar events for a date range."""
     params = {'from': from_date, 'to': to_date, 'limit': limit}
     return _fmp_request("/economic_calendar", params=params)
 
-@lru_cache(maxsize=128)
+@ttl_cache(*CACHE_TTLS['rating'], maxsize=128)
 def get_stock_rating(symbol):
     """Fetches the latest analyst rating for a stock."""
     data = _fmp_request(f"/rating/{symbol.upper()}")
     # FIX: Safely access the first element only if the list is not empty.
     return data[0] if data and isinstance(data, list) and len(data) > 0 else {}
 
-@lru_cache(maxsize=128)
+@ttl_cache(*CACHE_TTLS['profile'], maxsize=128)
 def get_company_profile(symbol):
     """Fetches company profile information."""
     data = _fmp_request(f"/profile/{symbol.upper()}")
     # FIX: Safely access the first element only if the list is not empty.
     return data[0] if data and isinstance(data, list) and len(data) > 0 else {}
 
+def get_company_profiles(symbols):
+    """
+    Fetches profiles for many symbols, returning {symbol: profile}.
+    Served from the same per-symbol cache entries as get_company_profile; misses are
+    fetched as chunked /profile/A,B,C requests. If the upstream rejects a batch, that
+    chunk falls back to bounded concurrent single-symbol requests.
+    """
+    requested = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    cache = get_company_profile.cache
+    profiles = {}
+    missing = []
+    for symbol in requested:
+        profile, state = cache.get(cache.key_for(symbol))
+        if state is None:
+            missing.append(symbol)
+        else:
+            profiles[symbol] = profile
+
+    rejected = []
+    for i in range(0, len(missing), PROFILE_BATCH_SIZE):
+        chunk = missing[i:i + PROFILE_BATCH_SIZE]
+        data = _fmp_request(f"/profile/{','.join(chunk)}")
+        if not data or not isinstance(data, list):
+            rejected.extend(chunk)
+            continue
+        for profile in data:
+            if isinstance(profile, dict) and profile.get('symbol'):
+                symbol = profile['symbol'].upper()
+                profiles[symbol] = profile
+                cache.set(cache.key_for(symbol), profile)
+
+    if len(rejected) == 1:
+        profiles[rejected[0]] = get_company_profile(rejected[0])
+    elif rejected:
+        logger.warning(f"Batch profile request rejected; fetching {len(rejected)} profiles individually.")
+        # A private pool: this may itself run on the async client's executor, so reusing it could starve it.
+        # Each fetch runs in a copy of the caller's context, so it keeps the caller's priority lane.
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=min(PROFILE_FALLBACK_CONCURRENCY, len(rejected))) as pool:
+            singles = list(pool.map(lambda symbol: context.copy().run(get_company_profile, symbol), rejected))
+        profiles.update({s: p for s, p in zip(rejected, singles) if p})
+
+    return {s: profiles[s] for s in requested if profiles.get(s)}
+
+@ttl_cache(*CACHE_TTLS['symbol_list'], maxsize=1)
+def get_symbol_list():
+    """Fetches the full tradable symbol universe (symbol, name, exchange)."""
+    return _fmp_request("/stock/list")
+
 def search_symbol(query, limit=10, exchange=''):
     """Searches for stock symbols matching a query."""
     return _fmp_request("/search", params={'query': query, 'limit': limit, 'exchange': exchange})
 
+@ttl_cache(*CACHE_TTLS['earnings'], maxsize=8)
 def get_earnings_calendar(from_date, to_date):
     """Fetches earnings calendar for a date range."""
     return _fmp_request("/earning_calendar", params={'from': from_date, 'to': to_date})
@@ -102,29 +307,29 @@ def stock_screener(filters, limit=100):
     filters['limit'] = limit
     return _fmp_request("/stock-screener", filters)
 
-@lru_cache(maxsize=8)
+@ttl_cache(*CACHE_TTLS['movers'], maxsize=8)
 def get_market_gainers():
     return _fmp_request("/stock_market/gainers")
 
-@lru_cache(maxsize=8)
+@ttl_cache(*CACHE_TTLS['movers'], maxsize=8)
 def get_market_losers():
     return _fmp_request("/stock_market/losers")
 
-@lru_cache(maxsize=8)
+@ttl_cache(*CACHE_TTLS['movers'], maxsize=8)
 def get_market_active():
     return _fmp_request("/stock_market/actives")
 
-@lru_cache(maxsize=64)
+@ttl_cache(*CACHE_TTLS['statements'], maxsize=64)
 def get_income_statement(symbol, period='annual', limit=5):
     """Fetches income statements."""
     return _fmp_request(f"/income-statement/{symbol.upper()}", params={'period': period, 'limit': limit})
 
-@lru_cache(maxsize=64)
+@ttl_cache(*CACHE_TTLS['statements'], maxsize=64)
 def get_balance_sheet(symbol, period='annual', limit=5):
     """Fetches balance sheets."""
     return _fmp_request(f"/balance-sheet-statement/{symbol.upper()}", params={'period': period, 'limit': limit})
 
-@lru_cache(maxsize=128)
+@ttl_cache(*CACHE_TTLS['hourly'], maxsize=128)
 def get_historical_data_hourly(symbol):
     """Fetches 1-hour historical data from FMP."""
     return _fmp_request(f"/historical-chart/1hour/{symbol.upper()}")
@@ -134,4 +339,20 @@ def get_stock_news(symbol=None, limit=50):
     params = {'limit': limit}
     if symbol:
         params['tickers'] = symbol.upper()
-    return _fmp_request("/stock_news", params=params)
\ No newline at end of file
+    return _fmp_request("/stock_news", params=params)
+
+def get_connection_pool_stats():
+    """Returns keep-alive pool hit/miss counters for the upstream hosts."""
+    return http_session.get_pool_stats()
+
+def get_response_cache_stats():
+    """Returns per-endpoint hit rates across the in-process and shared cache tiers."""
+    return get_cache_stats()
+
+def get_rate_limit_stats():
+    """Returns remaining FMP budget and per-lane granted/queued/shed counters."""
+    return rate_limiter.get_rate_limit_stats()
+
+def get_circuit_breaker_stats():
+    """Returns per-endpoint circuit breaker state for this process."""
+    return circuit_breaker.get_breaker_stats()
@@ -0,0 +1,54 @@
+# app/api_clients/fmp_replay.py
+import os
+import json
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# When set, every successful upstream response is written under this directory so the
+# stand-in server (run_fmp_standin.py) can replay it later.
+RECORD_DIR = os.environ.get('FMP_RECORD_DIR')
+
+_write_lock = threading.Lock()
+
+
+def request_key(endpoint, params):
+    """Identifies an upstream call by endpoint plus params, ignoring the API key."""
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k != 'apikey')
+    return endpoint + '?' + '&'.join(f"{k}={v}" for k, v in items)
+
+
+def recording_path(directory, key):
+    """Recordings are grouped by endpoint family: <dir>/<family>/<sha1 of key>.json"""
+    family = key.lstrip('/').split('/', 1)[0].split('?', 1)[0] or 'root'
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(directory, family, f"{digest}.json")
+
+
+def record(key, data, directory=None):
+    """Writes one response to disk (atomically, so a concurrent replay never sees half a file)."""
+    directory = directory or RECORD_DIR
+    if not directory or data is None:
+        return
+    path = recording_path(directory, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with _write_lock, open(tmp_path, 'w') as fh:
+            json.dump({'key': key, 'response': data}, fh)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not record FMP response for {key}: {e}")
+
+
+def load(key, directory):
+    """Returns the recorded response for `key`, or raises KeyError if none was recorded."""
+    path = recording_path(directory, key)
+    try:
+        with open(path) as fh:
+            return json.load(fh)['response']
+    except FileNotFoundError:
+        raise KeyError(key)
@@ -0,0 +1,128 @@
+# app/api_clients/fmp_standin.py
+import json
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from . import fmp_replay
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/v3'
+
+
+class StandinConfig:
+    """Fault and latency injection settings for the replay server."""
+    def __init__(self, directory, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 rate_limit_per_minute=0, seed=None):
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.random = random.Random(seed)
+
+
+class _RateLimit:
+    """Simple token bucket mimicking FMP's per-minute limit; refuses with 429 when empty."""
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FMPStandin/1.0'
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        if parts.path == '/__standin/stats':
+            return self._send(200, dict(server.stats))
+
+        endpoint = parts.path[len(API_PREFIX):] if parts.path.startswith(API_PREFIX) else parts.path
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        key = fmp_replay.request_key(endpoint, params)
+        config = server.config
+        server.count('requests')
+
+        if server.rate_limit is not None:
+            retry_after = server.rate_limit.take()
+            if retry_after:
+                server.count('rate_limited')
+                return self._send(429, {"Error Message": "Limit Reach (stand-in)"},
+                                  {'Retry-After': str(max(1, int(retry_after + 0.999)))})
+
+        delay_ms = config.latency_ms + (config.random.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+        if config.error_rate and config.random.random() < config.error_rate:
+            server.count('injected_errors')
+            return self._send(500, {"Error Message": "Injected error (stand-in)"})
+
+        try:
+            payload = fmp_replay.load(key, config.directory)
+        except KeyError:
+            server.count('misses')
+            logger.info(f"No recording for {key}")
+            return self._send(404, {"Error Message": f"No recording for {key}"})
+        server.count('hits')
+        return self._send(200, payload)
+
+
+class StandinServer(ThreadingHTTPServer):
+    """Serves recorded FMP responses with configurable latency, errors and rate limiting."""
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.rate_limit = _RateLimit(config.rate_limit_per_minute) if config.rate_limit_per_minute else None
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0, 'injected_errors': 0, 'rate_limited': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+
+def start_in_thread(config, host='127.0.0.1', port=0):
+    """Starts a stand-in on a background thread (port 0 picks a free port); returns the server."""
+    server = StandinServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name='fmp-standin', daemon=True).start()
+    return server
@@ -0,0 +1,173 @@
+# app/api_clients/http_session.py
+import os
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Connections kept alive per host. Gunicorn threads share one pool per process.
+POOL_CONNECTIONS = int(os.environ.get('FMP_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('FMP_POOL_MAXSIZE', 16))
+CONNECT_TIMEOUT = float(os.environ.get('FMP_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('FMP_READ_TIMEOUT', 10))
+MAX_RETRIES = int(os.environ.get('FMP_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.environ.get('FMP_BACKOFF_BASE', 0.25))
+BACKOFF_MAX = float(os.environ.get('FMP_BACKOFF_MAX', 4.0))
+# Budget for one call including its retries and backoff; no retry starts, and no attempt
+# waits, past it. Keeps a failing upstream from holding a worker much longer than one request.
+TOTAL_TIMEOUT = float(os.environ.get('FMP_TOTAL_TIMEOUT', 15))
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# host -> {'requests', 'connections'}, counted by the session's own adapter and connections
+_pool_counts = {}
+_pool_counts_lock = threading.Lock()
+
+
+def _count(host, field):
+    with _pool_counts_lock:
+        entry = _pool_counts.setdefault(host, {'requests': 0, 'connections': 0})
+        entry[field] += 1
+
+
+# --- Counting adapter ---
+# Requests are counted as they are sent and connections as they are opened, so connection
+# reuse is reported without reading the pool manager's internals.
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        super().connect()
+        _count(f"http://{self.host}:{self.port}", 'connections')
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        super().connect()
+        _count(f"https://{self.host}:{self.port}", 'connections')
+
+
+class _CountingHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _CountingHTTPPool, 'https': _CountingHTTPSPool}
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        _count(f"{url.scheme}://{url.hostname}:{port}", 'requests')
+        return super().send(request, **kwargs)
+
+
+def get_session():
+    """
+    Returns the process-wide pooled session, creating it on first use.
+    A forked child gets its own session so sockets are never shared across processes.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            session = requests.Session()
+            adapter = _CountingAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                  pool_block=False, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            if _session_pid != pid:
+                with _pool_counts_lock:
+                    _pool_counts.clear()
+            _session = session
+            _session_pid = pid
+            logger.info(f"Created pooled HTTP session (pid={pid}, pool_maxsize={POOL_MAXSIZE})")
+    return _session
+
+
+def get_timeout():
+    """Returns the (connect, read) timeout tuple used for upstream calls."""
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+def _backoff_delay(attempt, response=None):
+    """Exponential backoff with full jitter, honouring a numeric Retry-After header."""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def get_with_retries(url, params=None, timeout=None):
+    """
+    Performs a GET through the pooled session.
+    Retries connection errors, timeouts and 429/5xx responses with jittered backoff, within
+    TOTAL_TIMEOUT overall: each attempt's timeouts are cut to the time left, and a retry
+    whose wait would run past it is not made.
+    Returns the final response; raises the last RequestException if every attempt failed.
+    """
+    session = get_session()
+    connect_timeout, read_timeout = _pair(timeout or get_timeout())
+    deadline = time.monotonic() + TOTAL_TIMEOUT
+
+    for attempt in range(MAX_RETRIES + 1):
+        remaining = max(deadline - time.monotonic(), 0.001)
+        try:
+            response = session.get(url, params=params,
+                                   timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)))
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            delay = _backoff_delay(attempt)
+            if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+                raise
+            logger.warning(f"Request to {url} failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+            delay = _backoff_delay(attempt, response)
+            if time.monotonic() + delay < deadline:
+                logger.warning(f"Request to {url} returned {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+                time.sleep(delay)
+                continue
+            logger.warning(f"Request to {url} returned {response.status_code}; no time left to retry")
+        return response
+
+
+def _pair(timeout):
+    """A requests timeout (one number or a (connect, read) pair) as a pair."""
+    return tuple(timeout) if isinstance(timeout, (tuple, list)) else (timeout, timeout)
+
+
+def get_pool_stats():
+    """
+    Reports connection reuse per host.
+    'misses' are new connections opened, 'hits' are requests served on an existing one.
+    """
+    if _session is None or _session_pid != os.getpid():
+        return {}
+    with _pool_counts_lock:
+        counts = {host: dict(entry) for host, entry in _pool_counts.items()}
+    return {host: {'requests': c['requests'], 'misses': c['connections'],
+                   'hits': max(c['requests'] - c['connections'], 0)}
+            for host, c in counts.items()}
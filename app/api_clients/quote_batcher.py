@@ -0,0 +1,69 @@
+# app/api_clients/quote_batcher.py
+import time
+import logging
+import threading
+
+from . import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    __slots__ = ('symbols', 'lanes', 'event', 'results')
+
+    def __init__(self):
+        self.symbols = set()
+        self.lanes = set()
+        self.event = threading.Event()
+        self.results = {}
+
+
+class QuoteBatcher:
+    """
+    Collects symbol requests from concurrent callers over a short window and fetches
+    them together. The first caller into an empty batch waits `window_ms`, seals the
+    batch and runs `fetch_batch(symbols)` (which returns {symbol: quote}); everyone who
+    joined the batch in the meantime receives their symbols from that single fetch.
+    The fetch runs in the highest priority lane of the callers in the batch.
+    """
+    def __init__(self, fetch_batch, window_ms=5, wait_timeout=30):
+        self.fetch_batch = fetch_batch
+        self.window = window_ms / 1000.0
+        self.wait_timeout = wait_timeout
+        self._open = None
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'symbols_requested': 0, 'symbols_fetched': 0}
+
+    def get_quotes(self, symbols):
+        """Returns {symbol: quote} for the requested symbols; missing symbols are omitted."""
+        if not symbols:
+            return {}
+
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open = batch
+            batch.symbols.update(symbols)
+            batch.lanes.add(rate_limiter.current_lane())
+            self.stats['symbols_requested'] += len(symbols)
+
+        if leader:
+            if self.window > 0:
+                time.sleep(self.window)
+            with self._lock:
+                self._open = None
+                self.stats['batches'] += 1
+                self.stats['symbols_fetched'] += len(batch.symbols)
+            try:
+                with rate_limiter.priority(rate_limiter.highest_lane(batch.lanes)):
+                    batch.results = self.fetch_batch(sorted(batch.symbols)) or {}
+            except Exception:
+                logger.error(f"Quote batch fetch failed for {len(batch.symbols)} symbols", exc_info=True)
+            finally:
+                batch.event.set()
+        elif not batch.event.wait(self.wait_timeout):
+            logger.warning(f"Timed out waiting for quote batch containing {sorted(symbols)}")
+
+        return {s: batch.results[s] for s in symbols if s in batch.results}
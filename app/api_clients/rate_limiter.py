@@ -0,0 +1,243 @@
+# app/api_clients/rate_limiter.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from . import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Budget for the whole FMP key, shared by every process on the host through the
+# shared cache database (per process when FMP_SHARED_CACHE=0).
+# FMP_RATE_LIMIT_PER_MINUTE=0 disables limiting.
+RATE_LIMIT_PER_MINUTE = float(os.environ.get('FMP_RATE_LIMIT_PER_MINUTE', 300))
+RATE_LIMIT_BURST = float(os.environ.get('FMP_RATE_LIMIT_BURST', 60))
+
+# Optional tighter limits for expensive endpoint families, as requests per minute.
+# Override with FMP_RATE_LIMIT_ENDPOINTS="stock-screener=20,historical-price-full=60".
+DEFAULT_ENDPOINT_LIMITS = {
+    'stock-screener': 30,
+    'historical-price-full': 120,
+    'earning_calendar': 20,
+}
+
+# Priority lanes, highest first. A lane may only spend tokens while the bucket stays
+# above its reserve (a fraction of capacity kept back for higher lanes), and waits at
+# most `max_wait` seconds for one before the call is shed.
+LANES = {
+    'alerts': {'reserve': 0.0, 'max_wait': 15.0},
+    'interactive': {'reserve': 0.1, 'max_wait': 3.0},
+    'warming': {'reserve': 0.4, 'max_wait': 0.0},
+    'backtest': {'reserve': 0.5, 'max_wait': 30.0},
+}
+DEFAULT_LANE = 'interactive'
+POLL_INTERVAL = 0.1
+
+_current_lane = contextvars.ContextVar('fmp_priority', default=DEFAULT_LANE)
+_schema_pid = None
+_schema_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {lane: {'granted': 0, 'queued': 0, 'shed': 0} for lane in LANES}
+# name -> (tokens, updated_at), used instead of rate_buckets when the shared cache is off
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+def _parse_endpoint_limits():
+    limits = dict(DEFAULT_ENDPOINT_LIMITS)
+    raw = os.environ.get('FMP_RATE_LIMIT_ENDPOINTS', '')
+    for item in raw.split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            try:
+                limits[name.strip().strip('/')] = float(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid FMP_RATE_LIMIT_ENDPOINTS entry: {item}")
+    return limits
+
+ENDPOINT_LIMITS = _parse_endpoint_limits()
+
+
+@contextmanager
+def priority(lane):
+    """Runs the enclosed FMP calls in the given priority lane (see LANES)."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown rate limit lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def current_lane():
+    return _current_lane.get()
+
+
+def highest_lane(lanes):
+    """The highest-priority lane of `lanes`; one upstream call serving several callers runs in it."""
+    order = list(LANES)
+    return min(lanes, key=lambda lane: order.index(lane if lane in LANES else DEFAULT_LANE))
+
+
+def endpoint_family(endpoint):
+    """'/quote/AAPL' -> 'quote'; used for per-endpoint limits and metrics."""
+    return endpoint.strip('/').split('/', 1)[0]
+
+
+def _buckets_for(endpoint):
+    """Returns [(bucket_name, capacity, refill_per_second)] that a call to `endpoint` draws from."""
+    buckets = [('global', RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE / 60.0)]
+    family = endpoint_family(endpoint)
+    per_minute = ENDPOINT_LIMITS.get(family)
+    if per_minute:
+        capacity = max(1.0, min(RATE_LIMIT_BURST, per_minute / 6.0))
+        buckets.append((f"endpoint:{family}", capacity, per_minute / 60.0))
+    return buckets
+
+
+def _connection():
+    global _schema_pid
+    conn = shared_cache.get_connection()
+    pid = os.getpid()
+    if _schema_pid != pid:
+        with _schema_lock:
+            if _schema_pid != pid:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                    " name TEXT PRIMARY KEY,"
+                    " tokens REAL NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+                _schema_pid = pid
+    return conn
+
+
+def _refill(buckets, reserve_fraction, stored, now):
+    """
+    Refills the buckets from their stored (tokens, updated_at) levels and takes one token
+    from each if every bucket stays above the lane's reserve.
+    Returns (granted, seconds_until_retry_makes_sense, {name: tokens_left}).
+    """
+    levels = []
+    for name, capacity, rate in buckets:
+        row = stored.get(name)
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        levels.append((name, capacity, rate, tokens))
+
+    wait = 0.0
+    for name, capacity, rate, tokens in levels:
+        needed = reserve_fraction * capacity + 1.0 - tokens
+        if needed > 0:
+            wait = max(wait, needed / rate if rate > 0 else float('inf'))
+    granted = wait == 0.0
+    return granted, wait, {name: tokens - 1.0 if granted else tokens for name, _, _, tokens in levels}
+
+
+def _try_take(buckets, reserve_fraction):
+    """
+    Atomically refills the buckets and takes one token from each if every bucket
+    stays above the lane's reserve. Returns (granted, seconds_until_retry_makes_sense).
+    With the shared cache disabled (FMP_SHARED_CACHE=0) the buckets are per process.
+    """
+    now = time.time()
+    if not shared_cache.SHARED_CACHE_ENABLED:
+        with _local_lock:
+            granted, wait, levels = _refill(buckets, reserve_fraction, _local_buckets, now)
+            _local_buckets.update((name, (tokens, now)) for name, tokens in levels.items())
+        return granted, wait
+
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stored = {}
+        for name, _, _ in buckets:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+            if row is not None:
+                stored[name] = row
+        granted, wait, levels = _refill(buckets, reserve_fraction, stored, now)
+        for name, tokens in levels.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (name, tokens, now)
+            )
+        conn.execute("COMMIT")
+        return granted, wait
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _count(lane, counter):
+    with _stats_lock:
+        _stats[lane][counter] += 1
+
+
+def acquire(endpoint, lane=None):
+    """
+    Takes one request token for `endpoint` in the caller's priority lane.
+    Queues (sleeps) up to the lane's max_wait when the budget is short and returns
+    False if the call should be shed. Fails open if the shared database is unavailable.
+    """
+    if RATE_LIMIT_PER_MINUTE <= 0:
+        return True
+    lane = lane or current_lane()
+    config = LANES.get(lane, LANES[DEFAULT_LANE])
+    buckets = _buckets_for(endpoint)
+    deadline = time.time() + config['max_wait']
+    queued = False
+
+    while True:
+        try:
+            granted, wait = _try_take(buckets, config['reserve'])
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter unavailable, allowing {endpoint}: {e}")
+            return True
+
+        if granted:
+            _count(lane, 'granted')
+            return True
+        if time.time() + wait > deadline:
+            _count(lane, 'shed')
+            logger.warning(f"FMP budget exhausted: shedding {lane} request for {endpoint}")
+            return False
+        if not queued:
+            _count(lane, 'queued')
+            queued = True
+        time.sleep(min(wait, POLL_INTERVAL))
+
+
+def get_rate_limit_stats():
+    """Returns per-lane counters for this process plus the remaining host-wide budget per bucket."""
+    with _stats_lock:
+        lanes = {lane: dict(counters) for lane, counters in _stats.items()}
+    remaining = {}
+    if RATE_LIMIT_PER_MINUTE > 0:
+        bucket_configs = {name: (capacity, rate) for name, capacity, rate in _buckets_for('')}
+        for family, per_minute in ENDPOINT_LIMITS.items():
+            for name, capacity, rate in _buckets_for(f"/{family}"):
+                bucket_configs[name] = (capacity, rate)
+        try:
+            if shared_cache.SHARED_CACHE_ENABLED:
+                rows = _connection().execute("SELECT name, tokens, updated_at FROM rate_buckets").fetchall()
+            else:
+                with _local_lock:
+                    rows = [(name, tokens, updated_at) for name, (tokens, updated_at) in _local_buckets.items()]
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read rate limiter state: {e}")
+            rows = []
+        now = time.time()
+        levels = {name: (tokens, updated_at) for name, tokens, updated_at in rows}
+        for name, (capacity, rate) in bucket_configs.items():
+            tokens, updated_at = levels.get(name, (capacity, now))
+            remaining[name] = {
+                'tokens': round(min(capacity, tokens + (now - updated_at) * rate), 2),
+                'capacity': capacity,
+                'per_minute': round(rate * 60, 2),
+            }
+    return {'lanes': lanes, 'remaining': remaining}
@@ -0,0 +1,194 @@
+# app/api_clients/shared_cache.py
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# One SQLite file per host, shared by every gunicorn worker and the alert worker.
+SHARED_CACHE_ENABLED = os.environ.get('FMP_SHARED_CACHE', '1') != '0'
+SHARED_CACHE_PATH = os.environ.get('FMP_SHARED_CACHE_PATH') or \
+    os.path.join(tempfile.gettempdir(), 'synapse_fmp_cache.sqlite3')
+BUSY_TIMEOUT_MS = 2000
+PURGE_INTERVAL_SECONDS = 10 * 60
+# Entries are kept this long past their stale window as last-known-good values,
+# served (marked stale) only when the upstream is failing.
+LAST_GOOD_SECONDS = int(os.environ.get('FMP_CACHE_LAST_GOOD_HOURS', 24)) * 60 * 60
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready_pid = None
+_last_purge = 0.0
+
+
+def get_connection():
+    """
+    Returns this thread's connection to the shared cache database.
+    Connections are per thread and per process, as sqlite3 connections must not cross either.
+    """
+    global _schema_ready_pid
+    pid = os.getpid()
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'pid', None) == pid:
+        return conn
+
+    conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    with _schema_lock:
+        if _schema_ready_pid != pid:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " stale_until REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fetch_locks ("
+                " key TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            _schema_ready_pid = pid
+    _local.conn = conn
+    _local.pid = pid
+    return conn
+
+
+def get(key):
+    """Returns (value, state, expires_at); state is 'fresh', 'stale' or None on a miss."""
+    if not SHARED_CACHE_ENABLED:
+        return None, None, None
+    try:
+        row = get_connection().execute(
+            "SELECT value, expires_at, stale_until FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache read failed for {key}: {e}")
+        return None, None, None
+
+    if row is None:
+        return None, None, None
+    value, expires_at, stale_until = row
+    now = time.time()
+    if now < expires_at:
+        return json.loads(value), 'fresh', expires_at
+    if now < stale_until:
+        return json.loads(value), 'stale', expires_at
+    return None, None, None
+
+
+def get_last_good(key):
+    """Returns the stored value for `key` regardless of age (None if absent)."""
+    if not SHARED_CACHE_ENABLED:
+        return None
+    try:
+        row = get_connection().execute(
+            "SELECT value FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache read failed for {key}: {e}")
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def set(key, value, expires_at, stale_until):
+    if not SHARED_CACHE_ENABLED:
+        return
+    try:
+        conn = get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at, stale_until) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), expires_at, stale_until)
+        )
+        _maybe_purge(conn)
+    except (sqlite3.Error, TypeError, ValueError) as e:
+        logger.warning(f"Shared cache write failed for {key}: {e}")
+
+
+def delete(key):
+    if not SHARED_CACHE_ENABLED:
+        return
+    try:
+        get_connection().execute("DELETE FROM response_cache WHERE key = ?", (key,))
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache delete failed for {key}: {e}")
+
+
+def delete_prefix(prefix):
+    """Drops every entry whose key starts with `prefix` (used by cache_clear)."""
+    if not SHARED_CACHE_ENABLED:
+        return
+    try:
+        get_connection().execute(
+            "DELETE FROM response_cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache clear failed for {prefix}: {e}")
+
+
+def _lock_owner():
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def try_acquire_lock(key, ttl):
+    """
+    Takes the host-wide fetch lock for `key` unless another live holder has it.
+    Locks expire after `ttl` seconds so a crashed worker cannot block a key forever.
+    Returns True when acquired; on any database error returns True so callers just fetch.
+    """
+    if not SHARED_CACHE_ENABLED:
+        return True
+    now = time.time()
+    try:
+        cursor = get_connection().execute(
+            "INSERT INTO fetch_locks (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE fetch_locks.expires_at < ?",
+            (key, _lock_owner(), now + ttl, now)
+        )
+        return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache lock failed for {key}: {e}")
+        return True
+
+
+def is_locked(key):
+    if not SHARED_CACHE_ENABLED:
+        return False
+    try:
+        row = get_connection().execute(
+            "SELECT 1 FROM fetch_locks WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+    except sqlite3.Error:
+        return False
+
+
+def release_lock(key):
+    if not SHARED_CACHE_ENABLED:
+        return
+    try:
+        get_connection().execute(
+            "DELETE FROM fetch_locks WHERE key = ? AND owner = ?", (key, _lock_owner())
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache unlock failed for {key}: {e}")
+
+
+def _maybe_purge(conn):
+    """Periodically removes entries past their last-known-good window so the file stays small."""
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    conn.execute("DELETE FROM response_cache WHERE stale_until < ?", (now - LAST_GOOD_SECONDS,))
+    conn.execute("DELETE FROM fetch_locks WHERE expires_at < ?", (now,))
@@ -112,3 +112,28 @@ class Alert(db.Model):
     def __repr__(self):
         status = 'Active' if self.is_active else f'Triggered at {self.triggered_at}'
         return f'<Alert for {self.symbol} {self.condition} {self.target_price} - {status}>'
+
+class DailyBar(db.Model):
+    """One daily OHLCV bar, stored locally so history is only fetched as deltas."""
+    __tablename__ = 'daily_bar'
+    symbol = db.Column(db.String(20), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    open = db.Column(db.Float, nullable=True)
+    high = db.Column(db.Float, nullable=True)
+    low = db.Column(db.Float, nullable=True)
+    close = db.Column(db.Float, nullable=False)
+    adj_close = db.Column(db.Float, nullable=True)
+    volume = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<DailyBar {self.symbol} {self.date} C:{self.close}>'
+
+class PriceSyncState(db.Model):
+    """Per-symbol watermark: the newest stored bar and when the symbol was last synced."""
+    __tablename__ = 'price_sync_state'
+    symbol = db.Column(db.String(20), primary_key=True)
+    last_bar_date = db.Column(db.Date, nullable=True)
+    synced_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<PriceSyncState {self.symbol} last:{self.last_bar_date} synced:{self.synced_at}>'
@@ -12,6 +12,7 @@ from decimal import Decimal, InvalidOperation
 from functools import wraps
 from collections import defaultdict
 import pandas as pd
+import numpy as np
 
 # --- Get Logger ---
 logger = logging.getLogger(__name__)
@@ -27,12 +28,28 @@ ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD')
 # --- Constants ---
 WATCHLIST_LIMIT_FREE = 5
 ALERTS_LIMIT_PRO = 20
+TECHNICALS_BATCH_LIMIT = 200
 
 # --- Import API Clients & Services ---
+# The breaker module is stdlib-only and backs the per-request hooks below, so it is
+# imported outside the guarded block.
+from .api_clients import circuit_breaker
 try:
     from .api_clients import fmp_client
-    from .services.technical_analyzer import calculate_indicators
-    from .services.backtesting_engine import run_sma_crossover_backtest
+    from .api_clients import fmp_async_client
+    from .services.technical_analyzer import (
+        TIMEFRAMES, TIMEFRAME_DAYS, calculate_indicators, calculate_indicators_batch,
+        calculate_selected_indicators, get_timeframe_series, parse_indicator_specs, resample
+    )
+    from .services import price_store
+    from .services import symbol_index
+    from .services import earnings_calendar
+    from .services import indicator_state
+    from .services import indicator_cache
+    from .services.backtesting_engine import run_backtest
+    from .services import strategies
+    from .services import backtest_optimizer
+    from .services import portfolio_backtest
     logger.info("Successfully imported FMP client and services.")
 except ImportError as e:
     logger.critical(f"FATAL: Could not import API clients/services: {e}", exc_info=True)
@@ -45,7 +62,22 @@ except ImportError as e:
                 return None
             return method
     def calculate_indicators(historical_data_list): return {"error": "Analysis service unavailable."}
-    def run_sma_crossover_backtest(symbol, start_date, end_date, initial_capital, asset_class='Stock'): return {"error": "Backtesting service unavailable."}
+    def run_backtest(symbol, start_date, end_date, initial_capital, strategy_params=None, asset_class='Stock', mode='vectorized'): return {"error": "Backtesting service unavailable."}
+
+
+# --- Stale Data Flagging ---
+# Responses built from last-known-good upstream data (circuit open or upstream failing)
+# carry an X-Data-Stale header naming the stale sources.
+@app.before_request
+def track_stale_upstream_data():
+    circuit_breaker.track_stale()
+
+@app.after_request
+def flag_stale_upstream_data(response):
+    sources = circuit_breaker.stale_sources()
+    if sources:
+        response.headers['X-Data-Stale'] = ','.join(sources)
+    return response
 
 
 # --- Decorators ---
@@ -121,6 +153,19 @@ def admin_panel():
     
     return render_template('admin.html', pro_users=pro_users, free_users=free_users)
 
+@app.route('/admin-panel/metrics')
+@admin_required
+def admin_metrics():
+    """Exposes upstream client counters for the running worker process."""
+    return jsonify({
+        "pid": os.getpid(),
+        "connection_pool": fmp_client.get_connection_pool_stats(),
+        "response_cache": fmp_client.get_response_cache_stats(),
+        "rate_limit": fmp_client.get_rate_limit_stats(),
+        "circuit_breakers": fmp_client.get_circuit_breaker_stats(),
+        "indicator_cache": indicator_cache.get_stats()
+    })
+
 
 @app.route('/')
 def index():
@@ -235,11 +280,14 @@ def portfolio_page():
     symbols = [h.symbol for h in user_holdings]
     if symbols:
         try:
-            quotes_list = fmp_client.get_quote(",".join(symbols))
-            profiles_list = [fmp_client.get_company_profile(s) for s in symbols]
+            # Quotes and profiles are each one batched request, run concurrently.
+            quotes_list, profiles = fmp_async_client.gather(
+                fmp_async_client.get_quote(",".join(symbols)),
+                fmp_async_client.get_company_profiles(symbols)
+            )
 
             quotes = {q['symbol']: q for q in quotes_list if q and 'symbol' in q} if quotes_list else {}
-            profiles = {p['symbol']: p for p in profiles_list if p and 'symbol' in p} if profiles_list else {}
+            profiles = profiles or {}
 
             for h in user_holdings:
                 holding_symbol = h.symbol
@@ -618,15 +666,53 @@ def show_rating(symbol):
     data = fmp_client.get_stock_rating(symbol)
     return jsonify(data or {})
 
+def _technicals_response(symbol, timeframe):
+    """
+    Latest indicators plus the bar history for `symbol` on `timeframe`.
+    ?indicators=sma:20,ema:50,macd,bbands:20:2,atr,stoch,obv,vwap selects what is computed;
+    without it the dashboard set is returned.
+    """
+    if timeframe not in TIMEFRAMES:
+        return jsonify({"error": f"Unknown timeframe '{timeframe}'. Available: {', '.join(TIMEFRAMES)}."}), 400
+    selection = request.args.get('indicators', '').strip()
+    specs = indicator_cache.DEFAULT_SET
+    if selection:
+        try:
+            specs = parse_indicator_specs(selection)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Repeat views within the revalidation window are served straight from the memo
+    body = indicator_cache.get_recent(symbol, specs, timeframe)
+    if body is None:
+        history = get_timeframe_series(symbol, timeframe)
+        if not history:
+            label = "Hourly historical" if timeframe == 'hourly' else "Historical"
+            return jsonify({"error": f"{label} data unavailable"}), 500
+
+        def compute():
+            if selection:
+                result = calculate_selected_indicators(history, specs)
+            elif timeframe == 'daily':
+                # Indicator values come from the streamed per-symbol state; only new bars are applied
+                state = indicator_state.sync_state(symbol, history)
+                # calculate_indicators returns data in the format the frontend expects
+                result = calculate_indicators(history, state=state)
+            else:
+                result = calculate_indicators(history)
+            if timeframe == 'hourly' and 'history' in result:
+                # Intraday charts take the upstream bars as they are (served from the response cache)
+                result['history'] = fmp_client.get_historical_data_hourly(symbol)
+            return result
+        body = indicator_cache.get_or_compute(symbol, history, compute, specs, timeframe)
+    return app.response_class(body, mimetype='application/json')
+
 @app.route('/technicals/<string:symbol>')
 @login_required
 @pro_required
 def show_technicals(symbol):
-    history = fmp_client.get_historical_data(symbol)
-    if not history:
-        return jsonify({"error": "Historical data unavailable"}), 500
-    # calculate_indicators returns data in the format the frontend expects
-    return jsonify(calculate_indicators(history))
+    """?timeframe=daily (default), weekly, monthly or hourly."""
+    return _technicals_response(symbol.upper(), request.args.get('timeframe', 'daily').strip().lower())
 
 @app.route('/news/<string:symbol>')
 @login_required
@@ -639,26 +725,14 @@ def show_news(symbol):
 @login_required
 @pro_required
 def show_technicals_hourly(symbol):
-    """Provides 1-hour historical data for intraday charts."""
-    history = fmp_client.get_historical_data_hourly(symbol)
-    if not history:
-        return jsonify({"error": "Hourly historical data unavailable"}), 500
-    
-    # For hourly data, we just return it directly without technicals
-    return jsonify({"history": history})
+    """Provides 1-hour historical data for intraday charts, with indicators computed on the hourly bars."""
+    return _technicals_response(symbol.upper(), 'hourly')
 
 @app.route('/earnings/<string:symbol>')
 @login_required
 @pro_required
 def show_earnings(symbol):
-    today = date.today()
-    end_date = today + timedelta(days=90)
-    events = fmp_client.get_earnings_calendar(today.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-    if not events:
-        return jsonify([])
-    
-    symbol_events = [event for event in events if event.get('symbol', '').upper() == symbol.upper()]
-    return jsonify(symbol_events)
+    return jsonify(earnings_calendar.get_symbol_events(symbol))
 
 @app.route('/fundamentals/<string:statement_type>/<string:symbol>')
 @login_required
@@ -675,7 +749,7 @@ def get_fundamental_statement_data(statement_type, symbol):
 @app.route('/search/<string:query>')
 @login_required
 def search_symbols_api(query):
-    data = fmp_client.search_symbol(query)
+    data = symbol_index.search(query)
     return jsonify(data or [])
 
 @app.route('/api/stock-screener')
@@ -703,6 +777,39 @@ def run_stock_screener():
     results = fmp_client.stock_screener(filters, limit=100)
     return jsonify(results or [])
 
+@app.route('/api/technicals/batch', methods=['GET', 'POST'])
+@login_required
+@pro_required
+def technicals_batch_api():
+    """
+    Latest indicators for many symbols in one vectorized pass.
+    Symbols come from ?symbols=AAPL,MSFT or a JSON body {"symbols": [...]}; without either,
+    the user's watchlist is used. ?timeframe=weekly or monthly resamples each daily series.
+    """
+    payload = request.get_json(silent=True) or {}
+    timeframe = str(payload.get('timeframe') or request.args.get('timeframe', 'daily')).strip().lower()
+    if timeframe not in TIMEFRAME_DAYS:
+        return jsonify({"error": f"Batch technicals support the {', '.join(TIMEFRAME_DAYS)} timeframes."}), 400
+    raw = payload.get('symbols') or request.args.get('symbols', '')
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    symbols = list(dict.fromkeys(str(s).strip().upper() for s in raw if str(s).strip()))
+    if not symbols:
+        symbols = [item.symbol for item in current_user.watchlist_items]
+    if not symbols:
+        return jsonify({"error": "No symbols provided."}), 400
+    if len(symbols) > TECHNICALS_BATCH_LIMIT:
+        return jsonify({"error": f"At most {TECHNICALS_BATCH_LIMIT} symbols per request."}), 400
+
+    series_by_symbol = price_store.get_series_many(symbols, days=TIMEFRAME_DAYS[timeframe])
+    if timeframe != 'daily':
+        series_by_symbol = {symbol: resample(series, timeframe) for symbol, series in series_by_symbol.items()}
+    results = calculate_indicators_batch(series_by_symbol)
+    return jsonify({
+        "indicators": results,
+        "missing": [s for s in symbols if s not in results]
+    })
+
 @app.route('/api/journal/stats')
 @login_required
 def journal_stats_api():
@@ -753,17 +860,24 @@ def run_backtest_api():
         initial_capital = request.args.get('initial_capital', 10000, type=float)
         strategy = request.args.get('strategy')
         asset_class = request.args.get('asset_class', 'Stock')
+        # 'loop' runs the bar-by-bar reference engine, for cross-checking the default vectorized one
+        mode = request.args.get('mode', 'vectorized')
 
         # --- Basic validation ---
         if not all([symbol, start_date, end_date, strategy]):
             return jsonify({"error": "Missing required parameters (symbol, start_date, end_date, strategy)."}), 400
 
-        # --- Run the appropriate backtest ---
-        results = None
-        if strategy == 'sma_crossover':
-            results = run_sma_crossover_backtest(symbol, start_date, end_date, initial_capital, asset_class)
-        else:
+        # --- Run the requested strategy from the registry ---
+        if strategy not in strategies.STRATEGIES:
             return jsonify({"error": "Invalid strategy specified."}), 400
+        strategy_params = {'name': strategy}
+        for param, (kind, *_) in strategies.get_strategy(strategy).params.items():
+            if param in request.args:
+                value = request.args.get(param, type=kind)
+                if value is None:
+                    return jsonify({"error": f"Invalid value for {param}."}), 400
+                strategy_params[param] = value
+        results = run_backtest(symbol, start_date, end_date, initial_capital, strategy_params, asset_class, mode=mode)
 
         if results is None:
              return jsonify({"error": "Backtest could not be completed. Not enough historical data for the selected range and strategy."}), 400
@@ -777,6 +891,165 @@ def run_backtest_api():
         logger.error(f"Unhandled exception in backtest API for user {current_user.id}: {e}", exc_info=True)
         return jsonify({"error": "An unexpected server error occurred."}), 500
 
+@app.route('/api/backtest/strategies')
+@login_required
+@pro_required
+def backtest_strategies_api():
+    """The registered backtest strategies and their parameters (types, defaults, bounds)."""
+    return jsonify(strategies.list_strategies())
+
+@app.route('/api/run-backtest/sweep', methods=['GET', 'POST'])
+@login_required
+@pro_required
+def run_backtest_sweep_api():
+    """
+    Runs a backtest for every combination of a parameter grid and returns the ranked KPIs.
+    JSON body (or query string): symbol, start_date, end_date, strategy, grid
+    ({"short_window": [10, 20, 50], "long_window": "100:200:50", "initial_capital": [10000]};
+    in a query string each grid parameter is its own argument), rank_by and top.
+    """
+    payload = request.get_json(silent=True) or {}
+    args = {**request.args.to_dict(), **payload}
+    symbol = str(args.get('symbol', '')).upper().strip()
+    start_date, end_date = args.get('start_date'), args.get('end_date')
+    strategy = str(args.get('strategy', 'sma_crossover'))
+    if strategy not in strategies.STRATEGIES:
+        return jsonify({"error": "Invalid strategy specified."}), 400
+    grid = args.get('grid') or {name: args[name] for name in backtest_optimizer.sweep_parameters(strategy) if name in args}
+
+    if not all([symbol, start_date, end_date]) or not grid:
+        return jsonify({"error": "Missing required parameters (symbol, start_date, end_date, grid)."}), 400
+    if not isinstance(grid, dict):
+        return jsonify({"error": "grid must be an object of parameter values."}), 400
+
+    with backtest_optimizer.user_slot(current_user.id) as acquired:
+        if not acquired:
+            return jsonify({"error": "A parameter sweep is already running for your account. Try again when it finishes."}), 429
+        try:
+            top = int(args['top']) if args.get('top') else None
+            results = backtest_optimizer.run_parameter_sweep(
+                symbol, start_date, end_date, grid, rank_by=args.get('rank_by', 'total_return_pct'),
+                top=top, asset_class=args.get('asset_class', 'Stock'), strategy=strategy)
+        except ValueError as ve:
+            logger.warning(f"ValueError in backtest sweep for user {current_user.id}: {ve}")
+            return jsonify({"error": str(ve)}), 400
+        except Exception as e:
+            logger.error(f"Unhandled exception in backtest sweep for user {current_user.id}: {e}", exc_info=True)
+            return jsonify({"error": "An unexpected server error occurred."}), 500
+    return jsonify(results)
+
+@app.route('/api/run-backtest/walk-forward', methods=['GET', 'POST'])
+@login_required
+@pro_required
+def run_backtest_walk_forward_api():
+    """
+    Walk-forward analysis: optimizes a parameter grid on rolling train windows, trades each
+    window's winner on the test window that follows and returns the stitched out-of-sample
+    results. Takes the sweep parameters (without initial_capital in the grid) plus
+    train_bars, test_bars, anchored and initial_capital.
+    """
+    payload = request.get_json(silent=True) or {}
+    args = {**request.args.to_dict(), **payload}
+    symbol = str(args.get('symbol', '')).upper().strip()
+    start_date, end_date = args.get('start_date'), args.get('end_date')
+    strategy = str(args.get('strategy', 'sma_crossover'))
+    if strategy not in strategies.STRATEGIES:
+        return jsonify({"error": "Invalid strategy specified."}), 400
+    grid = args.get('grid') or {name: args[name] for name in strategies.get_strategy(strategy).params if name in args}
+
+    if not all([symbol, start_date, end_date]) or not grid:
+        return jsonify({"error": "Missing required parameters (symbol, start_date, end_date, grid)."}), 400
+    if not isinstance(grid, dict):
+        return jsonify({"error": "grid must be an object of parameter values."}), 400
+
+    with backtest_optimizer.user_slot(current_user.id) as acquired:
+        if not acquired:
+            return jsonify({"error": "A parameter sweep is already running for your account. Try again when it finishes."}), 429
+        try:
+            results = backtest_optimizer.run_walk_forward(
+                symbol, start_date, end_date, grid,
+                train_bars=int(args.get('train_bars', 504)), test_bars=int(args.get('test_bars', 126)),
+                anchored=str(args.get('anchored', '')).lower() in ('1', 'true', 'yes'),
+                rank_by=args.get('rank_by', 'total_return_pct'),
+                initial_capital=float(args.get('initial_capital', 10000)),
+                asset_class=args.get('asset_class', 'Stock'), strategy=strategy)
+        except ValueError as ve:
+            logger.warning(f"ValueError in walk-forward analysis for user {current_user.id}: {ve}")
+            return jsonify({"error": str(ve)}), 400
+        except Exception as e:
+            logger.error(f"Unhandled exception in walk-forward analysis for user {current_user.id}: {e}", exc_info=True)
+            return jsonify({"error": "An unexpected server error occurred."}), 500
+    return jsonify(results)
+
+@app.route('/api/run-backtest/portfolio', methods=['GET', 'POST'])
+@login_required
+@pro_required
+def run_portfolio_backtest_api():
+    """
+    Backtests a multi-asset portfolio with periodic rebalancing.
+    JSON body (or query string): start_date, end_date, symbols (default: the user's
+    holdings), allocation ('equal', 'fixed' or 'signal'), weights ({"AAPL": 0.6, ...}, or
+    "AAPL:0.6,MSFT:0.4"; fixed allocation without weights weighs the holdings by their
+    current value), rebalance, initial_capital, and for 'signal' the strategy and its parameters.
+    """
+    payload = request.get_json(silent=True) or {}
+    args = {**request.args.to_dict(), **payload}
+    start_date, end_date = args.get('start_date'), args.get('end_date')
+    if not all([start_date, end_date]):
+        return jsonify({"error": "Missing required parameters (start_date, end_date)."}), 400
+
+    try:
+        weights = args.get('weights') or None
+        if isinstance(weights, str):
+            weights = dict(pair.split(':', 1) for pair in weights.split(',') if pair.strip())
+        if weights is not None and not isinstance(weights, dict):
+            return jsonify({"error": "weights must be an object of symbol weights."}), 400
+
+        symbols = args.get('symbols') or (list(weights) if weights else [])
+        if isinstance(symbols, str):
+            symbols = symbols.split(',')
+        symbols = [str(s).upper().strip() for s in symbols if str(s).strip()]
+        quantities = None
+        if not symbols:
+            holdings = current_user.holdings.all()
+            if not holdings:
+                return jsonify({"error": "No holdings in portfolio to backtest."}), 404
+            quantities = {}
+            for h in holdings:
+                quantities[h.symbol.upper()] = quantities.get(h.symbol.upper(), 0) + h.quantity
+            symbols = list(quantities)
+
+        allocation = args.get('allocation', 'equal')
+        strategy_params = None
+        if allocation == 'signal':
+            strategy = str(args.get('strategy', 'sma_crossover'))
+            if strategy not in strategies.STRATEGIES:
+                return jsonify({"error": "Invalid strategy specified."}), 400
+            strategy_params = {'name': strategy}
+            for param, (kind, *_) in strategies.get_strategy(strategy).params.items():
+                if param in args:
+                    value = args[param]
+                    if isinstance(value, str):
+                        try:
+                            value = kind(value)
+                        except ValueError:
+                            return jsonify({"error": f"Invalid value for {param}."}), 400
+                    strategy_params[param] = value
+            # Types and bounds from the registry, checked before any prices are loaded
+            strategy_params.update(strategies.get_strategy(strategy).validate(strategy_params))
+
+        results = portfolio_backtest.run_portfolio_backtest(
+            symbols, start_date, end_date, initial_capital=float(args.get('initial_capital', 10000)),
+            allocation=allocation, weights=weights, rebalance=args.get('rebalance', 'monthly'),
+            strategy_params=strategy_params, quantities=quantities)
+    except ValueError as ve:
+        logger.warning(f"ValueError in portfolio backtest for user {current_user.id}: {ve}")
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        logger.error(f"Unhandled exception in portfolio backtest for user {current_user.id}: {e}", exc_info=True)
+        return jsonify({"error": "An unexpected server error occurred."}), 500
+    return jsonify(results)
+
 @app.route('/api/portfolio/advanced-analysis')
 @login_required
 @pro_required
@@ -794,16 +1067,18 @@ def portfolio_advanced_analysis_api():
 
     # --- 1. Batch Fetch API Data ---
     try:
-        # Use batch requests for efficiency
-        quotes_list = fmp_client.get_quote(symbols_str)
-        profiles_list = [fmp_client.get_company_profile(s) for s in symbols] # Profiles might not support batching
-        news_list = fmp_client.get_stock_news(symbols_str, limit=20)
+        # Use batch requests for efficiency; the independent calls run concurrently
+        quotes_list, news_list, profiles = fmp_async_client.gather(
+            fmp_async_client.get_quote(symbols_str),
+            fmp_async_client.get_stock_news(symbols_str, limit=20),
+            fmp_async_client.get_company_profiles(symbols)
+        )
     except Exception as e:
         logger.error(f"API error during portfolio analysis for user {current_user.id}: {e}", exc_info=True)
         return jsonify({"error": "Could not fetch market data for analysis."}), 500
 
     quotes = {q['symbol']: q for q in quotes_list if q and 'symbol' in q} if quotes_list else {}
-    profiles = {p['symbol']: p for p in profiles_list if p and 'symbol' in p} if profiles_list else {}
+    profiles = profiles or {}
 
     # --- 2. Calculate Metrics ---
     total_portfolio_value = Decimal('0.0')
@@ -916,41 +1191,22 @@ def get_chart_data_for_journal(symbol, trade_date_str):
         start_date = trade_date - timedelta(days=30)
         end_date = trade_date + timedelta(days=30)
         
-        # Fetch historical data
-        # The original file fetches up to 365 days, which is good practice
-        historical_data = fmp_client.get_historical_data(symbol, days=365)
-        if not historical_data:
+        # Read only the window around the trade from the local price store
+        series = price_store.get_series(symbol, days=None, start_date=start_date, end_date=end_date)
+        if not series:
             return jsonify({"error": f"No historical data found for {symbol}."}), 404
-            
-        # Filter the data to the desired window using pandas
-        df = pd.DataFrame(historical_data)
-        df['date'] = pd.to_datetime(df['date']).dt.date
-        
-        # --- Start of new/modified code ---
-
-        # 1. Clean data: Drop any rows with nulls in critical columns before filtering
-        df.dropna(subset=['open', 'high', 'low', 'close'], inplace=True)
 
-        mask = (df['date'] >= start_date) & (df['date'] <= end_date)
-        filtered_df = df.loc[mask].copy() # Use .copy() to avoid SettingWithCopyWarning
-
-        # --- End of new/modified code ---
-
-        if filtered_df.empty:
+        # Clean data: Drop any bars with nulls in critical columns
+        ohlc = np.column_stack([series.open, series.high, series.low, series.close])
+        complete = ~np.isnan(ohlc).any(axis=1)
+        if not complete.any():
             return jsonify({"error": "No data available for the period around the trade."}), 404
 
-        # Sort by date to ensure the chart is chronological
-        filtered_df.sort_values(by='date', inplace=True)
-
-        # Format data for the charting library
+        # Format data for the charting library (the series is already chronological)
+        times = series.date_strings()[complete].tolist()
         price_data = [
-            {
-                "time": row.date.strftime('%Y-%m-%d'),
-                "open": row.open,
-                "high": row.high,
-                "low": row.low,
-                "close": row.close
-            } for index, row in filtered_df.iterrows()
+            {"time": t, "open": o, "high": h, "low": l, "close": c}
+            for t, (o, h, l, c) in zip(times, ohlc[complete].tolist())
         ]
 
         return jsonify({"price_data": price_data})
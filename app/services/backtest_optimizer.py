@@ -0,0 +1,480 @@
+# app/services/backtest_optimizer.py
+import os
+import math
+import time
+import logging
+import itertools
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from .price_series import PriceSeries, OHLCV_FIELDS, to_epoch_days
+from .backtesting_engine import (
+    BacktestEngine, backtest_kpis, load_backtest_series, positions_from_signals, simulate_positions,
+    validate_strategy_params
+)
+from .strategies import get_strategy
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+SWEEP_WORKERS = int(os.environ.get('BACKTEST_SWEEP_WORKERS', min(4, os.cpu_count() or 1)))
+SWEEP_MAX_COMBINATIONS = int(os.environ.get('BACKTEST_SWEEP_MAX_COMBINATIONS', 400))
+SWEEP_MAX_CONCURRENT_PER_USER = int(os.environ.get('BACKTEST_SWEEP_MAX_CONCURRENT_PER_USER', 1))
+SWEEP_TIMEOUT_SECONDS = int(os.environ.get('BACKTEST_SWEEP_TIMEOUT_SECONDS', 120))
+# Sweeps this small run in the request process; the pool round trip would cost more
+SWEEP_INLINE_MAX = 4
+# Tasks per worker: enough to balance uneven combinations without per-task overhead
+CHUNKS_PER_WORKER = 4
+WALK_FORWARD_MAX_WINDOWS = int(os.environ.get('BACKTEST_WALK_FORWARD_MAX_WINDOWS', 100))
+WALK_FORWARD_MIN_TRAIN_BARS = 20
+WALK_FORWARD_MIN_TEST_BARS = 5
+
+RANKABLE_KPIS = ('total_return_pct', 'net_pnl', 'win_rate', 'final_equity', 'total_trades')
+
+_SERIES_ROWS = ('date',) + OHLCV_FIELDS
+
+
+# --- Parameter grids ---
+
+def sweep_parameters(strategy_name='sma_crossover'):
+    """
+    Sweepable parameters and their types: the strategy's parameters plus 'initial_capital',
+    which goes to the engine. Raises ValueError for an unknown strategy.
+    """
+    strategy = get_strategy(strategy_name)
+    return {**{param: spec[0] for param, spec in strategy.params.items()}, 'initial_capital': float}
+
+
+def _grid_values(name, kind, values):
+    """A list of values, or a 'start:stop:step' string (stop inclusive)."""
+    if isinstance(values, str) and ':' in values:
+        try:
+            start, stop, *step = (float(v) for v in values.split(':'))
+        except ValueError:
+            raise ValueError(f"Invalid range '{values}' for {name}; use start:stop:step.")
+        step = step[0] if step else 1.0
+        if step <= 0 or stop < start:
+            raise ValueError(f"Invalid range '{values}' for {name}.")
+        values = np.arange(start, stop + step / 2, step).tolist()
+    elif isinstance(values, str):
+        values = values.split(',')
+    elif not isinstance(values, (list, tuple)):
+        values = [values]
+    try:
+        parsed = [float(v) for v in values]
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid values for {name}.")
+    if kind is int:
+        if not all(v.is_integer() for v in parsed):
+            raise ValueError(f"{name} must be whole numbers.")
+        parsed = [int(v) for v in parsed]
+    return list(dict.fromkeys(parsed))
+
+
+def expand_grid(param_grid, strategy_name='sma_crossover'):
+    """
+    Expands {'short_window': [10, 20], 'long_window': '100:200:50', ...} into a list of
+    parameter dicts, dropping combinations the strategy rejects (e.g. short >= long).
+    Raises ValueError for unknown parameters or grids that are empty or too large.
+    """
+    parameters = sweep_parameters(strategy_name)
+    unknown = set(param_grid) - set(parameters)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}. "
+                         f"Available: {', '.join(parameters)}.")
+    names = list(param_grid)
+    axes = [_grid_values(name, parameters[name], param_grid[name]) for name in names]
+    if math.prod(len(axis) for axis in axes) > SWEEP_MAX_COMBINATIONS * 4:
+        raise ValueError(f"Parameter grid is too large (at most {SWEEP_MAX_COMBINATIONS} combinations).")
+
+    combinations = []
+    for values in itertools.product(*axes):
+        params = dict(zip(names, values))
+        if params.get('initial_capital', 1) <= 0:
+            raise ValueError("initial_capital must be positive.")
+        try:
+            validate_strategy_params({'name': strategy_name, **params})
+        except ValueError:
+            continue
+        combinations.append(params)
+    if not combinations:
+        raise ValueError("The parameter grid has no valid combinations.")
+    if len(combinations) > SWEEP_MAX_COMBINATIONS:
+        raise ValueError(f"Parameter grid has {len(combinations)} combinations; at most {SWEEP_MAX_COMBINATIONS} are allowed.")
+    return combinations
+
+
+# --- Workers ---
+
+def _run_combinations(symbol, series, strategy_name, combinations):
+    rows = []
+    for params in combinations:
+        strategy_params = {'name': strategy_name, **params}
+        capital = strategy_params.pop('initial_capital', 10000)
+        result = BacktestEngine(symbol, series, strategy_params, initial_capital=capital).run(details=False)
+        rows.append({**params, **(result['kpis'] if result else {})})
+    return rows
+
+
+def _run_shared_chunk(shm_name, length, symbol, strategy_name, combinations):
+    """
+    Pool task: runs `combinations` against the series in shared memory block `shm_name`.
+    The series arrays are views of the block; nothing but the parameters is pickled.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        block = np.ndarray((len(_SERIES_ROWS), length), dtype=np.float64, buffer=shm.buf)
+        series = PriceSeries(block[0].view(np.int64), *block[1:], symbol=symbol)
+        del block
+        rows = _run_combinations(symbol, series, strategy_name, combinations)
+        # Views into the block must be gone before it can be closed
+        del series
+        return rows
+    finally:
+        shm.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a threaded web worker could copy locks held by other threads (HTTP
+            # pool, SQLite, logging) into the children; forkserver children start clean
+            _pool = ProcessPoolExecutor(max_workers=SWEEP_WORKERS, mp_context=multiprocessing.get_context('forkserver'))
+            logger.info(f"Started backtest sweep pool with {SWEEP_WORKERS} workers.")
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _run_in_pool(symbol, series, strategy_name, combinations):
+    """Copies the series into one shared memory block and fans the combinations out in chunks."""
+    length = len(series)
+    shm = shared_memory.SharedMemory(create=True, size=len(_SERIES_ROWS) * max(length, 1) * 8)
+    try:
+        block = np.ndarray((len(_SERIES_ROWS), length), dtype=np.float64, buffer=shm.buf)
+        block[0] = series.date.view(np.float64)
+        for row, field in enumerate(OHLCV_FIELDS, start=1):
+            block[row] = getattr(series, field)
+        del block
+
+        chunks = _chunks(combinations)
+        pool = _get_pool()
+        futures = [pool.submit(_run_shared_chunk, shm.name, length, symbol, strategy_name, chunk) for chunk in chunks]
+        return [row for rows in _collect(futures, "The sweep took too long; try a smaller parameter grid.")
+                for row in rows]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _chunks(items):
+    chunk_size = max(1, math.ceil(len(items) / (SWEEP_WORKERS * CHUNKS_PER_WORKER)))
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def _collect(futures, timeout_message):
+    """The futures' results in order, all within SWEEP_TIMEOUT_SECONDS; ValueError on timeout."""
+    try:
+        deadline = time.monotonic() + SWEEP_TIMEOUT_SECONDS
+        return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+    except FuturesTimeoutError:
+        for future in futures:
+            future.cancel()
+        raise ValueError(timeout_message)
+    except BrokenProcessPool:
+        logger.error("Backtest sweep pool broke; it will be restarted for the next sweep.")
+        _reset_pool()
+        raise
+
+
+# --- Sweeps ---
+
+def run_parameter_sweep(symbol, start_date, end_date, param_grid, rank_by='total_return_pct', top=None,
+                        asset_class='Stock', strategy='sma_crossover'):
+    """
+    Backtests every combination in `param_grid` for a registered strategy against one
+    shared price series and returns the KPI table ranked by `rank_by` (best first).
+    """
+    if rank_by not in RANKABLE_KPIS:
+        raise ValueError(f"Cannot rank by '{rank_by}'. Use one of: {', '.join(RANKABLE_KPIS)}.")
+    combinations = expand_grid(param_grid, strategy)
+    definition = get_strategy(strategy)
+    longest = max(definition.warmup_bars(definition.validate(params)) for params in combinations)
+    series = load_backtest_series(symbol, start_date, end_date, warmup_bars=longest, asset_class=asset_class)
+
+    started = time.perf_counter()
+    if len(combinations) <= SWEEP_INLINE_MAX or SWEEP_WORKERS <= 1:
+        rows = _run_combinations(symbol, series, strategy, combinations)
+    else:
+        rows = _run_in_pool(symbol, series, strategy, combinations)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Swept {len(combinations)} combinations for {symbol} in {elapsed_ms:.0f} ms.")
+
+    # Combinations without enough history for their windows have no KPIs and rank last
+    rows.sort(key=lambda row: (rank_by in row, row.get(rank_by, 0)), reverse=True)
+    rows = [{'rank': rank, **row} for rank, row in enumerate(rows, start=1)]
+    return {
+        "symbol": symbol,
+        "strategy": strategy,
+        "ranked_by": rank_by,
+        "combinations": len(combinations),
+        "elapsed_ms": round(elapsed_ms, 1),
+        "results": rows[:top] if top else rows
+    }
+
+
+# --- Walk-forward analysis ---
+
+def walk_forward_windows(start, end, train_bars, test_bars, anchored=False):
+    """
+    (train_start, test_start, test_end) bar indexes over [start, end). Each train window is
+    followed by its test window, and windows step forward by test_bars, so the test windows
+    tile the out-of-sample period; the last one may be shorter. Anchored train windows all
+    start at `start` and grow; rolling ones keep train_bars bars.
+    """
+    windows = []
+    test_start = start + train_bars
+    while test_start < end:
+        train_start = start if anchored else test_start - train_bars
+        windows.append((train_start, test_start, min(test_start + test_bars, end)))
+        test_start += test_bars
+    return windows
+
+
+def _best_column(close, entries, exits, rank_by, capital):
+    """The parameter set (signal column) with the best `rank_by` KPI over the bars given, and its KPIs."""
+    held = positions_from_signals(entries, exits)
+    best, best_kpis = 0, None
+    for column in range(held.shape[1]):
+        fills = simulate_positions(close, held[:, column], capital)
+        kpis = backtest_kpis(capital, float(fills['equity'][-1]), fills['pnl'].tolist())
+        if best_kpis is None or kpis[rank_by] > best_kpis[rank_by]:
+            best, best_kpis = column, kpis
+    return best, best_kpis
+
+
+def _evaluate_windows(close, entries, exits, windows, rank_by, capital):
+    """
+    Picks the best parameter set on each window's train bars and trades it on the test bars,
+    starting flat with `capital`. The signal arrays cover the whole series; windows only
+    slice them, so no indicator is recomputed per window.
+    """
+    results = []
+    for train_start, test_start, test_end in windows:
+        train, test = slice(train_start, test_start), slice(test_start, test_end)
+        best, train_kpis = _best_column(close[train], entries[train], exits[train], rank_by, capital)
+        held = positions_from_signals(entries[test, best], exits[test, best])
+        fills = simulate_positions(close[test], held, capital)
+        results.append({'best': best, 'train_kpis': train_kpis, 'open_at_end': bool(held[-1]), **fills})
+    return results
+
+
+def _share_arrays(arrays):
+    """Copies `arrays` into one new shared memory block; returns it and the (dtype, shape, offset) layout."""
+    layout, offset = [], 0
+    for array in arrays:
+        layout.append((array.dtype.str, array.shape, offset))
+        offset += -(-array.nbytes // 8) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, view in zip(arrays, _attach_arrays(shm, layout)):
+        view[...] = array
+    return shm, layout
+
+
+def _attach_arrays(shm, layout):
+    return [np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset) for dtype, shape, offset in layout]
+
+
+def _run_shared_windows(shm_name, layout, windows, rank_by, capital):
+    """Pool task: evaluates `windows` against the close and signal arrays in shared memory block `shm_name`."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        close, entries, exits = _attach_arrays(shm, layout)
+        results = _evaluate_windows(close, entries, exits, windows, rank_by, capital)
+        # Views into the block must be gone before it can be closed
+        del close, entries, exits
+        return results
+    finally:
+        shm.close()
+
+
+def _run_windows_in_pool(close, entries, exits, windows, rank_by, capital):
+    """Shares the close and signal arrays once and fans the windows out in chunks."""
+    shm, layout = _share_arrays((close, entries, exits))
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(_run_shared_windows, shm.name, layout, chunk, rank_by, capital)
+                   for chunk in _chunks(windows)]
+        message = "The walk-forward analysis took too long; try a smaller parameter grid or fewer windows."
+        return [result for results in _collect(futures, message) for result in results]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def run_walk_forward(symbol, start_date, end_date, param_grid, train_bars=504, test_bars=126, anchored=False,
+                     rank_by='total_return_pct', initial_capital=10000, asset_class='Stock', strategy='sma_crossover'):
+    """
+    Walk-forward analysis of a registered strategy: from `start_date`, picks the best
+    combination of `param_grid` (by `rank_by`) on each train window, trades it on the test
+    window that follows, and stitches the test windows into one out-of-sample equity curve.
+    Each test window starts flat with the equity the previous one ended with; a position
+    still open at the end of a window is closed at that bar's close, except in the last.
+    """
+    if rank_by not in RANKABLE_KPIS:
+        raise ValueError(f"Cannot rank by '{rank_by}'. Use one of: {', '.join(RANKABLE_KPIS)}.")
+    if 'initial_capital' in param_grid:
+        raise ValueError("initial_capital is not a walk-forward parameter; pass it on its own.")
+    if train_bars < WALK_FORWARD_MIN_TRAIN_BARS or test_bars < WALK_FORWARD_MIN_TEST_BARS:
+        raise ValueError(f"train_bars must be at least {WALK_FORWARD_MIN_TRAIN_BARS} "
+                         f"and test_bars at least {WALK_FORWARD_MIN_TEST_BARS}.")
+    if initial_capital <= 0:
+        raise ValueError("initial_capital must be positive.")
+    combinations = expand_grid(param_grid, strategy)
+    definition = get_strategy(strategy)
+    param_sets = [{'name': strategy, **params} for params in combinations]
+    longest = max(definition.warmup_bars(definition.validate(params)) for params in param_sets)
+    series = load_backtest_series(symbol, start_date, end_date, warmup_bars=longest, asset_class=asset_class)
+
+    started = time.perf_counter()
+    # Signals for every combination over the whole history, computed once
+    entries, exits, ready = definition.signal_matrix(series, param_sets)
+    all_ready = ready.all(axis=1)
+    first = int(np.searchsorted(series.date, to_epoch_days(start_date)))
+    first = max(first, int(all_ready.argmax())) if all_ready.any() else len(series)
+    windows = walk_forward_windows(first, len(series), train_bars, test_bars, anchored)
+    if not windows:
+        raise ValueError("Not enough history for a train window and a test window; "
+                         "use a wider date range or smaller train_bars.")
+    if len(windows) > WALK_FORWARD_MAX_WINDOWS:
+        raise ValueError(f"The analysis has {len(windows)} windows; at most {WALK_FORWARD_MAX_WINDOWS} "
+                         f"are allowed. Use larger test_bars.")
+
+    close = series.close
+    if len(windows) * len(combinations) <= SWEEP_INLINE_MAX or SWEEP_WORKERS <= 1:
+        results = _evaluate_windows(close, entries, exits, windows, rank_by, initial_capital)
+    else:
+        results = _run_windows_in_pool(close, entries, exits, windows, rank_by, initial_capital)
+
+    # --- Stitch the test windows ---
+    # Fills scale linearly with capital, so each window's results for initial_capital are
+    # rescaled to the equity the previous window ended with.
+    dates = series.date_strings().tolist()
+    equity_parts, trades, window_rows = [], [], []
+    equity = float(initial_capital)
+    for number, ((train_start, test_start, test_end), result) in enumerate(zip(windows, results), start=1):
+        scale = equity / initial_capital
+        last_window = number == len(windows)
+        trade_pnl = []
+        for k, entry in enumerate((result['entries'] + test_start).tolist()):
+            if k < len(result['exits']):
+                exit_ = int(result['exits'][k]) + test_start
+                pnl = float(result['pnl'][k])
+            elif not last_window:
+                exit_ = test_end - 1
+                pnl = float((close[exit_] - close[entry]) * result['sizes'][k])
+            else:
+                exit_ = pnl = None
+            if pnl is not None:
+                trade_pnl.append(pnl)
+            trades.append({
+                'entry_date': dates[entry], 'entry_price': float(close[entry]),
+                'exit_date': None if exit_ is None else dates[exit_],
+                'exit_price': None if exit_ is None else float(close[exit_]),
+                'pnl': None if pnl is None else pnl * scale
+            })
+        window_rows.append({
+            'window': number,
+            'train_start': dates[train_start], 'train_end': dates[test_start - 1],
+            'test_start': dates[test_start], 'test_end': dates[test_end - 1],
+            'params': combinations[result['best']],
+            'train_kpis': result['train_kpis'],
+            'test_kpis': backtest_kpis(float(initial_capital), float(result['equity'][-1]), trade_pnl)
+        })
+        equity_parts.append(result['equity'] * scale)
+        equity = float(equity_parts[-1][-1])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Walk-forward for {symbol}: {len(windows)} windows x {len(combinations)} combinations "
+                f"in {elapsed_ms:.0f} ms.")
+
+    out_of_sample = np.concatenate(equity_parts)
+    closed_pnl = [trade['pnl'] for trade in trades if trade['pnl'] is not None]
+    oos_start = windows[0][1]
+    return {
+        "symbol": symbol,
+        "strategy": strategy,
+        "ranked_by": rank_by,
+        "train_bars": train_bars,
+        "test_bars": test_bars,
+        "anchored": anchored,
+        "combinations": len(combinations),
+        "elapsed_ms": round(elapsed_ms, 1),
+        "windows": window_rows,
+        "kpis": backtest_kpis(float(initial_capital), equity, closed_pnl),
+        "equity_curve": [{'date': d, 'value': v}
+                         for d, v in zip(dates[oos_start:oos_start + len(out_of_sample)], out_of_sample.tolist())],
+        "trades": trades
+    }
+
+
+# --- Per-user concurrency ---
+# Each slot is a row in the shared cache's host-wide lock table, so the limit holds across
+# every gunicorn worker. The in-process count also enforces it when the shared cache is
+# disabled. A slot lock outlives a normal sweep but expires if its worker dies.
+SLOT_LOCK_SECONDS = 2 * SWEEP_TIMEOUT_SECONDS + 60
+
+_active_sweeps = {}
+_active_lock = threading.Lock()
+
+
+def _acquire_shared_slot(user_id):
+    """The key of a free host-wide slot for `user_id` after taking it, or None if all are held."""
+    from ..api_clients import shared_cache
+
+    for slot in range(SWEEP_MAX_CONCURRENT_PER_USER):
+        key = f"backtest_sweep:{user_id}:{slot}"
+        if shared_cache.try_acquire_lock(key, SLOT_LOCK_SECONDS):
+            return key
+    return None
+
+
+@contextmanager
+def user_slot(user_id):
+    """
+    Yields True while `user_id` holds one of its SWEEP_MAX_CONCURRENT_PER_USER sweep slots
+    on this host, or False (nothing held) when all are in use.
+    """
+    from ..api_clients import shared_cache
+
+    with _active_lock:
+        acquired = _active_sweeps.get(user_id, 0) < SWEEP_MAX_CONCURRENT_PER_USER
+        if acquired:
+            _active_sweeps[user_id] = _active_sweeps.get(user_id, 0) + 1
+    slot_key = _acquire_shared_slot(user_id) if acquired else None
+    try:
+        yield slot_key is not None
+    finally:
+        if slot_key is not None:
+            shared_cache.release_lock(slot_key)
+        if acquired:
+            with _active_lock:
+                _active_sweeps[user_id] -= 1
+                if not _active_sweeps[user_id]:
+                    del _active_sweeps[user_id]
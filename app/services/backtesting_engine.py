@@ -1,19 +1,100 @@
 # app/services/backtesting_engine.py
 import pandas as pd
+import numpy as np
 import logging
 from datetime import datetime
 
+from .price_series import PriceSeries
+from .strategies import get_strategy
+
 logger = logging.getLogger(__name__)
 
+# 'vectorized' derives positions, fills and equity from whole arrays; 'loop' is the original
+# bar-by-bar simulation, kept as the reference the vectorized mode is checked against.
+BACKTEST_MODES = ('vectorized', 'loop')
+
+
+
+def validate_strategy_params(strategy_params):
+    """
+    Returns the registered strategy named by strategy_params['name'] (default
+    'sma_crossover') and its validated parameters; raises ValueError if either is invalid.
+    """
+    strategy = get_strategy(strategy_params.get('name'))
+    return strategy, strategy.validate(strategy_params)
+
+
+def positions_from_signals(entries, exits):
+    """
+    Long (True) or flat after each bar, from boolean entry/exit arrays along axis 0.
+    A bar with exactly one of the two decides the state; other bars keep it.
+    """
+    decided = entries != exits
+    rows = np.arange(len(entries)).reshape((-1,) + (1,) * (entries.ndim - 1))
+    # Index of the latest bar that decided the state (-1 before the first one)
+    last_decided = np.maximum.accumulate(np.where(decided, rows, -1), axis=0)
+    return (last_decided >= 0) & np.take_along_axis(entries, np.maximum(last_decided, 0), axis=0)
+
+
+
+def simulate_positions(close, held, initial_capital):
+    """
+    Long-only fills for a position array: trades from position transitions and the
+    equity curve from each bar's trade size (or cash when flat), selected with cumulative
+    trade counts. All capital is reinvested in each trade, as in the loop. Returns a dict of
+    entry and exit bar indexes, trade sizes, closed-trade P&L, per-bar equity and ending cash.
+    """
+    was_held = np.r_[False, held[:-1]]
+    entering, exiting = held & ~was_held, ~held & was_held
+    entries, exits = np.flatnonzero(entering), np.flatnonzero(exiting)
+
+    entry_prices, exit_prices = close[entries], close[exits]
+    # cash[k] is the cash after k closed trades; trade k is opened with all of it. The
+    # compounding runs once per trade, not per bar, in the loop's operation order so
+    # the two modes agree to the last bit.
+    cash = np.empty(len(exits) + 1)
+    sizes = np.empty(len(entries))
+    cash[0] = initial_capital
+    for k, entry_price in enumerate(entry_prices.tolist()):
+        sizes[k] = cash[k] / entry_price
+        if k < len(exits):
+            cash[k + 1] = sizes[k] * exit_prices[k]
+    pnl = (exit_prices - entry_prices[:len(exits)]) * sizes[:len(exits)]
+
+    size_per_bar = np.zeros(len(close))
+    if len(entries):
+        size_per_bar = sizes[np.maximum(np.cumsum(entering) - 1, 0)]
+    equity = np.where(held, size_per_bar * close, cash[np.cumsum(exiting)])
+    return {'entries': entries, 'exits': exits, 'sizes': sizes, 'pnl': pnl, 'equity': equity, 'cash': cash[-1]}
+
+
+def backtest_kpis(initial_capital, final_equity, closed_pnl):
+    """The backtest KPIs from the final equity and the P&L of each closed trade."""
+    net_pnl = final_equity - initial_capital
+    total_return_pct = (net_pnl / initial_capital) * 100 if initial_capital > 0 else 0
+    winning_trades = sum(1 for pnl in closed_pnl if pnl > 0)
+    win_rate = (winning_trades / len(closed_pnl)) * 100 if closed_pnl else 0
+    return {
+        "net_pnl": net_pnl,
+        "total_return_pct": total_return_pct,
+        "win_rate": win_rate,
+        "total_trades": len(closed_pnl),
+        "initial_capital": initial_capital,
+        "final_equity": final_equity
+    }
+
 class BacktestEngine:
     """
     A class to run a backtest for a given strategy on historical data.
     Now includes detailed trade logging and returns data for advanced charting.
     """
-    def __init__(self, symbol, historical_data, strategy_params, initial_capital=10000):
+    def __init__(self, symbol, historical_data, strategy_params, initial_capital=10000, mode='vectorized'):
+        if mode not in BACKTEST_MODES:
+            raise ValueError(f"Unknown backtest mode '{mode}'. Use one of: {', '.join(BACKTEST_MODES)}.")
         self.symbol = symbol
         self.strategy_params = strategy_params
         self.initial_capital = float(initial_capital)
+        self.mode = mode
         self.df = self._prepare_data(historical_data)
         
         # Backtest state
@@ -24,51 +105,100 @@ class BacktestEngine:
         self.trades = [] # Will now store more detailed trade info
 
     def _prepare_data(self, historical_data):
-        """Prepares the DataFrame with historical data and indicators."""
+        """Prepares the DataFrame with historical data (PriceSeries or list of dicts) and strategy signals."""
         if not historical_data:
             raise ValueError("Historical data is empty or invalid.")
+
+        if isinstance(historical_data, PriceSeries):
+            # Already sorted and typed; the frame wraps the series arrays without copying
+            df = historical_data.to_frame()
+        else:
+            df = pd.DataFrame(historical_data)
+            # Ensure all required columns are present
+            required_cols = ['date', 'open', 'high', 'low', 'close']
+            if not all(col in df.columns for col in required_cols):
+                raise ValueError("Historical data is missing required OHLC columns.")
+
+            df['date'] = pd.to_datetime(df['date'])
+            df = df.sort_values('date').set_index('date')
         
-        df = pd.DataFrame(historical_data)
-        # Ensure all required columns are present
-        required_cols = ['date', 'open', 'high', 'low', 'close']
-        if not all(col in df.columns for col in required_cols):
-            raise ValueError("Historical data is missing required OHLC columns.")
-            
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date').set_index('date')
-        
-        # For SMA Crossover, we need short and long SMAs
-        short_window = 50
-        long_window = 200
-        
-        df['short_sma'] = df['close'].rolling(window=short_window).mean()
-        df['long_sma'] = df['close'].rolling(window=long_window).mean()
-        
-        return df.dropna()
+        # The strategy turns the whole series into entry/exit arrays in one pass
+        strategy, _ = validate_strategy_params(self.strategy_params)
+        series = historical_data if isinstance(historical_data, PriceSeries) else PriceSeries.from_frame(df)
+        entries, exits, ready = strategy.signals(series, self.strategy_params)
+        df['entry'] = entries
+        df['exit'] = exits
+
+        # Trading starts once the strategy's indicators have warmed up
+        return df[ready].dropna(subset=['open', 'high', 'low', 'close'])
 
-    def run(self):
-        """Executes the backtest loop."""
+    def run(self, details=True):
+        """
+        Executes the backtest in the engine's mode and returns the results.
+        details=False returns only the KPIs (parameter sweeps), skipping the chart data.
+        """
         if self.df.empty:
             logger.warning(f"Not enough historical data for {self.symbol} to run backtest.")
             return None
 
-        logger.info(f"Running backtest for {self.symbol} with initial capital ${self.initial_capital:,.2f}")
+        # Sweeps run many KPI-only backtests; keep those out of the info log
+        log = logger.info if details else logger.debug
+        log(f"Running {self.mode} backtest for {self.symbol} with initial capital ${self.initial_capital:,.2f}")
+
+        if self.mode == 'loop':
+            self._run_loop()
+        else:
+            self._run_vectorized()
 
+        log(f"Backtest for {self.symbol} complete. Total trades: {len(self.trades)}")
+        return self._calculate_results(details)
+
+    def _run_loop(self):
+        """Reference mode: simulates the strategy bar by bar."""
         for i, row in self.df.iterrows():
             current_price = row['close']
             
-            # SMA Crossover Strategy Logic
-            if row['short_sma'] > row['long_sma'] and self.position_size == 0:
+            # A bar flagged as both entry and exit is ignored
+            if row['entry'] and not row['exit'] and self.position_size == 0:
                 self._enter_position(row.name, current_price)
 
-            elif row['short_sma'] < row['long_sma'] and self.position_size > 0:
+            elif row['exit'] and not row['entry'] and self.position_size > 0:
                 self._exit_position(row.name, current_price)
 
             current_equity = self.cash + (self.position_size * current_price)
             self.equity_curve.append({'date': row.name.strftime('%Y-%m-%d'), 'value': current_equity})
 
-        logger.info(f"Backtest for {self.symbol} complete. Total trades: {len(self.trades)}")
-        return self._calculate_results()
+    def _positions(self):
+        """
+        Whether a position is held after each bar. An entry bar opens a position, an exit
+        bar closes it, and other bars keep the previous state, exactly as in the loop.
+        """
+        entry = self.df['entry'].to_numpy(dtype=bool)
+        exit_ = self.df['exit'].to_numpy(dtype=bool)
+        return positions_from_signals(entry, exit_)
+
+    def _run_vectorized(self):
+        """Default mode: positions come from the signal arrays, fills from simulate_positions()."""
+        close = self.df['close'].to_numpy(dtype=np.float64)
+        dates = np.datetime_as_string(self.df.index.values, unit='D')
+        held = self._positions()
+        fills = simulate_positions(close, held, self.initial_capital)
+        entries, exits = fills['entries'], fills['exits']
+
+        entry_prices, exit_prices = close[entries], close[exits]
+        entry_dates, exit_dates = dates[entries].tolist(), dates[exits].tolist()
+        exit_rows = list(zip(exit_dates, exit_prices.tolist(), fills['pnl'].tolist()))
+        exit_rows += [(None, None, None)] * (len(entries) - len(exits))
+        self.trades = [
+            {'entry_date': entry_date, 'entry_price': entry_price,
+             'exit_date': exit_date, 'exit_price': exit_price, 'pnl': trade_pnl}
+            for entry_date, entry_price, (exit_date, exit_price, trade_pnl)
+            in zip(entry_dates, entry_prices.tolist(), exit_rows)
+        ]
+        self.equity_curve = [{'date': d, 'value': v} for d, v in zip(dates.tolist(), fills['equity'].tolist())]
+        self.position_size = float(fills['sizes'][-1]) if held[-1] else 0
+        self.entry_price = float(entry_prices[-1]) if held[-1] else 0
+        self.cash = 0 if held[-1] else float(fills['cash'])
 
     def _enter_position(self, date, price):
         """Simulates buying the asset and logs the entry."""
@@ -100,38 +230,23 @@ class BacktestEngine:
         self.position_size = 0
         logger.debug(f"[{date.strftime('%Y-%m-%d')}] EXIT LONG @ ${price:.2f}, P&L: ${pnl:,.2f}")
 
-    def _calculate_results(self):
+    def _calculate_results(self, details=True):
         """Calculates and returns the final KPIs, equity curve, and trade data."""
         if not self.equity_curve:
             return {"kpis": {}, "equity_curve": [], "trades": [], "price_data": []}
 
-        final_equity = self.equity_curve[-1]['value']
-        net_pnl = final_equity - self.initial_capital
-        total_return_pct = (net_pnl / self.initial_capital) * 100 if self.initial_capital > 0 else 0
-        
-        completed_trades = [t for t in self.trades if t['pnl'] is not None]
-        winning_trades = [t for t in completed_trades if t['pnl'] > 0]
-        win_rate = (len(winning_trades) / len(completed_trades)) * 100 if completed_trades else 0
-
-        kpis = {
-            "net_pnl": net_pnl,
-            "total_return_pct": total_return_pct,
-            "win_rate": win_rate,
-            "total_trades": len(completed_trades),
-            "initial_capital": self.initial_capital,
-            "final_equity": final_equity
-        }
-        
-        # Prepare price data for charting library (OHLC format)
-        price_data_for_chart = []
-        for index, row in self.df.iterrows():
-            price_data_for_chart.append({
-                "time": index.strftime('%Y-%m-%d'),
-                "open": row['open'],
-                "high": row['high'],
-                "low": row['low'],
-                "close": row['close']
-            })
+        completed_pnl = [t['pnl'] for t in self.trades if t['pnl'] is not None]
+        kpis = backtest_kpis(self.initial_capital, self.equity_curve[-1]['value'], completed_pnl)
+        if not details:
+            return {"kpis": kpis}
+
+        # Prepare price data for charting library (OHLC format), column-wise
+        times = np.datetime_as_string(self.df.index.values, unit='D').tolist()
+        columns = [self.df[field].to_numpy(dtype=np.float64).tolist() for field in ('open', 'high', 'low', 'close')]
+        price_data_for_chart = [
+            {"time": t, "open": o, "high": h, "low": l, "close": c}
+            for t, o, h, l, c in zip(times, *columns)
+        ]
 
         return {
             "kpis": kpis,
@@ -140,12 +255,13 @@ class BacktestEngine:
             "price_data": price_data_for_chart
         }
 
-def run_sma_crossover_backtest(symbol, start_date, end_date, initial_capital, asset_class='Stock'):
+def load_backtest_series(symbol, start_date, end_date, warmup_bars=200, asset_class='Stock'):
     """
-    Orchestrates the backtest process for the SMA Crossover strategy.
-    Handles fetching data for different asset classes.
+    Daily history for a backtest from `start_date` to `end_date`, plus enough earlier bars
+    for indicators over `warmup_bars` to be available at the start date.
     """
-    from ..api_clients import fmp_client
+    from ..api_clients.rate_limiter import priority
+    from . import price_store
 
     # FMP uses different API endpoints for different asset classes.
     # For now, we assume the main historical data endpoint works for all.
@@ -155,28 +271,45 @@ def run_sma_crossover_backtest(symbol, start_date, end_date, initial_capital, as
     # Fetch a longer period to ensure SMAs can be calculated before the start date
     # FMP's daily history endpoint is often the same for stocks, forex, and crypto.
     # Futures might require a different approach or symbol format (e.g., /ES)
-    historical_data = fmp_client.get_historical_data(symbol, days=365*10)
+    with priority('backtest'):
+        series = price_store.get_series(symbol, days=365*10)
     
-    if not historical_data:
+    if not series:
         raise ValueError(f"Could not fetch historical data for {symbol}. Check the symbol and asset class.")
 
-    # Convert to DataFrame for easier filtering
-    df = pd.DataFrame(historical_data)
-    df['date'] = pd.to_datetime(df['date'])
-    
     # We need data *before* the start date to calculate the initial SMA values.
-    # Let's find the actual start date in the data that is on or after the requested start_date
-    df = df[df['date'] >= pd.to_datetime(start_date) - pd.Timedelta(days=300)]
-    df = df[df['date'] <= pd.to_datetime(end_date)]
+    # Slicing the sorted series by date returns a view, no copy of the history.
+    warmup_days = max(300, int(warmup_bars * 7 / 5) + 20)
+    series = series.between(pd.to_datetime(start_date) - pd.Timedelta(days=warmup_days), pd.to_datetime(end_date))
     
-    if df.empty:
+    if not series:
         raise ValueError("No historical data available for the selected date range.")
+    return series
+
+def run_backtest(symbol, start_date, end_date, initial_capital, strategy_params=None, asset_class='Stock',
+                 mode='vectorized'):
+    """
+    Orchestrates a backtest of a registered strategy: strategy_params holds its 'name'
+    (default 'sma_crossover') and parameters. Handles fetching data for different asset
+    classes. mode='loop' runs the bar-by-bar reference simulation instead of the vectorized one.
+    """
+    strategy_params = {'name': 'sma_crossover', **(strategy_params or {})}
+    strategy, params = validate_strategy_params(strategy_params)
+    series = load_backtest_series(symbol, start_date, end_date, warmup_bars=strategy.warmup_bars(params),
+                                  asset_class=asset_class)
 
     engine = BacktestEngine(
         symbol=symbol,
-        historical_data=df.to_dict('records'),
-        strategy_params={'name': 'sma_crossover'},
-        initial_capital=initial_capital
+        historical_data=series,
+        strategy_params=strategy_params,
+        initial_capital=initial_capital,
+        mode=mode
     )
     
     return engine.run()
+
+def run_sma_crossover_backtest(symbol, start_date, end_date, initial_capital, asset_class='Stock', mode='vectorized',
+                               short_window=50, long_window=200):
+    """Backtest of the SMA Crossover strategy (see run_backtest)."""
+    strategy_params = {'name': 'sma_crossover', 'short_window': short_window, 'long_window': long_window}
+    return run_backtest(symbol, start_date, end_date, initial_capital, strategy_params, asset_class, mode)
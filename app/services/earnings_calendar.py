@@ -0,0 +1,140 @@
+# app/services/earnings_calendar.py
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from ..api_clients import fmp_client
+from ..api_clients.rate_limiter import priority
+from ..api_clients.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+WINDOW_DAYS = int(os.environ.get('EARNINGS_CALENDAR_WINDOW_DAYS', 90))
+REFRESH_SECONDS = int(os.environ.get('EARNINGS_CALENDAR_REFRESH_MINUTES', 6 * 60)) * 60
+# A background refresh is started at most this often, so a failing upstream is not
+# called again on every request that sees the stale index.
+RETRY_SECONDS = 60
+
+_refresh_inflight = SingleFlight('earnings_calendar')
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class EarningsIndex:
+    """
+    One downloaded calendar window, indexed by symbol and by date.
+    Events are kept sorted by date so a date range is two bisects into the list.
+    """
+    def __init__(self, start, end, events):
+        self.start = start
+        self.end = end
+        self.built_at = time.time()
+        valid = [e for e in (events or []) if isinstance(e, dict) and e.get('symbol') and e.get('date')]
+        valid.sort(key=lambda e: e['date'])
+        self._events = valid
+        self._dates = [e['date'][:10] for e in valid]
+        self._by_symbol = {}
+        for event in valid:
+            self._by_symbol.setdefault(event['symbol'].upper(), []).append(event)
+
+    def __len__(self):
+        return len(self._events)
+
+    def covers(self, from_date, to_date):
+        return self.start <= from_date and to_date <= self.end
+
+    def for_symbol(self, symbol, from_date=None, to_date=None):
+        events = self._by_symbol.get(symbol.upper(), [])
+        lo, hi = str(from_date or self.start), str(to_date or self.end)
+        return [e for e in events if lo <= e['date'][:10] <= hi]
+
+    def between(self, from_date, to_date):
+        lo = bisect_left(self._dates, str(from_date))
+        hi = bisect_right(self._dates, str(to_date))
+        return self._events[lo:hi]
+
+
+_index = None
+_index_lock = threading.Lock()
+_refreshing = False
+_refresh_started_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+def _build(start, fresh=False):
+    global _index
+    end = start + timedelta(days=WINDOW_DAYS)
+    events = fmp_client.get_earnings_calendar(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), fresh=fresh)
+    if events is None:
+        logger.warning("Earnings calendar fetch failed; keeping the previous index.")
+        return _index
+    index = EarningsIndex(start, end, events)
+    with _index_lock:
+        _index = index
+    logger.info(f"Earnings calendar indexed: {len(index)} events, {start}..{end}")
+    return index
+
+
+def _refresh_in_background(start):
+    """Starts one background rebuild; no-op while one is running or one started recently."""
+    global _refreshing, _refresh_started_at
+    with _refresh_lock:
+        if _refreshing or time.time() - _refresh_started_at < RETRY_SECONDS:
+            return
+        _refreshing = True
+        _refresh_started_at = time.time()
+
+    def refresh():
+        global _refreshing
+        try:
+            with priority('warming'):
+                # The cached payload may be as old as the index; only an upstream read refreshes it
+                _refresh_inflight.do(str(start), _build, start, fresh=True)
+        except Exception:
+            logger.error("Earnings calendar refresh failed", exc_info=True)
+        finally:
+            with _refresh_lock:
+                _refreshing = False
+    threading.Thread(target=refresh, name='earnings-calendar-refresh', daemon=True).start()
+
+
+def get_index():
+    """
+    Returns the current calendar index, fetching it on first use.
+    An index that has aged past the refresh period (or a new day) is still served
+    while a replacement is built in the background.
+    """
+    today = date.today()
+    index = _index
+    if index is None:
+        return _refresh_inflight.do(str(today), _build, today)
+    if index.start != today or time.time() - index.built_at > REFRESH_SECONDS:
+        _refresh_in_background(today)
+    return index
+
+
+def get_symbol_events(symbol, from_date=None, to_date=None):
+    """Upcoming earnings for one symbol, served from the indexed window."""
+    index = get_index()
+    if index is None:
+        return []
+    from_date = _as_date(from_date) if from_date else index.start
+    to_date = _as_date(to_date) if to_date else index.end
+    if not index.covers(from_date, to_date):
+        return [e for e in get_events(from_date, to_date) if (e.get('symbol') or '').upper() == symbol.upper()]
+    return index.for_symbol(symbol, from_date, to_date)
+
+
+def get_events(from_date, to_date):
+    """All earnings events in [from_date, to_date]; ranges outside the window go upstream."""
+    from_date, to_date = _as_date(from_date), _as_date(to_date)
+    index = get_index()
+    if index is not None and index.covers(from_date, to_date):
+        return index.between(from_date, to_date)
+    return fmp_client.get_earnings_calendar(str(from_date), str(to_date)) or []
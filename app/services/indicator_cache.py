@@ -0,0 +1,135 @@
+# app/services/indicator_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+MAX_BYTES = int(float(os.environ.get('INDICATOR_CACHE_MAX_MB', 64)) * 1024 * 1024)
+# How long a cached result is served for a symbol without re-reading its price history.
+# Kept well inside the price store's sync interval, so it never hides a sync for long.
+REVALIDATE_SECONDS = int(os.environ.get('INDICATOR_CACHE_REVALIDATE_SECONDS', 5 * 60))
+# Cap on the (symbol, timeframe, indicator set) fast-path entries; callers choose the key
+# through ?indicators= and ?timeframe=, so it must not grow with them.
+RECENT_MAX_ENTRIES = int(os.environ.get('INDICATOR_CACHE_RECENT_MAX_ENTRIES', 4096))
+
+DEFAULT_SET = ('macd', 'rsi_14', 'sma_200', 'sma_50')
+
+
+def fingerprint(series):
+    """Short digest of a series' dates and closes; any revised bar changes it."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(series.date.tobytes())
+    digest.update(series.close.tobytes())
+    return digest.hexdigest()
+
+
+class ByteLRU:
+    """Thread-safe LRU of bytes values, bounded by the total size of the stored values."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self._data[key] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+_results = ByteLRU(MAX_BYTES)
+# (symbol, timeframe, indicator_set) -> (result key, validated_at): the fast path for repeat
+# views. Kept in validation order, so expired entries are always at the front.
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def _remember(recent_key, key, now):
+    with _recent_lock:
+        _recent.pop(recent_key, None)
+        _recent[recent_key] = (key, now)
+        while _recent:
+            oldest_key, (_, validated_at) = next(iter(_recent.items()))
+            if len(_recent) <= RECENT_MAX_ENTRIES and now - validated_at <= REVALIDATE_SECONDS:
+                break
+            del _recent[oldest_key]
+
+
+def get_recent(symbol, indicator_set=DEFAULT_SET, timeframe='daily'):
+    """The serialized result for `symbol` if it was validated against its history recently."""
+    recent_key = (symbol, timeframe, indicator_set)
+    with _recent_lock:
+        entry = _recent.get(recent_key)
+        if entry is not None and time.time() - entry[1] > REVALIDATE_SECONDS:
+            del _recent[recent_key]
+            entry = None
+    if entry is None:
+        return None
+    return _results.get(entry[0])
+
+
+def get_or_compute(symbol, series, compute, indicator_set=DEFAULT_SET, timeframe='daily'):
+    """
+    Returns the JSON-serialized result of compute() for this exact history, computing it
+    only when (symbol, timeframe, last bar date, data fingerprint, indicator set) has not
+    been seen. Results containing an 'error' are returned but not cached.
+    """
+    key = (symbol, timeframe, series.last_date, fingerprint(series), indicator_set)
+    body = _results.get(key)
+    if body is None:
+        result = compute()
+        body = json.dumps(result, separators=(',', ':')).encode('utf-8')
+        if isinstance(result, dict) and 'error' in result:
+            return body
+        _results.set(key, body)
+    _remember((symbol, timeframe, indicator_set), key, time.time())
+    return body
+
+
+def invalidate(symbol):
+    """Forces the next request for `symbol` to re-read its history."""
+    with _recent_lock:
+        for recent_key in [k for k in _recent if k[0] == symbol]:
+            del _recent[recent_key]
+
+
+def get_stats():
+    return {**_results.stats, 'entries': len(_results), 'bytes': _results.nbytes, 'max_bytes': _results.max_bytes,
+            'recent_entries': len(_recent)}
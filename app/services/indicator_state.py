@@ -0,0 +1,361 @@
+# app/services/indicator_state.py
+import os
+import math
+import time
+import logging
+from collections import deque
+
+import numpy as np
+
+from ..api_clients.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Streaming states are kept in the response cache tiers (in-process + shared) per symbol.
+STATE_TTL_SECONDS = int(os.environ.get('INDICATOR_STATE_TTL_DAYS', 7)) * 24 * 60 * 60
+STATE_VERSION = 1
+# A state with no new bars is only re-saved this often (to refresh its synced_at).
+RESAVE_SECONDS = 60
+
+_state_cache = TTLCache('indicator_state', STATE_TTL_SECONDS, maxsize=512)
+
+
+def _value(x):
+    return None if x is None or math.isnan(x) else x
+
+
+# --- Streaming primitives ---
+# Each primitive takes push(x) for a new bar and replace_last(x) when the most recent bar
+# is revised (today's bar updating intraday). Both are O(1). The formulas match the
+# vectorized kernels in indicators.py.
+
+class StreamingSMA:
+    def __init__(self, length):
+        self.length = length
+        self.window = deque(maxlen=length)
+        self.total = 0.0
+        self.pushes = 0
+
+    def push(self, x):
+        if len(self.window) == self.length:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+        self.pushes += 1
+        if self.pushes % self.length == 0:
+            # Re-sum the window now and then so rounding error cannot accumulate
+            self.total = math.fsum(self.window)
+
+    def replace_last(self, x):
+        self.total += x - self.window[-1]
+        self.window[-1] = x
+
+    @property
+    def value(self):
+        return self.total / self.length if len(self.window) == self.length else None
+
+    def to_dict(self):
+        return {'length': self.length, 'window': list(self.window), 'pushes': self.pushes}
+
+    @classmethod
+    def from_dict(cls, data):
+        sma = cls(data['length'])
+        sma.window.extend(data['window'])
+        sma.total = math.fsum(sma.window)
+        sma.pushes = data['pushes']
+        return sma
+
+
+class _ScalarStreaming:
+    """Base for primitives whose whole state is a few scalars: undo is a snapshot of them."""
+    _fields = ()
+
+    def __init__(self):
+        self._undo = None
+
+    def _snapshot(self):
+        return {f: getattr(self, f) for f in self._fields}
+
+    def push(self, x):
+        self._undo = self._snapshot()
+        self._push(x)
+
+    def replace_last(self, x):
+        for field, value in self._undo.items():
+            setattr(self, field, value)
+        self._push(x)
+
+    def to_dict(self):
+        return {'length': self.length, **self._snapshot(), '_undo': self._undo}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['length'])
+        for field in cls._fields:
+            setattr(obj, field, data[field])
+        obj._undo = data['_undo']
+        return obj
+
+
+class StreamingEMA(_ScalarStreaming):
+    """EMA with alpha = 2 / (length + 1), seeded with the SMA of the first `length` values."""
+    _fields = ('count', 'seed_sum', 'current')
+
+    def __init__(self, length):
+        super().__init__()
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.current = None
+
+    def _push(self, x):
+        self.count += 1
+        if self.count < self.length:
+            self.seed_sum += x
+        elif self.count == self.length:
+            self.current = (self.seed_sum + x) / self.length
+        else:
+            self.current = self.alpha * x + (1.0 - self.alpha) * self.current
+
+    @property
+    def value(self):
+        return self.current
+
+
+class StreamingRMA(_ScalarStreaming):
+    """ewm(alpha=1/length, adjust=True) kept as running numerator and denominator."""
+    _fields = ('count', 'num', 'den')
+
+    def __init__(self, length):
+        super().__init__()
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.count = 0
+        self.num = 0.0
+        self.den = 0.0
+
+    def _push(self, x):
+        self.count += 1
+        self.num = self.decay * self.num + x
+        self.den = self.decay * self.den + 1.0
+
+    @property
+    def value(self):
+        return self.num / self.den if self.count >= self.length else None
+
+
+class StreamingRSI:
+    def __init__(self, length=14):
+        self.length = length
+        self.gain = StreamingRMA(length)
+        self.loss = StreamingRMA(length)
+        self.prev_close = None
+        self.last_close = None
+
+    def push(self, x):
+        self.prev_close, self.last_close = self.last_close, x
+        if self.prev_close is not None:
+            change = x - self.prev_close
+            self.gain.push(max(change, 0.0))
+            self.loss.push(max(-change, 0.0))
+
+    def replace_last(self, x):
+        self.last_close = x
+        if self.prev_close is not None:
+            change = x - self.prev_close
+            self.gain.replace_last(max(change, 0.0))
+            self.loss.replace_last(max(-change, 0.0))
+
+    @property
+    def value(self):
+        gain, loss = self.gain.value, self.loss.value
+        if gain is None or loss is None or gain + loss == 0:
+            return None
+        return 100.0 * gain / (gain + loss)
+
+    def to_dict(self):
+        return {'length': self.length, 'gain': self.gain.to_dict(), 'loss': self.loss.to_dict(),
+                'prev_close': self.prev_close, 'last_close': self.last_close}
+
+    @classmethod
+    def from_dict(cls, data):
+        rsi = cls(data['length'])
+        rsi.gain = StreamingRMA.from_dict(data['gain'])
+        rsi.loss = StreamingRMA.from_dict(data['loss'])
+        rsi.prev_close, rsi.last_close = data['prev_close'], data['last_close']
+        return rsi
+
+
+class StreamingMACD:
+    """MACD line = EMA(fast) - EMA(slow); the signal EMA starts with the first line value."""
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def _line(self):
+        if self.fast.value is None or self.slow.value is None:
+            return None
+        return self.fast.value - self.slow.value
+
+    def push(self, x):
+        self.fast.push(x)
+        self.slow.push(x)
+        line = self._line()
+        if line is not None:
+            self.signal.push(line)
+
+    def replace_last(self, x):
+        self.fast.replace_last(x)
+        self.slow.replace_last(x)
+        line = self._line()
+        if line is not None:
+            self.signal.replace_last(line)
+
+    @property
+    def value(self):
+        """(line, signal, histogram), each None until available."""
+        line, signal = self._line(), self.signal.value
+        hist = line - signal if line is not None and signal is not None else None
+        return line, signal, hist
+
+    def to_dict(self):
+        return {'fast': self.fast.to_dict(), 'slow': self.slow.to_dict(), 'signal': self.signal.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        macd = cls.__new__(cls)
+        macd.fast = StreamingEMA.from_dict(data['fast'])
+        macd.slow = StreamingEMA.from_dict(data['slow'])
+        macd.signal = StreamingEMA.from_dict(data['signal'])
+        return macd
+
+
+# --- Per-symbol state ---
+
+class IndicatorState:
+    """
+    The dashboard indicator set (SMA 50/200, RSI 14, MACD 12/26/9) for one symbol,
+    updated bar by bar. Dates are int64 epoch days, as in PriceSeries.
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.sma_50 = StreamingSMA(50)
+        self.sma_200 = StreamingSMA(200)
+        self.rsi_14 = StreamingRSI(14)
+        self.macd = StreamingMACD(12, 26, 9)
+        self.last_date = None
+        self.last_close = None
+        self.bars = 0
+        self.synced_at = None
+
+    def _parts(self):
+        return (self.sma_50, self.sma_200, self.rsi_14, self.macd)
+
+    def update(self, bar_date, close):
+        """Applies one bar. A bar for the current last date revises it; older bars are rejected."""
+        bar_date, close = int(bar_date), float(close)
+        if self.last_date is not None and bar_date < self.last_date:
+            raise ValueError(f"Bar {bar_date} is older than the last applied bar {self.last_date}.")
+        if bar_date == self.last_date:
+            for part in self._parts():
+                part.replace_last(close)
+        else:
+            for part in self._parts():
+                part.push(close)
+            self.bars += 1
+        self.last_date, self.last_close = bar_date, close
+
+    def apply_series(self, series):
+        """
+        Applies the bars of `series` not yet seen (the last applied bar is re-applied if it
+        was revised). Returns the number of bars applied, or None if `series` contradicts
+        the state (history was re-adjusted or does not reach back to the last applied bar).
+        """
+        if self.last_date is None:
+            start = 0
+        else:
+            idx = int(np.searchsorted(series.date, self.last_date))
+            if idx >= len(series) or series.date[idx] != self.last_date:
+                return None
+            is_last_bar = idx == len(series) - 1
+            if series.close[idx] != self.last_close and not is_last_bar:
+                return None
+            start = idx if series.close[idx] != self.last_close else idx + 1
+        for bar_date, close in zip(series.date[start:].tolist(), series.close[start:].tolist()):
+            self.update(bar_date, close)
+        return len(series) - start
+
+    @classmethod
+    def from_series(cls, series, symbol=None):
+        state = cls(symbol or series.symbol)
+        state.apply_series(series)
+        return state
+
+    def values(self):
+        """Current values in the shape of calculate_indicators' 'indicators' dict."""
+        macd_line, macd_signal, macd_hist = self.macd.value
+        return {
+            'last_close': self.last_close,
+            'sma_50': _value(self.sma_50.value),
+            'sma_200': _value(self.sma_200.value),
+            'rsi_14': _value(self.rsi_14.value),
+            'macd_line': macd_line,
+            'macd_hist': macd_hist,
+            'macd_signal': macd_signal,
+            'last_calculation_date': str(np.datetime64(self.last_date, 'D')) if self.last_date is not None else None
+        }
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION, 'symbol': self.symbol, 'last_date': self.last_date,
+            'last_close': self.last_close, 'bars': self.bars, 'synced_at': self.synced_at,
+            'sma_50': self.sma_50.to_dict(), 'sma_200': self.sma_200.to_dict(),
+            'rsi_14': self.rsi_14.to_dict(), 'macd': self.macd.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restores a serialized state; returns None for states written by another version."""
+        if not data or data.get('version') != STATE_VERSION:
+            return None
+        state = cls(data['symbol'])
+        state.sma_50 = StreamingSMA.from_dict(data['sma_50'])
+        state.sma_200 = StreamingSMA.from_dict(data['sma_200'])
+        state.rsi_14 = StreamingRSI.from_dict(data['rsi_14'])
+        state.macd = StreamingMACD.from_dict(data['macd'])
+        state.last_date, state.last_close = data['last_date'], data['last_close']
+        state.bars, state.synced_at = data['bars'], data['synced_at']
+        return state
+
+
+def load_state(symbol):
+    stored, _ = _state_cache.get(_state_cache.key_for(symbol.upper()))
+    return IndicatorState.from_dict(stored) if stored else None
+
+
+def save_state(state):
+    _state_cache.set(_state_cache.key_for(state.symbol.upper()), state.to_dict())
+
+
+def sync_state(symbol, series):
+    """
+    Brings the stored state for `symbol` up to date with `series` (its full daily history)
+    and returns it. Only bars newer than the stored state are applied; the state is rebuilt
+    from scratch when none is stored or the history was re-adjusted.
+    """
+    symbol = symbol.upper()
+    state = load_state(symbol)
+    applied = state.apply_series(series) if state is not None else None
+    if applied is None:
+        logger.info(f"Building indicator state for {symbol} from {len(series)} bars.")
+        state = IndicatorState.from_series(series, symbol=symbol)
+        applied = len(series)
+    now = time.time()
+    previous_sync, state.synced_at = state.synced_at, now
+    if applied or not previous_sync or now - previous_sync > RESAVE_SECONDS:
+        save_state(state)
+    return state
+
@@ -0,0 +1,323 @@
+# app/services/indicators.py
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+# Vectorized indicator kernels over float64 arrays.
+# Time runs along axis 0, so a 1-D array is one series and a 2-D array holds one series
+# per column. NaN is expected only as leading warm-up (or trailing padding); values must
+# be gap-free in between. Formulas follow pandas_ta's defaults so results match the
+# previous implementation.
+
+# The exponential recurrences are evaluated block-wise with cumsum; each block is short
+# enough that decay**-k stays below e**_MAX_LOG_SCALE.
+_MAX_LOG_SCALE = 200.0
+
+
+def _as_float(x):
+    return np.asarray(x, dtype=np.float64)
+
+
+def _rows(x):
+    """Row index broadcastable against x (shape (n, 1, ...))."""
+    return np.arange(x.shape[0]).reshape((-1,) + (1,) * (x.ndim - 1))
+
+
+def first_valid_index(x):
+    """Index of the first non-NaN value along axis 0 (len(x) where there is none)."""
+    valid = ~np.isnan(x)
+    if x.shape[0] == 0:
+        return np.zeros(x.shape[1:], dtype=np.int64)
+    return np.where(valid.any(axis=0), np.argmax(valid, axis=0), x.shape[0])
+
+
+def _valid_counts(x):
+    """Number of values seen so far at each row (x is gap-free after its first valid value)."""
+    return np.maximum(_rows(x) - first_valid_index(x) + 1, 0)
+
+
+def _linear_recurrence(u, decay):
+    """y[t] = decay * y[t-1] + u[t] along axis 0, with y[-1] = 0."""
+    n = u.shape[0]
+    out = np.empty_like(u)
+    if n == 0:
+        return out
+    if decay <= 0.0:
+        out[:] = u
+        return out
+    block = max(1, int(_MAX_LOG_SCALE / -np.log(decay)))
+    shape = (-1,) + (1,) * (u.ndim - 1)
+    carry = np.zeros(u.shape[1:])
+    for start in range(0, n, block):
+        seg = u[start:start + block]
+        scale = decay ** np.arange(seg.shape[0], dtype=np.float64).reshape(shape)
+        out[start:start + seg.shape[0]] = scale * (np.cumsum(seg / scale, axis=0) + decay * carry)
+        carry = out[start + seg.shape[0] - 1]
+    return out
+
+
+# --- Moving averages ---
+
+def sma(x, length):
+    """Simple moving average; NaN until `length` valid values are in the window."""
+    x = _as_float(x)
+    out = np.full_like(x, np.nan)
+    if length > x.shape[0]:
+        return out
+    csum = np.cumsum(np.nan_to_num(x), axis=0)
+    window_sum = csum[length - 1:].copy()
+    window_sum[1:] -= csum[:-length]
+    full = _valid_counts(x)[length - 1:] >= length
+    out[length - 1:] = np.where(full, window_sum / length, np.nan)
+    return out
+
+
+def ema(x, length):
+    """
+    Exponential moving average with alpha = 2 / (length + 1), seeded with the SMA of the
+    first `length` valid values (pandas_ta's default). The first value is at index length - 1.
+    """
+    x = _as_float(x)
+    alpha = 2.0 / (length + 1)
+    first = first_valid_index(x)
+    seed_at = first + length - 1
+    rows = _rows(x)
+    values = np.nan_to_num(x)
+    seed = np.where(rows <= seed_at, values, 0.0).sum(axis=0) / length
+    u = np.where(rows == seed_at, seed, alpha * values)
+    u[rows < seed_at] = 0.0
+    out = _linear_recurrence(u, 1.0 - alpha)
+    out[rows < seed_at] = np.nan
+    return out
+
+
+def rma(x, length):
+    """
+    Wilder-style smoothing as computed by pandas_ta: ewm(alpha=1/length, adjust=True)
+    with `length` valid values required before the first output.
+    """
+    x = _as_float(x)
+    decay = 1.0 - 1.0 / length
+    counts = _valid_counts(x)
+    num = _linear_recurrence(np.nan_to_num(x), decay)
+    # The weight total sum(decay**k for k < count) has a closed form
+    den = (1.0 - decay ** counts) / (1.0 - decay)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = num / den
+    out[counts < length] = np.nan
+    return out
+
+
+# --- Oscillators ---
+
+def rsi(close, length=14):
+    """Relative Strength Index (0-100) from rma-smoothed gains and losses."""
+    close = _as_float(close)
+    change = np.full_like(close, np.nan)
+    change[1:] = close[1:] - close[:-1]
+    gain = np.where(change > 0, change, 0.0)
+    loss = np.where(change < 0, -change, 0.0)
+    gain[np.isnan(change)] = np.nan
+    loss[np.isnan(change)] = np.nan
+    avg_gain = rma(gain, length)
+    avg_loss = rma(loss, length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100.0 * avg_gain / (avg_gain + avg_loss)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """Returns (macd line, signal line, histogram); the signal EMA starts at the first valid line value."""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+# --- Volatility and channels ---
+
+def _rolling_window(x, length):
+    return sliding_window_view(x, length, axis=0)
+
+
+def rolling_std(x, length, ddof=0):
+    x = _as_float(x)
+    out = np.full_like(x, np.nan)
+    if length <= x.shape[0]:
+        out[length - 1:] = _rolling_window(x, length).std(axis=-1, ddof=ddof)
+    return out
+
+
+def rolling_sum(x, length):
+    """Window sums; NaN wherever the window holds a NaN."""
+    x = _as_float(x)
+    out = np.full_like(x, np.nan)
+    if length <= x.shape[0]:
+        out[length - 1:] = _rolling_window(x, length).sum(axis=-1)
+    return out
+
+
+def rolling_max(x, length):
+    x = _as_float(x)
+    out = np.full_like(x, np.nan)
+    if length <= x.shape[0]:
+        out[length - 1:] = _rolling_window(x, length).max(axis=-1)
+    return out
+
+
+def rolling_min(x, length):
+    x = _as_float(x)
+    out = np.full_like(x, np.nan)
+    if length <= x.shape[0]:
+        out[length - 1:] = _rolling_window(x, length).min(axis=-1)
+    return out
+
+
+def bollinger_bands(close, length=20, num_std=2.0):
+    """Returns (lower, middle, upper) bands around the SMA, using the population standard deviation."""
+    middle = sma(close, length)
+    width = num_std * rolling_std(close, length)
+    return middle - width, middle, middle + width
+
+
+def donchian_channel(high, low, length=20):
+    """Returns (lower, middle, upper): the rolling low, midpoint and rolling high."""
+    upper = rolling_max(high, length)
+    lower = rolling_min(low, length)
+    return lower, (upper + lower) / 2.0, upper
+
+
+def true_range(high, low, close):
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    prev_close = np.full_like(close, np.nan)
+    prev_close[1:] = close[:-1]
+    ranges = np.stack([high - low, np.abs(high - prev_close), np.abs(prev_close - low)])
+    out = np.max(ranges, axis=0)
+    out[:1] = np.nan
+    return out
+
+
+def atr(high, low, close, length=14):
+    """Average True Range, rma-smoothed like pandas_ta's default."""
+    return rma(true_range(high, low, close), length)
+
+
+# --- Oscillators and volume over OHLCV ---
+
+def stochastic(high, low, close, k=14, d=3, smooth_k=3):
+    """
+    Returns (%K, %D) as computed by pandas_ta's stoch: the raw stochastic over `k` bars,
+    smoothed by an SMA of `smooth_k`, and %D as the SMA of %K over `d`. A window with no
+    range (high == low) reads 50 rather than dividing by zero.
+    """
+    close = _as_float(close)
+    lowest = rolling_min(low, k)
+    highest = rolling_max(high, k)
+    span = highest - lowest
+    with np.errstate(invalid='ignore', divide='ignore'):
+        raw = np.where(span > 0, 100.0 * (close - lowest) / span, 50.0)
+    raw[np.isnan(span)] = np.nan
+    stoch_k = sma(raw, smooth_k)
+    return stoch_k, sma(stoch_k, d)
+
+
+def obv(close, volume):
+    """On-balance volume; the first bar counts as an up bar (pandas_ta's default)."""
+    close, volume = _as_float(close), _as_float(volume)
+    direction = np.ones_like(close)
+    direction[1:] = np.sign(close[1:] - close[:-1])
+    return np.cumsum(direction * volume, axis=0)
+
+
+def rolling_vwap(high, low, close, volume, length=20):
+    """Volume-weighted typical price ((high + low + close) / 3) over the last `length` bars."""
+    typical = (_as_float(high) + _as_float(low) + _as_float(close)) / 3.0
+    volume = _as_float(volume)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return rolling_sum(typical * volume, length) / rolling_sum(volume, length)
+
+
+# --- Multi-series helpers ---
+
+def end_align(matrix):
+    """
+    Moves each column's non-NaN values to the bottom of the column, keeping their order,
+    so ragged or date-aligned histories (with holes) become gap-free columns whose last
+    row is the latest value. Returns (aligned, counts) where counts[j] is the number of
+    valid values in column j.
+    """
+    matrix = _as_float(matrix)
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=0)
+    if np.all(valid[1:] >= valid[:-1]):
+        # Already end-aligned (only leading NaN in every column)
+        return matrix, counts
+    order = np.argsort(valid, axis=0, kind='stable')
+    return np.take_along_axis(matrix, order, axis=0), counts
+
+
+# --- Latest values only ---
+# Same results as the full kernels' last row, but each exponential average collapses to
+# one weighted sum (a matrix-vector product) instead of a pass over the recurrence.
+
+def _decay_weights(n, decay):
+    """decay**(n-1-t) for t in 0..n-1: the weight of each row in the last output."""
+    return decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+
+
+def sma_last(x, length):
+    x = _as_float(x)
+    if length > x.shape[0]:
+        return np.full(x.shape[1:], np.nan)[()]
+    return x[-length:].sum(axis=0) / length
+
+
+def ema_last(x, length):
+    x = _as_float(x)
+    n = x.shape[0]
+    alpha = 2.0 / (length + 1)
+    decay = 1.0 - alpha
+    seed_at = first_valid_index(x) + length - 1
+    rows = _rows(x)
+    values = np.nan_to_num(x)
+    seed = np.where(rows <= seed_at, values, 0.0).sum(axis=0) / length
+    weighted = _decay_weights(n, decay) @ np.where(rows > seed_at, values, 0.0)
+    with np.errstate(over='ignore', invalid='ignore'):
+        out = alpha * weighted + decay ** (n - 1 - seed_at).astype(np.float64) * seed
+    return np.where(seed_at <= n - 1, out, np.nan)[()]
+
+
+def rma_last(x, length):
+    x = _as_float(x)
+    n = x.shape[0]
+    decay = 1.0 - 1.0 / length
+    counts = n - first_valid_index(x)
+    num = _decay_weights(n, decay) @ np.nan_to_num(x)
+    den = (1.0 - decay ** counts.astype(np.float64)) / (1.0 - decay)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts >= length, num / den, np.nan)[()]
+
+
+def rsi_last(close, length=14):
+    close = _as_float(close)
+    change = np.full_like(close, np.nan)
+    change[1:] = close[1:] - close[:-1]
+    gain = np.where(change > 0, change, 0.0)
+    loss = np.where(change < 0, -change, 0.0)
+    gain[np.isnan(change)] = np.nan
+    loss[np.isnan(change)] = np.nan
+    avg_gain = rma_last(gain, length)
+    avg_loss = rma_last(loss, length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100.0 * avg_gain / (avg_gain + avg_loss)
+
+
+def macd_last(close, fast=12, slow=26, signal=9):
+    """Returns the latest (macd line, signal line, histogram)."""
+    line = ema(close, fast) - ema(close, slow)
+    if line.shape[0] == 0:
+        empty = np.full(line.shape[1:], np.nan)[()]
+        return empty, empty, empty
+    signal_line = ema_last(line, signal)
+    return line[-1], signal_line, line[-1] - signal_line
@@ -0,0 +1,260 @@
+# app/services/portfolio_backtest.py
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .backtesting_engine import positions_from_signals, validate_strategy_params
+from .price_series import to_epoch_days
+
+logger = logging.getLogger(__name__)
+
+# Multi-asset backtests. The symbols' closes are aligned into one (dates, symbols) matrix,
+# target weights are set per bar, and at the close of each rebalance bar the portfolio is
+# traded to its targets and then held as fixed share counts until the next one. Equity,
+# turnover and per-symbol contributions come from matrix operations over all bars and
+# symbols at once.
+
+# --- Configuration ---
+PORTFOLIO_MAX_SYMBOLS = int(os.environ.get('BACKTEST_PORTFOLIO_MAX_SYMBOLS', 50))
+
+# 'equal' splits the capital evenly over the symbols, 'fixed' uses given weights, and
+# 'signal' splits it evenly over the symbols a registered strategy is long in (cash when none).
+ALLOCATIONS = ('equal', 'fixed', 'signal')
+REBALANCE_FREQUENCIES = ('daily', 'weekly', 'monthly', 'quarterly', 'none')
+
+
+# --- Alignment ---
+
+def _forward_fill(matrix):
+    """Carries each column's last non-NaN value down; leading NaNs stay NaN."""
+    rows = np.arange(len(matrix)).reshape(-1, 1)
+    last = np.maximum.accumulate(np.where(np.isnan(matrix), -1, rows), axis=0)
+    filled = np.take_along_axis(matrix, np.maximum(last, 0), axis=0)
+    return np.where(last >= 0, filled, np.nan)
+
+
+def align_closes(series_by_symbol, symbols):
+    """
+    The union of the symbols' dates (epoch days) and a (dates, symbols) close matrix. A
+    symbol's last close carries over dates it has no bar for; dates before its first bar are NaN.
+    """
+    dates = np.unique(np.concatenate([series_by_symbol[symbol].date for symbol in symbols]))
+    closes = np.full((len(dates), len(symbols)), np.nan)
+    for column, symbol in enumerate(symbols):
+        series = series_by_symbol[symbol]
+        closes[np.searchsorted(dates, series.date), column] = series.close
+    return dates, _forward_fill(closes)
+
+
+def _signal_positions(series_by_symbol, symbols, dates, strategy_params):
+    """Whether the strategy is long each symbol after each date, as a (dates, symbols) matrix."""
+    strategy, _ = validate_strategy_params(strategy_params)
+    entries = np.zeros((len(dates), len(symbols)), dtype=bool)
+    exits = np.zeros_like(entries)
+    for column, symbol in enumerate(symbols):
+        series = series_by_symbol[symbol]
+        rows = np.searchsorted(dates, series.date)
+        entries[rows, column], exits[rows, column], _ = strategy.signals(series, strategy_params)
+    # Dates a symbol has no bar for carry no signal, so they keep its position
+    return positions_from_signals(entries, exits)
+
+
+# --- Weights and rebalancing ---
+
+def rebalance_bars(dates, frequency):
+    """Boolean array: the first bar, then the first bar of each day, week, month or quarter."""
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Unknown rebalance frequency '{frequency}'. Use one of: {', '.join(REBALANCE_FREQUENCIES)}.")
+    flags = np.zeros(len(dates), dtype=bool)
+    flags[:1] = True
+    if frequency == 'daily':
+        flags[:] = True
+    elif frequency != 'none':
+        if frequency == 'weekly':
+            # Epoch day 0 was a Thursday; shifting by 3 starts each week on Monday
+            keys = (dates + 3) // 7
+        else:
+            keys = dates.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+            if frequency == 'quarterly':
+                keys = keys // 3
+        flags[1:] |= keys[1:] != keys[:-1]
+    return flags
+
+
+def target_weights(closes, allocation, fixed_weights=None, held=None):
+    """
+    (dates, symbols) target weights. Symbols without a price yet get none, and the rest are
+    scaled to sum to one: evenly ('equal'), by `fixed_weights` ('fixed') or evenly over the
+    symbols in `held` ('signal'). A bar with nothing to hold is all cash.
+    """
+    available = ~np.isnan(closes)
+    if allocation == 'signal':
+        base = (held & available).astype(np.float64)
+    elif allocation == 'fixed':
+        base = np.where(available, fixed_weights, 0.0)
+    else:
+        base = available.astype(np.float64)
+    total = base.sum(axis=1, keepdims=True)
+    return np.divide(base, total, out=np.zeros_like(base), where=total > 0)
+
+
+# --- Simulation ---
+
+def simulate_portfolio(closes, weights, rebalance, initial_capital):
+    """
+    Trades to `weights` at the close of each `rebalance` bar (the first bar must be one)
+    and holds the resulting share counts until the next. Only the value carried from one
+    rebalance to the next is a running product, one term per rebalance.
+    Returns a dict of per-bar equity, per-bar weights, per-symbol P&L contributions, the
+    number of rebalances and the one-way turnover summed over them (as a fraction of equity).
+    """
+    rebalance_rows = np.flatnonzero(rebalance)
+    target = weights[rebalance_rows]
+    base = closes[rebalance_rows]
+    cash = 1.0 - target.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Growth of each rebalance's holdings up to the next rebalance, and the equity each one starts with
+        growth = np.where(target[:-1] > 0, closes[rebalance_rows[1:]] / base[:-1], 0.0)
+        carried = (target[:-1] * growth).sum(axis=1) + cash[:-1]
+        start_equity = initial_capital * np.r_[1.0, np.cumprod(carried)]
+        shares = np.where(target > 0, start_equity[:, None] * target / base, 0.0)
+
+    # Holdings in force after each bar: those of the latest rebalance at or before it
+    segment = np.cumsum(rebalance) - 1
+    held_shares = shares[segment]
+    values = np.where(held_shares > 0, held_shares * closes, 0.0)
+    equity = values.sum(axis=1) + start_equity[segment] * cash[segment]
+
+    # The move into bar t is earned by the holdings after bar t - 1
+    moves = np.nan_to_num(np.diff(closes, axis=0))
+    contributions = (held_shares[:-1] * moves).sum(axis=0)
+
+    positive = equity[:, None] > 0
+    bar_weights = np.divide(values, equity[:, None], out=np.zeros_like(values), where=positive)
+    # Weights just before each rebalance trade: the previous holdings at that bar's close
+    pre_trade = np.where(shares[:-1] > 0, shares[:-1] * closes[rebalance_rows[1:]], 0.0)
+    drifted = np.divide(pre_trade, equity[rebalance_rows[1:], None], out=np.zeros_like(pre_trade),
+                        where=positive[rebalance_rows[1:]])
+    turnover = 0.5 * np.abs(target[1:] - drifted).sum()
+    return {'equity': equity, 'weights': bar_weights, 'contributions': contributions,
+            'rebalances': len(rebalance_rows), 'turnover': float(turnover)}
+
+
+# --- Orchestration ---
+
+def _fixed_weight_array(symbols, weights):
+    """One weight per symbol from {symbol: weight}; symbols left out get none."""
+    unknown = set(weights) - set(symbols)
+    if unknown:
+        raise ValueError(f"Weights given for symbols not in the portfolio: {', '.join(sorted(unknown))}.")
+    try:
+        array = np.array([float(weights.get(symbol, 0)) for symbol in symbols])
+    except (TypeError, ValueError):
+        raise ValueError("Weights must be numbers.")
+    if not np.isfinite(array).all() or (array < 0).any() or array.sum() <= 0:
+        raise ValueError("Weights must be non-negative and not all zero.")
+    return array
+
+
+def load_portfolio_series(symbols, start_date, end_date, warmup_bars=0):
+    """{symbol: PriceSeries} from `start_date` (less `warmup_bars` of history) to `end_date`."""
+    from ..api_clients.rate_limiter import priority
+    from . import price_store
+
+    with priority('backtest'):
+        series_by_symbol = price_store.get_series_many(symbols, days=365*10)
+    warmup_days = int(warmup_bars * 7 / 5) + 20 if warmup_bars else 0
+    start = pd.to_datetime(start_date) - pd.Timedelta(days=warmup_days)
+    series_by_symbol = {symbol: series_by_symbol[symbol].between(start, pd.to_datetime(end_date))
+                        for symbol in symbols}
+    missing = [symbol for symbol, series in series_by_symbol.items() if not series]
+    if missing:
+        raise ValueError(f"No historical data for {', '.join(missing)} in the selected date range.")
+    return series_by_symbol
+
+
+def run_portfolio_backtest(symbols, start_date, end_date, initial_capital=10000, allocation='equal', weights=None,
+                           rebalance='monthly', strategy_params=None, quantities=None):
+    """
+    Backtests a portfolio of `symbols` from `start_date` to `end_date`.
+    allocation='fixed' takes `weights` ({symbol: weight}, scaled to sum to one) or, without
+    them, weighs the symbols by `quantities` ({symbol: shares held}) at the last close.
+    allocation='signal' runs the registered strategy in `strategy_params` on every symbol.
+    Returns the KPIs, the equity curve and each symbol's contribution and weights.
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    if not symbols:
+        raise ValueError("No symbols to backtest.")
+    if len(symbols) > PORTFOLIO_MAX_SYMBOLS:
+        raise ValueError(f"A portfolio backtest takes at most {PORTFOLIO_MAX_SYMBOLS} symbols.")
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"Unknown allocation '{allocation}'. Use one of: {', '.join(ALLOCATIONS)}.")
+    if allocation == 'fixed' and not weights and not quantities:
+        raise ValueError("Fixed allocation needs weights.")
+    if initial_capital <= 0:
+        raise ValueError("initial_capital must be positive.")
+    rebalance_bars(np.empty(0, np.int64), rebalance)
+
+    warmup_bars = 0
+    if allocation == 'signal':
+        strategy_params = {'name': 'sma_crossover', **(strategy_params or {})}
+        strategy, params = validate_strategy_params(strategy_params)
+        warmup_bars = strategy.warmup_bars(params)
+    series_by_symbol = load_portfolio_series(symbols, start_date, end_date, warmup_bars)
+
+    dates, closes = align_closes(series_by_symbol, symbols)
+    held = _signal_positions(series_by_symbol, symbols, dates, strategy_params) if allocation == 'signal' else None
+    # Signals use the warm-up history; the portfolio trades from start_date
+    first = int(np.searchsorted(dates, to_epoch_days(start_date)))
+    dates, closes = dates[first:], closes[first:]
+    held = held[first:] if held is not None else None
+    if not len(dates):
+        raise ValueError("No historical data available for the selected date range.")
+
+    fixed = None
+    if allocation == 'fixed':
+        if weights:
+            fixed = _fixed_weight_array(symbols, {symbol.upper(): weight for symbol, weight in weights.items()})
+        else:
+            fixed = _fixed_weight_array(symbols, {symbol: quantities.get(symbol, 0) * np.nan_to_num(close)
+                                                  for symbol, close in zip(symbols, closes[-1])})
+    target = target_weights(closes, allocation, fixed, held)
+    flags = rebalance_bars(dates, rebalance)
+    # A symbol is bought when its history starts, whatever the rebalance frequency
+    available = ~np.isnan(closes)
+    flags[1:] |= (available[1:] != available[:-1]).any(axis=1)
+    if allocation == 'signal':
+        # A position opening or closing is traded when it happens, not at the next rebalance
+        flags[1:] |= (held[1:] != held[:-1]).any(axis=1)
+    result = simulate_portfolio(closes, target, flags, float(initial_capital))
+    logger.info(f"Portfolio backtest of {len(symbols)} symbols over {len(dates)} bars: "
+                f"{result['rebalances']} rebalances.")
+
+    equity = result['equity']
+    final_equity = float(equity[-1])
+    net_pnl = final_equity - initial_capital
+    date_strings = np.datetime_as_string(dates.astype('datetime64[D]'), unit='D').tolist()
+    return {
+        "symbols": symbols,
+        "allocation": allocation,
+        "rebalance": rebalance,
+        "strategy": strategy_params['name'] if allocation == 'signal' else None,
+        "kpis": {
+            "net_pnl": net_pnl,
+            "total_return_pct": net_pnl / initial_capital * 100,
+            "initial_capital": float(initial_capital),
+            "final_equity": final_equity,
+            "rebalances": result['rebalances'],
+            "turnover_pct": result['turnover'] * 100
+        },
+        "equity_curve": [{'date': d, 'value': v} for d, v in zip(date_strings, equity.tolist())],
+        "assets": [
+            {'symbol': symbol, 'contribution': float(contribution),
+             'contribution_pct': float(contribution) / initial_capital * 100,
+             'average_weight_pct': float(average) * 100, 'final_weight_pct': float(final) * 100}
+            for symbol, contribution, average, final in zip(
+                symbols, result['contributions'], result['weights'].mean(axis=0), result['weights'][-1])
+        ]
+    }
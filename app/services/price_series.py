@@ -0,0 +1,153 @@
+# app/services/price_series.py
+import logging
+from datetime import date as date_type, datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def to_epoch_days(value):
+    """Converts a date, datetime or 'YYYY-MM-DD...' string to int64 days since 1970-01-01."""
+    if isinstance(value, (date_type, datetime)):
+        return int(np.datetime64(value, 'D').astype(np.int64))
+    return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+class PriceSeries:
+    """
+    Compact columnar daily price history.
+    `date` holds int64 epoch days and the OHLCV fields are contiguous float64 arrays,
+    all oldest-first. Slicing returns views, and to_frame() wraps the arrays without copying.
+    Intraday series use unit='m', in which case `date` holds epoch minutes.
+    """
+    __slots__ = ('symbol', 'unit', 'date') + OHLCV_FIELDS
+
+    def __init__(self, date, open, high, low, close, volume=None, symbol=None, unit='D'):
+        self.symbol = symbol
+        self.unit = unit
+        self.date = np.ascontiguousarray(date, dtype=np.int64)
+        n = len(self.date)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.volume = np.ascontiguousarray(volume if volume is not None else np.full(n, np.nan), dtype=np.float64)
+        for field in OHLCV_FIELDS:
+            if len(getattr(self, field)) != n:
+                raise ValueError(f"PriceSeries field '{field}' has {len(getattr(self, field))} values, expected {n}.")
+
+    # --- Construction ---
+
+    @classmethod
+    def empty(cls, symbol=None, unit='D'):
+        return cls(np.empty(0, np.int64), *(np.empty(0) for _ in range(5)), symbol=symbol, unit=unit)
+
+    @classmethod
+    def from_records(cls, records, symbol=None, unit='D'):
+        """
+        Builds a series from FMP-style dicts ('date', 'open', 'high', 'low', 'close', 'volume').
+        Rows without a parseable date or close are dropped; the result is sorted by date.
+        With unit='m' the time of day is kept ('2024-01-02 15:30:00' intraday bars).
+        """
+        if not records:
+            return cls.empty(symbol, unit)
+        width = 10 if unit == 'D' else 19
+
+        dates, columns = [], {field: [] for field in OHLCV_FIELDS}
+        for item in records:
+            if not isinstance(item, dict) or item.get('date') is None or item.get('close') is None:
+                continue
+            dates.append(str(item['date'])[:width])
+            for field in OHLCV_FIELDS:
+                value = item.get(field)
+                columns[field].append(np.nan if value is None else value)
+
+        if not dates:
+            return cls.empty(symbol, unit)
+        try:
+            date_array = np.array(dates, dtype=f'datetime64[{unit}]').astype(np.int64)
+        except ValueError:
+            parsed = pd.to_datetime(pd.Series(dates), errors='coerce')
+            date_array = parsed.values.astype(f'datetime64[{unit}]').astype(np.int64)
+            date_array[parsed.isna().to_numpy()] = np.iinfo(np.int64).min
+
+        arrays = {field: pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(np.float64)
+                  for field, values in columns.items()}
+        valid = (date_array != np.iinfo(np.int64).min) & ~np.isnan(arrays['close'])
+        order = np.argsort(date_array[valid], kind='stable')
+        return cls(date_array[valid][order], *(arrays[f][valid][order] for f in OHLCV_FIELDS),
+                   symbol=symbol, unit=unit)
+
+    @classmethod
+    def from_frame(cls, df, symbol=None):
+        """Builds a series from a DataFrame with a DatetimeIndex (or 'date' column) and OHLCV columns."""
+        dates = df.index if 'date' not in df.columns else pd.to_datetime(df['date'])
+        date_array = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        n = len(df)
+        return cls(date_array, *(df[f].to_numpy(np.float64) if f in df.columns else np.full(n, np.nan)
+                                 for f in OHLCV_FIELDS), symbol=symbol)
+
+    # --- Access ---
+
+    def __len__(self):
+        return len(self.date)
+
+    def __bool__(self):
+        return len(self.date) > 0
+
+    def __getitem__(self, item):
+        """Positional slicing (series[-200:]) returning a view-backed PriceSeries."""
+        if not isinstance(item, slice):
+            raise TypeError("PriceSeries only supports slice indexing.")
+        return PriceSeries(self.date[item], *(getattr(self, f)[item] for f in OHLCV_FIELDS),
+                           symbol=self.symbol, unit=self.unit)
+
+    def __repr__(self):
+        if not len(self):
+            return f'<PriceSeries {self.symbol} empty>'
+        first, last = self.date_strings()[[0, -1]]
+        return f'<PriceSeries {self.symbol} {len(self)} bars {first}..{last}>'
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in ('date',) + OHLCV_FIELDS)
+
+    @property
+    def last_date(self):
+        return int(self.date[-1]) if len(self) else None
+
+    def dates(self):
+        """Dates as a datetime64[D] (or [m]) view of the date array."""
+        return self.date.view(f'datetime64[{self.unit}]')
+
+    def date_strings(self):
+        return np.datetime_as_string(self.dates(), unit=self.unit)
+
+    def tail(self, n):
+        return self[-n:] if n else self
+
+    def between(self, start=None, end=None):
+        """Returns the bars with start <= date <= end (inclusive) as a view."""
+        lo = 0 if start is None else int(np.searchsorted(self.date, to_epoch_days(start), side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.date, to_epoch_days(end), side='right'))
+        return self[lo:hi]
+
+    # --- Conversion ---
+
+    def to_frame(self):
+        """
+        Returns a DataFrame indexed by date. Column data is shared with this series (no copy),
+        so callers must not mutate it in place.
+        """
+        index = pd.DatetimeIndex(self.dates().astype('datetime64[s]'), name='date')
+        return pd.DataFrame({f: getattr(self, f) for f in OHLCV_FIELDS}, index=index, copy=False)
+
+    def to_records(self):
+        """Returns FMP-style dicts oldest-first, for JSON responses and legacy callers."""
+        dates = self.date_strings().tolist()
+        columns = [np.where(np.isnan(getattr(self, f)), None, getattr(self, f)).tolist() for f in OHLCV_FIELDS]
+        return [dict(zip(('date',) + OHLCV_FIELDS, row)) for row in zip(dates, *columns)]
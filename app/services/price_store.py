@@ -0,0 +1,236 @@
+# app/services/price_store.py
+import os
+import logging
+from datetime import datetime, date, timedelta
+
+import numpy as np
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import DailyBar, PriceSyncState
+from ..api_clients import fmp_client
+from ..api_clients.singleflight import SingleFlight
+from .price_series import PriceSeries
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# How long a symbol's stored history is trusted before checking for new bars.
+SYNC_INTERVAL = timedelta(minutes=int(os.environ.get('PRICE_STORE_SYNC_MINUTES', 60)))
+# Each delta fetch re-reads a few stored days; a mismatch means the upstream
+# re-adjusted history (split, dividend) and the symbol is resynced from scratch.
+OVERLAP_DAYS = 7
+ADJUSTMENT_TOLERANCE = 1e-4
+
+_sync_inflight = SingleFlight('price_store_sync')
+
+
+def _parse_date(value):
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _to_row(symbol, bar):
+    """Converts one FMP historical bar into a daily_bar row dict, or None if unusable."""
+    try:
+        close = bar.get('close')
+        if close is None:
+            return None
+        return {
+            'symbol': symbol,
+            'date': _parse_date(bar['date']),
+            'open': bar.get('open'),
+            'high': bar.get('high'),
+            'low': bar.get('low'),
+            'close': close,
+            'adj_close': bar.get('adjClose'),
+            'volume': bar.get('volume'),
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _upsert_bars(rows):
+    """Inserts or overwrites bars by (symbol, date) using the database's native upsert."""
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            db.session.merge(DailyBar(**row))
+        return
+
+    table = DailyBar.__table__
+    for i in range(0, len(rows), 500):
+        stmt = insert(table).values(rows[i:i + 500])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['symbol', 'date'],
+            set_={c: stmt.excluded[c] for c in ('open', 'high', 'low', 'close', 'adj_close', 'volume')}
+        )
+        db.session.execute(stmt)
+
+
+def _history_was_adjusted(symbol, fetched_rows):
+    """True if bars we already store disagree with the re-fetched overlap window."""
+    overlap = {r['date']: r['close'] for r in fetched_rows}
+    if not overlap:
+        return False
+    stored = db.session.execute(
+        db.select(DailyBar.date, DailyBar.close).where(
+            DailyBar.symbol == symbol, DailyBar.date.in_(list(overlap.keys()))
+        )
+    ).all()
+    for bar_date, close in stored:
+        new_close = overlap[bar_date]
+        if close and abs(new_close - close) / abs(close) > ADJUSTMENT_TOLERANCE:
+            return True
+    return False
+
+
+def _sync(symbol, force):
+    state = db.session.get(PriceSyncState, symbol)
+    now = datetime.utcnow()
+    if not force and state and state.synced_at and now - state.synced_at < SYNC_INTERVAL:
+        return 0
+
+    from_date = None
+    if state and state.last_bar_date and not force:
+        from_date = state.last_bar_date - timedelta(days=OVERLAP_DAYS)
+
+    bars = fmp_client.get_historical_prices(symbol, from_date=from_date)
+    if bars is None:
+        logger.warning(f"Price store sync for {symbol} failed; serving stored bars.")
+        return 0
+
+    rows = [r for r in (_to_row(symbol, b) for b in bars) if r is not None]
+    if from_date and _history_was_adjusted(symbol, rows):
+        logger.info(f"Upstream history for {symbol} was re-adjusted; resyncing the full series.")
+        full_bars = fmp_client.get_historical_prices(symbol)
+        if not full_bars:
+            # Keep the stored (unadjusted) bars rather than lose them; the next sync retries
+            db.session.rollback()
+            logger.warning(f"Full resync of {symbol} failed; keeping stored bars until the next sync.")
+            return 0
+        # The old rows go only once the replacement bars are in hand
+        db.session.execute(db.delete(DailyBar).where(DailyBar.symbol == symbol))
+        rows = [r for r in (_to_row(symbol, b) for b in full_bars) if r]
+        from_date = None
+
+    new_bars = [r for r in rows if not state or not state.last_bar_date or r['date'] > state.last_bar_date]
+    _upsert_bars(rows)
+
+    if state is None:
+        state = PriceSyncState(symbol=symbol)
+        db.session.add(state)
+    if rows:
+        latest = max(r['date'] for r in rows)
+        if state.last_bar_date is None or latest > state.last_bar_date or from_date is None:
+            state.last_bar_date = latest
+    state.synced_at = now
+    db.session.commit()
+    logger.info(f"Price store synced {symbol}: {len(new_bars)} new bars (watermark {state.last_bar_date})")
+    return len(new_bars)
+
+
+def sync_symbol(symbol, force=False):
+    """
+    Brings the stored daily history for `symbol` up to date.
+    Only bars after the last-synced watermark (plus a small overlap) are fetched.
+    Returns the number of new bars stored.
+    """
+    symbol = symbol.upper()
+    try:
+        return _sync_inflight.do(symbol, _sync, symbol, force)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Price store sync failed for {symbol}: {e}")
+        return 0
+
+
+def _load_series(symbol, start_date=None, end_date=None, limit=None):
+    """Reads stored bars straight into columnar arrays, skipping ORM object construction."""
+    columns = (DailyBar.date, DailyBar.open, DailyBar.high, DailyBar.low, DailyBar.close, DailyBar.volume)
+    query = db.select(*columns).where(DailyBar.symbol == symbol)
+    if start_date:
+        query = query.where(DailyBar.date >= start_date)
+    if end_date:
+        query = query.where(DailyBar.date <= end_date)
+    query = query.order_by(DailyBar.date.desc())
+    if limit:
+        query = query.limit(limit)
+    rows = db.session.execute(query).all()
+    if not rows:
+        return PriceSeries.empty(symbol)
+
+    rows.reverse()
+    dates, opens, highs, lows, closes, volumes = zip(*rows)
+    return PriceSeries(
+        np.array(dates, dtype='datetime64[D]').astype(np.int64),
+        *(np.array(col, dtype=np.float64) for col in (opens, highs, lows, closes, volumes)),
+        symbol=symbol
+    )
+
+
+def get_series(symbol, days=1300, start_date=None, end_date=None):
+    """
+    Returns the daily history for `symbol` as a PriceSeries, oldest-first.
+    Reads come from the local store after a delta sync; if the store is unavailable
+    the call falls back to the upstream endpoint.
+    """
+    symbol = symbol.upper()
+    sync_symbol(symbol)
+    try:
+        return _load_series(symbol, start_date=start_date, end_date=end_date, limit=days)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Price store read failed for {symbol}, falling back to FMP: {e}")
+        series = fmp_client.get_historical_series(symbol, days=days or 365 * 30)
+        return series.between(start_date, end_date)
+
+
+def get_series_many(symbols, days=1300):
+    """
+    Returns {symbol: PriceSeries} for many symbols (the last `days` bars of each).
+    Each symbol is delta-synced as in get_series, then all bars are read with a single
+    query and split per symbol, instead of one query per symbol.
+    """
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    for symbol in symbols:
+        sync_symbol(symbol)
+
+    # Calendar-day lower bound generous enough to cover `days` trading days
+    since = date.today() - timedelta(days=int(days * 7 / 5) + 30) if days else None
+    columns = (DailyBar.symbol, DailyBar.date, DailyBar.open, DailyBar.high, DailyBar.low,
+               DailyBar.close, DailyBar.volume)
+    query = db.select(*columns).where(DailyBar.symbol.in_(symbols))
+    if since:
+        query = query.where(DailyBar.date >= since)
+    try:
+        rows = db.session.execute(query.order_by(DailyBar.symbol, DailyBar.date)).all()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Price store batch read failed, falling back to per-symbol reads: {e}")
+        return {symbol: get_series(symbol, days=days) for symbol in symbols}
+
+    result = {symbol: PriceSeries.empty(symbol) for symbol in symbols}
+    if not rows:
+        return result
+    row_symbols, dates, opens, highs, lows, closes, volumes = zip(*rows)
+    row_symbols = np.array(row_symbols)
+    date_array = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    value_arrays = [np.array(col, dtype=np.float64) for col in (opens, highs, lows, closes, volumes)]
+    # Rows are sorted by symbol, so each symbol is one contiguous run
+    boundaries = np.flatnonzero(row_symbols[1:] != row_symbols[:-1]) + 1
+    for lo, hi in zip(np.r_[0, boundaries], np.r_[boundaries, len(row_symbols)]):
+        symbol = row_symbols[lo]
+        series = PriceSeries(date_array[lo:hi], *(a[lo:hi] for a in value_arrays), symbol=symbol)
+        result[symbol] = series.tail(days) if days else series
+    return result
+
+
+def get_historical_data(symbol, days=1300, start_date=None, end_date=None):
+    """Same as get_series, in the list-of-dicts shape of fmp_client.get_historical_data."""
+    return get_series(symbol, days=days, start_date=start_date, end_date=end_date).to_records()
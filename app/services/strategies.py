@@ -0,0 +1,234 @@
+# app/services/strategies.py
+import logging
+
+import numpy as np
+
+from .indicators import first_valid_index
+from .technical_analyzer import plan_indicators
+
+logger = logging.getLogger(__name__)
+
+# Backtest strategies. A strategy turns a price series into boolean entry and exit arrays
+# in one vectorized pass. Its indicators are declared as technical_analyzer specs, so
+# they run through the same planner and NumPy kernels as /technicals, and shared
+# intermediates are computed once. The engine goes long on an entry bar while flat and
+# back to cash on an exit bar while long; a bar flagged as both does neither.
+
+
+class Strategy:
+    """Base class: subclasses set name, label and params and implement indicators() and rules()."""
+    name = None
+    label = None
+    # parameter -> (type, default, minimum, maximum)
+    params = {}
+
+    def validate(self, strategy_params):
+        """The strategy's parameters from `strategy_params` with defaults filled in; raises ValueError."""
+        values = {}
+        for param, (kind, default, low, high) in self.params.items():
+            value = strategy_params.get(param, default)
+            if kind is int and isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if kind is float and isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, kind) or isinstance(value, bool) or not low <= value <= high:
+                raise ValueError(f"{param} must be a {'whole ' if kind is int else ''}number between {low} and {high}.")
+            values[param] = value
+        self.check(values)
+        return values
+
+    def check(self, p):
+        """Cross-parameter rules (e.g. short window below long window); raises ValueError."""
+
+    def indicators(self, p):
+        """technical_analyzer specs, (name, params) tuples, for the indicators the rules use."""
+        return ()
+
+    def rules(self, series, values, p):
+        """(entries, exits) boolean arrays from the series and {output name: array}."""
+        raise NotImplementedError
+
+    def warmup_bars(self, p):
+        """Bars of history needed before the first signal."""
+        raise NotImplementedError
+
+    def signals(self, series, strategy_params):
+        """
+        Returns (entries, exits, ready): boolean arrays over the bars of `series`. `ready` is
+        False while any indicator is still warming up; the backtest starts at the first ready bar.
+        """
+        p = self.validate(strategy_params)
+        values = plan_indicators(self.indicators(p)).evaluate_arrays(series)
+        return self._signals_from(series, values, p)
+
+    def signal_matrix(self, series, param_sets):
+        """
+        signals() for many parameter sets at once, as (bars, parameter sets) arrays. The
+        indicators of all the sets share one plan, so an indicator several sets use (say,
+        the same long SMA) is computed once.
+        """
+        validated = [self.validate(strategy_params) for strategy_params in param_sets]
+        values = plan_indicators(tuple(spec for p in validated for spec in self.indicators(p))).evaluate_arrays(series)
+        entries, exits, ready = (np.empty((len(series), len(validated)), dtype=bool) for _ in range(3))
+        for column, p in enumerate(validated):
+            own = {name: values[name] for name in plan_indicators(self.indicators(p)).outputs}
+            entries[:, column], exits[:, column], ready[:, column] = self._signals_from(series, own, p)
+        return entries, exits, ready
+
+    def _signals_from(self, series, values, p):
+        # Indicator warm-up only: a NaN later on (e.g. RSI over flat prices) just gives no signal
+        start = max((int(first_valid_index(array)) for array in values.values()), default=0)
+        ready = np.arange(len(series)) >= start
+        with np.errstate(invalid='ignore'):
+            entries, exits = self.rules(series, values, p)
+        return entries & ready, exits & ready, ready
+
+    def describe(self):
+        return {'name': self.name, 'label': self.label,
+                'params': {param: {'type': kind.__name__, 'default': default, 'min': low, 'max': high}
+                           for param, (kind, default, low, high) in self.params.items()}}
+
+
+def _previous(x):
+    """x shifted one bar later (NaN on the first bar)."""
+    out = np.full_like(x, np.nan)
+    out[1:] = x[:-1]
+    return out
+
+
+class _MovingAverageCrossover(Strategy):
+    average = None
+    params = {'short_window': (int, 50, 1, 1000), 'long_window': (int, 200, 2, 1000)}
+
+    def check(self, p):
+        if p['short_window'] >= p['long_window']:
+            raise ValueError("short_window must be smaller than long_window.")
+
+    def indicators(self, p):
+        return ((self.average, (p['short_window'],)), (self.average, (p['long_window'],)))
+
+    def rules(self, series, values, p):
+        short = values[f"{self.average}_{p['short_window']}"]
+        long = values[f"{self.average}_{p['long_window']}"]
+        return short > long, short < long
+
+    def warmup_bars(self, p):
+        return p['long_window']
+
+
+class SMACrossover(_MovingAverageCrossover):
+    """Long while the short SMA is above the long SMA."""
+    name, label, average = 'sma_crossover', 'SMA Crossover', 'sma'
+
+
+class EMACrossover(_MovingAverageCrossover):
+    """Long while the short EMA is above the long EMA."""
+    name, label, average = 'ema_crossover', 'EMA Crossover', 'ema'
+    params = {'short_window': (int, 12, 1, 1000), 'long_window': (int, 26, 2, 1000)}
+
+    def warmup_bars(self, p):
+        # Let the long EMA settle past its SMA seed
+        return 3 * p['long_window']
+
+
+class RSIMeanReversion(Strategy):
+    """Buys when RSI falls below `oversold`, sells when it rises above `overbought`."""
+    name, label = 'rsi_mean_reversion', 'RSI Mean Reversion'
+    params = {'rsi_length': (int, 14, 2, 200), 'oversold': (float, 30.0, 1.0, 99.0),
+              'overbought': (float, 70.0, 1.0, 99.0)}
+
+    def check(self, p):
+        if p['oversold'] >= p['overbought']:
+            raise ValueError("oversold must be below overbought.")
+
+    def indicators(self, p):
+        return (('rsi', (p['rsi_length'],)),)
+
+    def rules(self, series, values, p):
+        rsi = values[f"rsi_{p['rsi_length']}"]
+        return rsi < p['oversold'], rsi > p['overbought']
+
+    def warmup_bars(self, p):
+        return 5 * p['rsi_length']
+
+
+class MACDCross(Strategy):
+    """Long while the MACD line is above its signal line."""
+    name, label = 'macd_cross', 'MACD Cross'
+    params = {'fast': (int, 12, 1, 500), 'slow': (int, 26, 2, 500), 'signal': (int, 9, 1, 200)}
+
+    def check(self, p):
+        if p['fast'] >= p['slow']:
+            raise ValueError("fast must be smaller than slow.")
+
+    def indicators(self, p):
+        return (('macd', (p['fast'], p['slow'], p['signal'])),)
+
+    def rules(self, series, values, p):
+        line_key, signal_key, _ = plan_indicators(self.indicators(p)).outputs
+        line, signal = values[line_key], values[signal_key]
+        return line > signal, line < signal
+
+    def warmup_bars(self, p):
+        return 3 * p['slow'] + p['signal']
+
+
+class BollingerBreakout(Strategy):
+    """Buys a close above the upper band and sells a close back below the middle band."""
+    name, label = 'bollinger_breakout', 'Bollinger Breakout'
+    params = {'bb_length': (int, 20, 2, 500), 'num_std': (float, 2.0, 0.1, 10.0)}
+
+    def indicators(self, p):
+        return (('bbands', (p['bb_length'], p['num_std'])),)
+
+    def rules(self, series, values, p):
+        label = f"{p['bb_length']}_{p['num_std']:g}"
+        close = series.close
+        return close > values[f'bbu_{label}'], close < values[f'bbm_{label}']
+
+    def warmup_bars(self, p):
+        return p['bb_length']
+
+
+class DonchianBreakout(Strategy):
+    """
+    Turtle-style breakout: buys a close above the previous `entry_length`-bar high and sells
+    a close below the previous `exit_length`-bar low.
+    """
+    name, label = 'donchian_breakout', 'Donchian Breakout'
+    params = {'entry_length': (int, 20, 2, 500), 'exit_length': (int, 10, 2, 500)}
+
+    def indicators(self, p):
+        return (('donchian', (p['entry_length'],)), ('donchian', (p['exit_length'],)))
+
+    def rules(self, series, values, p):
+        upper = _previous(values[f"dcu_{p['entry_length']}"])
+        lower = _previous(values[f"dcl_{p['exit_length']}"])
+        return series.close > upper, series.close < lower
+
+    def warmup_bars(self, p):
+        return max(p['entry_length'], p['exit_length']) + 1
+
+
+# --- Registry ---
+
+STRATEGIES = {strategy.name: strategy for strategy in (
+    SMACrossover(), EMACrossover(), RSIMeanReversion(), MACDCross(), BollingerBreakout(), DonchianBreakout()
+)}
+
+
+def register_strategy(strategy):
+    """Adds (or replaces) a strategy instance under its name."""
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+def get_strategy(name):
+    strategy = STRATEGIES.get(name or 'sma_crossover')
+    if strategy is None:
+        raise ValueError(f"Unknown strategy '{name}'. Available: {', '.join(STRATEGIES)}.")
+    return strategy
+
+
+def list_strategies():
+    return [strategy.describe() for strategy in STRATEGIES.values()]
@@ -0,0 +1,191 @@
+# app/services/symbol_index.py
+import os
+import re
+import time
+import heapq
+import logging
+import threading
+from bisect import bisect_left, insort
+
+from ..api_clients import fmp_client
+from ..api_clients.rate_limiter import priority
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+REFRESH_INTERVAL_SECONDS = int(os.environ.get('SYMBOL_INDEX_REFRESH_HOURS', 24)) * 60 * 60
+# Listings on these exchanges rank ahead of OTC and foreign duplicates of the same name.
+EXCHANGE_RANK = {'NASDAQ': 0, 'NYSE': 0, 'AMEX': 1, 'ETF': 1, 'CRYPTO': 2, 'FOREX': 2, 'INDEX': 2}
+DEFAULT_EXCHANGE_RANK = 3
+QUERY_CACHE_SIZE = 4096
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_HIGH = '￿'
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class SymbolIndex:
+    """
+    In-memory search index over the symbol universe.
+    Tickers and name tokens are kept in sorted lists so a prefix lookup is two bisects;
+    results are ranked exact ticker > ticker prefix > name prefix > other name token.
+    """
+    def __init__(self, entries=()):
+        self._lock = threading.Lock()
+        self._entries = []          # [{symbol, name, stockExchange, exchangeShortName, currency}]
+        self._by_symbol = {}
+        self._tickers = []          # sorted [(SYMBOL, idx)]
+        self._name_tokens = []      # sorted [(token, idx)]
+        self._entry_tokens = []     # idx -> tuple of name tokens
+        self._query_cache = {}
+        self.built_at = time.time()
+        self._add_unlocked(entries, sort=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add_unlocked(self, entries, sort=False):
+        added = 0
+        for item in entries:
+            symbol = (item.get('symbol') or '').strip().upper()
+            if not symbol or symbol in self._by_symbol:
+                continue
+            entry = {
+                'symbol': symbol,
+                'name': item.get('name') or '',
+                'currency': item.get('currency'),
+                'stockExchange': item.get('stockExchange') or item.get('exchange'),
+                'exchangeShortName': item.get('exchangeShortName'),
+            }
+            idx = len(self._entries)
+            self._entries.append(entry)
+            self._by_symbol[symbol] = idx
+            name_tokens = tuple(_tokens(entry['name']))
+            self._entry_tokens.append(name_tokens)
+            if sort:
+                self._tickers.append((symbol, idx))
+                self._name_tokens.extend((token, idx) for token in set(name_tokens))
+            else:
+                insort(self._tickers, (symbol, idx))
+                for token in set(name_tokens):
+                    insort(self._name_tokens, (token, idx))
+            added += 1
+        if sort:
+            self._tickers.sort()
+            self._name_tokens.sort()
+        if added:
+            self._query_cache.clear()
+        return added
+
+    def add(self, entries):
+        """Merges entries (e.g. upstream search results) into the index; returns how many were new."""
+        with self._lock:
+            return self._add_unlocked(entries)
+
+    @staticmethod
+    def _prefix_range(sorted_pairs, prefix):
+        lo = bisect_left(sorted_pairs, (prefix,))
+        hi = bisect_left(sorted_pairs, (prefix + _HIGH,))
+        return lo, hi
+
+    def _exchange_rank(self, idx):
+        return EXCHANGE_RANK.get(self._entries[idx]['exchangeShortName'], DEFAULT_EXCHANGE_RANK)
+
+    def search(self, query, limit=10):
+        """Returns up to `limit` ranked entries whose ticker or name matches the query prefix."""
+        query = (query or '').strip()
+        if not query:
+            return []
+        cache_key = (query.lower(), limit)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            ranked = {}
+            ticker_query = query.upper()
+            lo, hi = self._prefix_range(self._tickers, ticker_query)
+            for symbol, idx in self._tickers[lo:hi]:
+                tier = 0 if symbol == ticker_query else 1
+                ranked[idx] = (tier, self._exchange_rank(idx), len(symbol), symbol)
+
+            query_tokens = _tokens(query)
+            if query_tokens:
+                lo, hi = self._prefix_range(self._name_tokens, query_tokens[0])
+                for _, idx in self._name_tokens[lo:hi]:
+                    if idx in ranked:
+                        continue
+                    name_tokens = self._entry_tokens[idx]
+                    if not all(any(t.startswith(q) for t in name_tokens) for q in query_tokens[1:]):
+                        continue
+                    tier = 2 if name_tokens and name_tokens[0].startswith(query_tokens[0]) else 3
+                    symbol = self._entries[idx]['symbol']
+                    ranked[idx] = (tier, self._exchange_rank(idx), len(symbol), symbol)
+
+            best = heapq.nsmallest(limit, ranked.items(), key=lambda kv: kv[1])
+            results = [dict(self._entries[idx]) for idx, _ in best]
+
+            if len(self._query_cache) >= QUERY_CACHE_SIZE:
+                self._query_cache.clear()
+            self._query_cache[cache_key] = results
+        return results
+
+
+# --- Module-level index with periodic background refresh ---
+
+_index = SymbolIndex()
+_index_ready = False
+_refresh_lock = threading.Lock()
+_refreshing = False
+
+
+def _build_index():
+    global _index, _index_ready, _refreshing
+    try:
+        with priority('warming'):
+            universe = fmp_client.get_symbol_list()
+        if universe:
+            fresh = SymbolIndex(universe)
+            # Keep symbols learned from upstream searches that the list endpoint lacks
+            fresh.add(_index._entries)
+            _index = fresh
+            _index_ready = True
+            logger.info(f"Symbol index built with {len(fresh)} symbols.")
+        else:
+            logger.warning("Symbol list unavailable; search will keep using the upstream endpoint.")
+    except Exception:
+        logger.error("Failed to build the symbol index", exc_info=True)
+    finally:
+        with _refresh_lock:
+            _refreshing = False
+
+
+def ensure_fresh():
+    """Starts a background rebuild if the index was never built or is older than the refresh interval."""
+    global _refreshing
+    if _index_ready and time.time() - _index.built_at < REFRESH_INTERVAL_SECONDS:
+        return
+    with _refresh_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_build_index, name='symbol-index-refresh', daemon=True).start()
+
+
+def search(query, limit=10):
+    """
+    Typeahead search served from the local index. Only on a local miss is the upstream
+    /search endpoint called; its results are merged into the index for next time.
+    """
+    ensure_fresh()
+    results = _index.search(query, limit=limit)
+    if results:
+        return results
+
+    upstream = fmp_client.search_symbol(query, limit=limit) or []
+    if upstream:
+        _index.add(upstream)
+    return upstream
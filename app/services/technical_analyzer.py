@@ -1,120 +1,118 @@
 # app/services/technical_analyzer.py
-import pandas as pd
-# import traceback # No longer needed if using exc_info=True
+import math
 import logging # Import logging
+import operator
+
+import numpy as np
+
+from .price_series import PriceSeries
+from . import indicators
 
 logger = logging.getLogger(__name__) # Get logger instance
 
-# Try importing pandas_ta, handle if not installed
-try:
-    import pandas_ta as ta
-    PANDAS_TA_AVAILABLE = True
-    logger.info("pandas-ta library found and imported.")
-except ImportError:
-    PANDAS_TA_AVAILABLE = False
-    logger.warning("pandas-ta library not found. RSI and MACD calculation will be skipped.")
-    logger.warning("Please install it: pip install pandas-ta")
+# Minimum history for each output, shared by the single-symbol and batch paths.
+REQUIRED_BARS = {'sma_50': 50, 'sma_200': 200, 'rsi_14': 14, 'macd_line': 35, 'macd_hist': 35, 'macd_signal': 35}
+# The batch path only needs the latest values, so it works on the last BATCH_LOOKBACK bars.
+# Older bars weigh less than (25/27)**560 ~ 1e-19 in the slowest EMA (MACD's 26), so the
+# results equal a full-history computation to float precision.
+BATCH_LOOKBACK = 600
+
+
+def _last(value):
+    """A latest indicator value as a float, or None if it is NaN."""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _cleaned_history(series):
+    """The history list for the chart: [{'date': 'YYYY-MM-DD', 'close': float}, ...]."""
+    dates = series.date_strings().tolist()
+    return [{'date': d, 'close': c} for d, c in zip(dates, series.close.tolist())]
 
 
-def calculate_indicators(historical_data_list):
+def calculate_indicators(historical_data_list, state=None):
     """
     Calculates technical indicators (SMA, RSI, MACD) from historical data.
-    Input: list of dictionaries with 'date', 'close'.
+    Input: a PriceSeries, or a list of dictionaries with 'date', 'close'.
+    If an IndicatorState that is current with the data is passed, its streamed values are
+    used instead of recomputing the history.
     Output: dictionary containing 'indicators' and 'history', or 'error'.
     """
-    required_days_sma50 = 50
-    required_days_sma200 = 200
-    required_days_rsi = 14 # Standard RSI period
+    required_days_sma50 = REQUIRED_BARS['sma_50']
+    required_days_sma200 = REQUIRED_BARS['sma_200']
+    required_days_rsi = REQUIRED_BARS['rsi_14'] # Standard RSI period
     # MACD typically needs ~26 periods for EMA calculations + 9 for signal = ~35 minimum
-    required_days_macd = 35
+    required_days_macd = REQUIRED_BARS['macd_line']
     cleaned_history = []
 
-    if not historical_data_list or not isinstance(historical_data_list, list):
+    if isinstance(historical_data_list, PriceSeries):
+        series = historical_data_list
+    elif not historical_data_list or not isinstance(historical_data_list, list):
          logger.warning("calculate_indicators called with invalid historical data.")
          return {"error": "Invalid historical data provided."}
+    else:
+        series = None
 
-    # --- Initial Data Cleaning and DataFrame Creation ---
+    # --- Initial Data Cleaning ---
     try:
-        relevant_data = []
-        for item in historical_data_list:
-            if isinstance(item, dict) and 'date' in item and 'close' in item:
-                relevant_data.append({'date': item['date'], 'close': item['close']})
+        if series is None:
+            series = PriceSeries.from_records(historical_data_list)
 
-        if not relevant_data:
+        if not series:
             logger.warning("No valid historical data items found with 'date' and 'close'.")
             return {"error": "No valid historical data items found with 'date' and 'close'."}
 
-        df = pd.DataFrame(relevant_data)
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.dropna(subset=['date'])
-        df = df.sort_values(by='date')
-        df['close'] = pd.to_numeric(df['close'], errors='coerce')
-        df = df.dropna(subset=['close'])
-
-        if df.empty:
-             logger.warning("No valid historical data found after cleaning and conversion.")
-             return {"error": "No valid historical data found after cleaning and conversion."}
-
         # Store the cleaned data list for the chart
-        cleaned_history = df[['date', 'close']].to_dict('records')
-        for item in cleaned_history:
-            item['date'] = item['date'].strftime('%Y-%m-%d')
+        cleaned_history = _cleaned_history(series)
 
     except Exception as e:
-        logger.error(f"Error during DataFrame creation/cleaning in calculate_indicators", exc_info=True)
+        logger.error(f"Error during data preparation in calculate_indicators", exc_info=True)
         return {"error": f"Failed during data preparation: {e}"}
 
     # --- Indicator Calculation ---
     try:
-        # Calculate SMAs
-        df['sma_50'] = df['close'].rolling(window=required_days_sma50).mean() if len(df) >= required_days_sma50 else None
-        df['sma_200'] = df['close'].rolling(window=required_days_sma200).mean() if len(df) >= required_days_sma200 else None
+        close = series.close
+        n = len(close)
+
+        if state is not None and state.last_date == series.last_date and state.last_close == close[-1]:
+            values = state.values()
+            # Same minimum-history rules as the computed path below
+            for key, required in REQUIRED_BARS.items():
+                if n < required:
+                    values[key] = None
+            return {"indicators": values, "history": cleaned_history}
+
+        sma_50 = _last(indicators.sma_last(close, required_days_sma50)) if n >= required_days_sma50 else None
+        sma_200 = _last(indicators.sma_last(close, required_days_sma200)) if n >= required_days_sma200 else None
 
-        # Calculate RSI and MACD using pandas_ta if available and enough data
         rsi_value = None
         macd_line = None
         macd_hist = None
         macd_signal = None
 
-        if PANDAS_TA_AVAILABLE:
-            if len(df) >= required_days_rsi:
-                # Calculate RSI (standard period 14)
-                df.ta.rsi(length=required_days_rsi, append=True)
-                # Column name will be 'RSI_14'
-                rsi_value = df['RSI_14'].iloc[-1] if 'RSI_14' in df.columns else None
-            else:
-                 logger.warning(f"Insufficient data ({len(df)} days) for RSI calculation.")
-
-            if len(df) >= required_days_macd:
-                 # Calculate MACD (standard periods 12, 26, 9)
-                 # This appends columns: MACD_12_26_9, MACDh_12_26_9, MACDs_12_26_9
-                 df.ta.macd(append=True)
-                 macd_line = df['MACD_12_26_9'].iloc[-1] if 'MACD_12_26_9' in df.columns else None
-                 macd_hist = df['MACDh_12_26_9'].iloc[-1] if 'MACDh_12_26_9' in df.columns else None
-                 macd_signal = df['MACDs_12_26_9'].iloc[-1] if 'MACDs_12_26_9' in df.columns else None
-            else:
-                 logger.warning(f"Insufficient data ({len(df)} days) for MACD calculation.")
+        if n >= required_days_rsi:
+            # Standard period 14, smoothed like pandas_ta's default RSI
+            rsi_value = _last(indicators.rsi_last(close, length=required_days_rsi))
         else:
-             # Already logged warning at import time
-             pass # logger.debug("Skipping RSI and MACD calculation as pandas-ta is not available.")
-
+            logger.warning(f"Insufficient data ({n} days) for RSI calculation.")
 
-        # Get the latest row for current indicator values
-        latest_indicators_series = df.iloc[-1]
+        if n >= required_days_macd:
+            # Standard periods 12, 26, 9
+            macd_line, macd_signal, macd_hist = (_last(v) for v in indicators.macd_last(close))
+        else:
+            logger.warning(f"Insufficient data ({n} days) for MACD calculation.")
 
         # Prepare results dictionary
         indicator_results = {
-            'last_close': latest_indicators_series.get('close', None),
-            'sma_50': latest_indicators_series.get('sma_50', None),
-            'sma_200': latest_indicators_series.get('sma_200', None),
+            'last_close': _last(close[-1]),
+            'sma_50': sma_50,
+            'sma_200': sma_200,
             'rsi_14': rsi_value, # Add RSI
             'macd_line': macd_line, # Add MACD line
             'macd_hist': macd_hist, # Add MACD histogram
             'macd_signal': macd_signal, # Add MACD signal line
-            'last_calculation_date': latest_indicators_series.get('date').strftime('%Y-%m-%d') if pd.notna(latest_indicators_series.get('date')) else None
+            'last_calculation_date': cleaned_history[-1]['date']
         }
-        # Clean NaN values
-        indicator_results = {k: (None if pd.isna(v) else v) for k, v in indicator_results.items()}
 
         # Return both indicators and the cleaned history list
         return {
@@ -124,4 +122,315 @@ def calculate_indicators(historical_data_list):
 
     except Exception as e:
         logger.error(f"Error calculating indicators", exc_info=True)
-        return {"error": f"Failed to calculate indicators: {e}"}
\ No newline at end of file
+        return {"error": f"Failed to calculate indicators: {e}"}
+
+
+def calculate_indicator_matrix(closes):
+    """
+    Vectorized indicators for many symbols at once.
+    Input: a (bars, symbols) close matrix; columns may be ragged (NaN-padded) or date-aligned
+    with holes, and are end-aligned before computing.
+    Output: dict of 1-D arrays (one entry per column) with the latest 'last_close', 'sma_50',
+    'sma_200', 'rsi_14', 'macd_line', 'macd_signal', 'macd_hist', plus 'bars' (valid counts).
+    Values are NaN where a column has too little history.
+    """
+    aligned, counts = indicators.end_align(closes)
+    aligned = aligned[-BATCH_LOOKBACK:]
+    if aligned.shape[0] == 0:
+        empty = np.full(aligned.shape[1], np.nan)
+        return {key: empty for key in ('last_close',) + tuple(REQUIRED_BARS)} | {'bars': counts}
+    line, signal, hist = indicators.macd_last(aligned)
+    latest = {
+        'last_close': aligned[-1],
+        'sma_50': indicators.sma_last(aligned, 50),
+        'sma_200': indicators.sma_last(aligned, 200),
+        'rsi_14': indicators.rsi_last(aligned, 14),
+        'macd_line': line,
+        'macd_signal': signal,
+        'macd_hist': hist,
+    }
+    for key, required in REQUIRED_BARS.items():
+        latest[key] = np.where(counts >= required, latest[key], np.nan)
+    latest['bars'] = counts
+    return latest
+
+
+def calculate_indicators_batch(series_by_symbol):
+    """
+    Latest indicators for {symbol: PriceSeries} in one vectorized pass.
+    Output: {symbol: indicators dict in the shape of calculate_indicators()['indicators']};
+    symbols without data are left out.
+    """
+    symbols = [symbol for symbol, series in series_by_symbol.items() if series]
+    if not symbols:
+        return {}
+    depth = min(BATCH_LOOKBACK, max(len(series_by_symbol[symbol]) for symbol in symbols))
+    closes = np.full((depth, len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        close = series_by_symbol[symbol].close[-depth:]
+        closes[depth - len(close):, j] = close
+
+    latest = calculate_indicator_matrix(closes)
+    keys = ('last_close',) + tuple(REQUIRED_BARS)
+    columns = {key: np.where(np.isnan(latest[key]), None, latest[key]).tolist() for key in keys}
+    results = {}
+    for j, symbol in enumerate(symbols):
+        values = {key: columns[key][j] for key in keys}
+        values['last_calculation_date'] = str(np.datetime64(series_by_symbol[symbol].last_date, 'D'))
+        results[symbol] = values
+    return results
+
+
+# --- Selectable indicators ---
+# A request such as "sma:20,macd,bbands:20:2.5" is parsed into specs, and the planner
+# expands each spec into nodes keyed by what they compute, e.g. ('ema', 'close', 12).
+# Nodes shared between indicators are computed once: the EMAs behind MACD and a requested
+# ema:12, the SMA behind the Bollinger middle band and sma:20, the true range behind
+# several ATR lengths. Nothing outside the requested indicators is computed.
+
+MAX_SELECTED_INDICATORS = 20
+MAX_INDICATOR_LENGTH = 1000
+
+_SOURCES = ('close', 'high', 'low', 'volume')
+
+
+class IndicatorPlan:
+    """
+    The nodes needed for a set of indicators, in evaluation order. Builders add a node's
+    inputs before the node itself, so insertion order is already a dependency order.
+    """
+    def __init__(self):
+        self.nodes = {}    # node key -> (func, input keys)
+        self.outputs = {}  # output name -> node key
+
+    def add(self, key, func, *inputs):
+        if key not in self.nodes:
+            self.nodes[key] = (func, inputs)
+        return key
+
+    def evaluate_arrays(self, series):
+        """Computes each node once over `series`; returns {output name: full array}."""
+        values = {source: getattr(series, source) for source in _SOURCES}
+        for key, (func, inputs) in self.nodes.items():
+            values[key] = func(*(values[i] for i in inputs))
+        return {name: values[key] for name, key in self.outputs.items()}
+
+    def evaluate(self, series):
+        """Returns {output name: latest value}."""
+        return {name: _last(values[-1]) for name, values in self.evaluate_arrays(series).items()}
+
+
+def _pick(plan, key, index):
+    return plan.add((key, index), operator.itemgetter(index), key)
+
+
+def _sma_node(plan, source, length):
+    return plan.add(('sma', source, length), lambda x: indicators.sma(x, length), source)
+
+
+def _ema_node(plan, source, length):
+    return plan.add(('ema', source, length), lambda x: indicators.ema(x, length), source)
+
+
+def _build_sma(plan, length):
+    return {f'sma_{length}': _sma_node(plan, 'close', length)}
+
+
+def _build_ema(plan, length):
+    return {f'ema_{length}': _ema_node(plan, 'close', length)}
+
+
+def _build_rsi(plan, length):
+    return {f'rsi_{length}': plan.add(('rsi', length), lambda c: indicators.rsi(c, length), 'close')}
+
+
+def _build_macd(plan, fast, slow, signal):
+    line = plan.add(('macd_line', fast, slow), operator.sub,
+                    _ema_node(plan, 'close', fast), _ema_node(plan, 'close', slow))
+    signal_line = _ema_node(plan, line, signal)
+    hist = plan.add(('macd_hist', fast, slow, signal), operator.sub, line, signal_line)
+    # The standard 12/26/9 keeps the keys calculate_indicators() has always returned
+    suffix = '' if (fast, slow, signal) == (12, 26, 9) else f'_{fast}_{slow}_{signal}'
+    return {f'macd_line{suffix}': line, f'macd_signal{suffix}': signal_line, f'macd_hist{suffix}': hist}
+
+
+def _build_bbands(plan, length, std):
+    middle = _sma_node(plan, 'close', length)
+    width = plan.add(('rolling_std', 'close', length), lambda x: indicators.rolling_std(x, length), 'close')
+    lower = plan.add(('bbl', length, std), lambda m, w: m - std * w, middle, width)
+    upper = plan.add(('bbu', length, std), lambda m, w: m + std * w, middle, width)
+    label = f'{length}_{std:g}'
+    return {f'bbl_{label}': lower, f'bbm_{label}': middle, f'bbu_{label}': upper}
+
+
+def _build_atr(plan, length):
+    tr = plan.add(('true_range',), indicators.true_range, 'high', 'low', 'close')
+    return {f'atr_{length}': plan.add(('rma', tr, length), lambda x: indicators.rma(x, length), tr)}
+
+
+def _build_stoch(plan, k, d, smooth_k):
+    both = plan.add(('stoch', k, d, smooth_k),
+                    lambda h, l, c: indicators.stochastic(h, l, c, k, d, smooth_k), 'high', 'low', 'close')
+    label = f'{k}_{d}_{smooth_k}'
+    return {f'stochk_{label}': _pick(plan, both, 0), f'stochd_{label}': _pick(plan, both, 1)}
+
+
+def _build_donchian(plan, length):
+    channel = plan.add(('donchian', length), lambda h, l: indicators.donchian_channel(h, l, length), 'high', 'low')
+    return {f'dcl_{length}': _pick(plan, channel, 0), f'dcm_{length}': _pick(plan, channel, 1),
+            f'dcu_{length}': _pick(plan, channel, 2)}
+
+
+def _build_obv(plan):
+    return {'obv': plan.add(('obv',), indicators.obv, 'close', 'volume')}
+
+
+def _build_vwap(plan, length):
+    # Daily bars have no session to anchor to, so this is the rolling VWAP over `length` bars
+    return {f'vwap_{length}': plan.add(('vwap', length), lambda h, l, c, v: indicators.rolling_vwap(h, l, c, v, length),
+                                       'high', 'low', 'close', 'volume')}
+
+
+# name -> (builder, ((parameter, type, default), ...))
+INDICATOR_REGISTRY = {
+    'sma': (_build_sma, (('length', int, 20),)),
+    'ema': (_build_ema, (('length', int, 20),)),
+    'rsi': (_build_rsi, (('length', int, 14),)),
+    'macd': (_build_macd, (('fast', int, 12), ('slow', int, 26), ('signal', int, 9))),
+    'bbands': (_build_bbands, (('length', int, 20), ('std', float, 2.0))),
+    'atr': (_build_atr, (('length', int, 14),)),
+    'stoch': (_build_stoch, (('k', int, 14), ('d', int, 3), ('smooth_k', int, 3))),
+    'donchian': (_build_donchian, (('length', int, 20),)),
+    'obv': (_build_obv, ()),
+    'vwap': (_build_vwap, (('length', int, 20),)),
+}
+
+
+def _parse_param(name, param, kind, raw):
+    try:
+        value = kind(raw)
+    except ValueError:
+        raise ValueError(f"Invalid {param} '{raw}' for indicator '{name}'.")
+    if kind is int and not 1 <= value <= MAX_INDICATOR_LENGTH:
+        raise ValueError(f"Indicator '{name}' {param} must be between 1 and {MAX_INDICATOR_LENGTH}.")
+    if kind is float and not 0 < value < 100:
+        raise ValueError(f"Indicator '{name}' {param} must be between 0 and 100.")
+    return value
+
+
+def parse_indicator_specs(text):
+    """
+    Parses a selection like "sma:50,ema:21,macd,bbands:20:2.5" into canonical specs,
+    (name, params) tuples with defaults filled in, de-duplicated and sorted so equal
+    selections compare equal. Raises ValueError for unknown names or bad parameters.
+    """
+    specs = set()
+    for item in text.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        name, *raw = item.split(':')
+        if name not in INDICATOR_REGISTRY:
+            raise ValueError(f"Unknown indicator '{name}'. Available: {', '.join(sorted(INDICATOR_REGISTRY))}.")
+        params = INDICATOR_REGISTRY[name][1]
+        if len(raw) > len(params):
+            raise ValueError(f"Indicator '{name}' takes at most {len(params)} parameters.")
+        values = tuple(_parse_param(name, param, kind, raw[i]) if i < len(raw) and raw[i] else default
+                       for i, (param, kind, default) in enumerate(params))
+        if name == 'macd' and values[0] >= values[1]:
+            raise ValueError("MACD fast length must be shorter than the slow length.")
+        specs.add((name, values))
+    if not specs:
+        raise ValueError("No indicators requested.")
+    if len(specs) > MAX_SELECTED_INDICATORS:
+        raise ValueError(f"At most {MAX_SELECTED_INDICATORS} indicators per request.")
+    return tuple(sorted(specs))
+
+
+def plan_indicators(specs):
+    """Builds the IndicatorPlan for parsed specs."""
+    plan = IndicatorPlan()
+    for name, params in specs:
+        builder = INDICATOR_REGISTRY[name][0]
+        plan.outputs.update(builder(plan, *params))
+    return plan
+
+
+def calculate_selected_indicators(historical_data_list, specs):
+    """
+    Calculates only the indicators in `specs` (from parse_indicator_specs).
+    Input: a PriceSeries, or a list of dictionaries with 'date', 'close' (plus 'high', 'low',
+    'volume' for the indicators that use them).
+    Output: the same shape as calculate_indicators(): 'indicators' (latest values, plus
+    'last_close' and 'last_calculation_date') and 'history', or 'error'.
+    """
+    series = historical_data_list
+    if not isinstance(series, PriceSeries):
+        series = PriceSeries.from_records(series if isinstance(series, list) else [])
+    if not series:
+        return {"error": "No valid historical data items found with 'date' and 'close'."}
+
+    try:
+        plan = plan_indicators(specs)
+        values = plan.evaluate(series)
+    except Exception as e:
+        logger.error(f"Error calculating selected indicators {specs}", exc_info=True)
+        return {"error": f"Failed to calculate indicators: {e}"}
+    logger.debug(f"Computed {len(plan.outputs)} outputs from {len(plan.nodes)} nodes for {len(specs)} indicators.")
+
+    cleaned_history = _cleaned_history(series)
+    return {
+        "indicators": {'last_close': _last(series.close[-1]), **values,
+                       'last_calculation_date': cleaned_history[-1]['date']},
+        "history": cleaned_history
+    }
+
+
+# --- Timeframes ---
+# Weekly and monthly bars are aggregated from the stored daily series, so they need no
+# upstream calls. Hourly bars come from the (cached) hourly endpoint. Indicators are then
+# computed on the resulting bars exactly as on daily ones.
+
+TIMEFRAMES = ('daily', 'weekly', 'monthly', 'hourly')
+# Daily bars loaded for each resampled timeframe (None loads the whole stored history)
+TIMEFRAME_DAYS = {'daily': 1300, 'weekly': 2600, 'monthly': None}
+
+
+def _period_keys(series, timeframe):
+    if timeframe == 'weekly':
+        # Epoch day 0 was a Thursday; shifting by 3 starts each week on Monday
+        return (series.date + 3) // 7
+    return series.dates().astype('datetime64[M]').astype(np.int64)
+
+
+def resample(series, timeframe):
+    """
+    Aggregates a daily PriceSeries into weekly or monthly bars in one vectorized pass:
+    first open, highest high, lowest low, last close and total volume per period. Each bar
+    is dated by its last trading day, so the current period's bar is partial.
+    """
+    if timeframe == 'daily' or not series:
+        return series
+    if timeframe not in ('weekly', 'monthly'):
+        raise ValueError(f"Cannot resample daily bars to '{timeframe}'.")
+    _, starts = np.unique(_period_keys(series, timeframe), return_index=True)
+    ends = np.r_[starts[1:], len(series)] - 1
+    has_volume = np.logical_or.reduceat(~np.isnan(series.volume), starts)
+    volume = np.where(has_volume, np.add.reduceat(np.nan_to_num(series.volume), starts), np.nan)
+    return PriceSeries(series.date[ends], series.open[starts],
+                       np.fmax.reduceat(series.high, starts), np.fmin.reduceat(series.low, starts),
+                       series.close[ends], volume, symbol=series.symbol)
+
+
+def get_timeframe_series(symbol, timeframe='daily'):
+    """
+    Bars for `symbol` on `timeframe`: daily from the price store, weekly and monthly
+    resampled from it, hourly from the cached hourly endpoint (unit='m').
+    """
+    from . import price_store
+    from ..api_clients import fmp_client
+
+    if timeframe == 'hourly':
+        records = fmp_client.get_historical_data_hourly(symbol)
+        return PriceSeries.from_records(records if isinstance(records, list) else [], symbol=symbol.upper(), unit='m')
+    return resample(price_store.get_series(symbol, days=TIMEFRAME_DAYS[timeframe]), timeframe)
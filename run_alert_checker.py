@@ -7,6 +7,7 @@ from collections import defaultdict
 from app import app, db
 from app.models import Alert, User
 from app.api_clients.fmp_client import get_quote
+from app.api_clients.rate_limiter import priority
 from app.email import send_price_alert_email
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,15 +28,22 @@ def check_alerts():
         
         logging.info(f"Found {len(active_alerts)} active alerts for {len(alerts_by_symbol)} unique symbols.")
 
+        # One batched request for every symbol; alerts must never be evaluated against a cached price.
+        try:
+            with priority('alerts'):
+                quote_data = get_quote(",".join(alerts_by_symbol.keys()), fresh=True) or []
+        except Exception as e:
+            logging.error(f"Failed to fetch quotes for alert symbols: {e}", exc_info=True)
+            quote_data = []
+        quotes_by_symbol = {q['symbol'].upper(): q for q in quote_data if isinstance(q, dict) and q.get('symbol')}
+
         for symbol, alerts in alerts_by_symbol.items():
             try:
-                quote_data = get_quote(symbol)
-                
-                if not quote_data or not isinstance(quote_data, list) or len(quote_data) == 0:
+                quote = quotes_by_symbol.get(symbol.upper())
+                if not quote:
                     logging.warning(f"Could not get a valid quote for {symbol} from FMP. Skipping.")
                     continue
 
-                quote = quote_data[0]
                 if 'price' not in quote or quote['price'] is None:
                     logging.warning(f"Quote for {symbol} is missing 'price' field. Skipping.")
                     continue
@@ -0,0 +1,86 @@
+# run_backtest_benchmark.py
+# Cross-checks the vectorized backtest mode against the bar-by-bar reference loop and
+# times both.
+#
+#   python run_backtest_benchmark.py --years 10 --repeat 5
+#
+# The modes must agree exactly; --rtol > 0 relaxes the check on cash-derived values
+# (P&L, equity, KPIs) when experimenting with other compounding schemes.
+import time
+import argparse
+import logging
+from datetime import date
+
+import numpy as np
+
+from app.services.backtesting_engine import BacktestEngine
+from app.services.price_series import PriceSeries
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger('app').setLevel(logging.ERROR)
+
+
+def synthetic_series(bars, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, bars)))
+    open_ = close * (1 + rng.normal(0, 0.003, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, bars)))
+    start = np.datetime64(date(2000, 1, 3), 'D').astype(np.int64)
+    return PriceSeries(start + np.arange(bars), open_, high, low, close, rng.uniform(1e5, 1e7, bars))
+
+
+def _run(series, mode):
+    return BacktestEngine('TEST', series, {'name': 'sma_crossover'}, initial_capital=10000, mode=mode).run()
+
+
+def _timeit(series, mode, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _run(series, mode)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def check_agreement(reference, vectorized, rtol):
+    ok = reference['price_data'] == vectorized['price_data']
+    ok &= [e['date'] for e in reference['equity_curve']] == [e['date'] for e in vectorized['equity_curve']]
+    ok &= np.allclose([e['value'] for e in reference['equity_curve']],
+                      [e['value'] for e in vectorized['equity_curve']], rtol=rtol, atol=0)
+    ok &= len(reference['trades']) == len(vectorized['trades'])
+    for ref, vec in zip(reference['trades'], vectorized['trades']):
+        ok &= all(ref[k] == vec[k] for k in ('entry_date', 'entry_price', 'exit_date', 'exit_price'))
+        ok &= (ref['pnl'] is None) == (vec['pnl'] is None)
+        if ref['pnl'] is not None:
+            ok &= bool(np.isclose(ref['pnl'], vec['pnl'], rtol=rtol, atol=0))
+    for key, value in reference['kpis'].items():
+        ok &= bool(np.isclose(value, vectorized['kpis'][key], rtol=rtol, atol=0))
+    return bool(ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-check and time the backtest modes.")
+    parser.add_argument('--years', type=int, nargs='+', default=[2, 10, 30])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rtol', type=float, default=0.0)
+    parser.add_argument('--seeds', type=int, default=20)
+    args = parser.parse_args()
+
+    all_ok = True
+    for years in args.years:
+        bars = years * 252
+        agree = sum(check_agreement(_run(synthetic_series(bars, seed), 'loop'),
+                                    _run(synthetic_series(bars, seed), 'vectorized'), args.rtol)
+                    for seed in range(args.seeds))
+        all_ok &= agree == args.seeds
+        series = synthetic_series(bars, 0)
+        loop_ms = _timeit(series, 'loop', args.repeat)
+        vectorized_ms = _timeit(series, 'vectorized', args.repeat)
+        logging.info(f"{years}y ({bars} bars): loop {loop_ms:.1f} ms | vectorized {vectorized_ms:.1f} ms "
+                     f"({loop_ms / vectorized_ms:.1f}x) | {agree}/{args.seeds} seeds agree")
+
+    logging.info("All results agree." if all_ok else "Results DIFFER beyond tolerance.")
+    raise SystemExit(0 if all_ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# run_fmp_standin.py
+# Replays recorded FMP responses locally so the app can be benchmarked without network access.
+#
+#   1. Record:  FMP_RECORD_DIR=fmp_recordings gunicorn app:app   (exercise the pages you want)
+#   2. Replay:  python run_fmp_standin.py --dir fmp_recordings --latency-ms 40 --error-rate 0.01
+#   3. Point the app at it:  FMP_BASE_URL=http://127.0.0.1:8081/api/v3
+import argparse
+import logging
+
+from app.api_clients.fmp_standin import StandinConfig, StandinServer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the FMP API.")
+    parser.add_argument('--dir', default='fmp_recordings', help="Directory written by FMP_RECORD_DIR.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Fixed latency added to every response.")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Extra uniform random latency.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument('--rate-limit-per-minute', type=int, default=0, help="Answer 429 beyond this rate (0 = off).")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for jitter/error injection.")
+    args = parser.parse_args()
+
+    config = StandinConfig(args.dir, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           error_rate=args.error_rate, rate_limit_per_minute=args.rate_limit_per_minute,
+                           seed=args.seed)
+    server = StandinServer((args.host, args.port), config)
+    logging.info(f"--- FMP stand-in replaying {args.dir} at {server.base_url} ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stand-in stopped.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# run_indicator_benchmark.py
+# Benchmarks the NumPy indicator kernel (app/services/indicators.py) against the previous
+# pandas implementation of calculate_indicators and checks that the results agree.
+#
+#   python run_indicator_benchmark.py --bars 1300 --repeat 200
+#
+# The previous implementation used pandas_ta for RSI and MACD. When pandas_ta is installed
+# it is used as the reference; otherwise its formulas are reproduced with pandas ewm.
+import time
+import argparse
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.services import indicators
+from app.services.price_series import PriceSeries
+from app.services.technical_analyzer import calculate_indicators
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger('app').setLevel(logging.ERROR)
+
+try:
+    import pandas_ta  # noqa: F401  (registers the DataFrame.ta accessor)
+    PANDAS_TA_AVAILABLE = True
+except ImportError:
+    PANDAS_TA_AVAILABLE = False
+
+
+def _pandas_ta_ema(close, length):
+    """pandas_ta.ema with its defaults (SMA seed, adjust=False)."""
+    index = close.index
+    close = close.loc[close.first_valid_index():].copy()
+    if len(close) < length:
+        return pd.Series(np.nan, index=index)
+    seed = close.iloc[:length].mean()
+    close.iloc[:length - 1] = np.nan
+    close.iloc[length - 1] = seed
+    return close.ewm(span=length, adjust=False).mean().reindex(index)
+
+
+def _pandas_ta_rsi(close, length=14):
+    change = close.diff()
+    gain, loss = change.clip(lower=0), change.clip(upper=0).abs()
+    avg_gain = gain.ewm(alpha=1 / length, min_periods=length).mean()
+    avg_loss = loss.ewm(alpha=1 / length, min_periods=length).mean()
+    return 100 * avg_gain / (avg_gain + avg_loss)
+
+
+def legacy_calculate_indicators(history):
+    """The pre-kernel calculate_indicators: DataFrame, to_datetime, sort, rolling, pandas_ta."""
+    df = pd.DataFrame(history)
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date').reset_index(drop=True)
+    df['sma_50'] = df['close'].rolling(window=50).mean()
+    df['sma_200'] = df['close'].rolling(window=200).mean()
+    if len(df) < 35:
+        # The previous implementation skipped RSI below 14 bars and MACD below 35
+        df['RSI_14'] = _pandas_ta_rsi(df['close']) if len(df) >= 14 else np.nan
+        df['MACD_12_26_9'] = df['MACDs_12_26_9'] = df['MACDh_12_26_9'] = np.nan
+    elif PANDAS_TA_AVAILABLE:
+        df.ta.rsi(length=14, append=True)
+        df.ta.macd(append=True)
+    else:
+        df['RSI_14'] = _pandas_ta_rsi(df['close'])
+        line = _pandas_ta_ema(df['close'], 12) - _pandas_ta_ema(df['close'], 26)
+        signal = _pandas_ta_ema(line, 9)
+        df['MACD_12_26_9'], df['MACDs_12_26_9'], df['MACDh_12_26_9'] = line, signal, line - signal
+    cleaned_history = [{'date': row['date'].strftime('%Y-%m-%d'), 'close': row['close']}
+                       for row in df[['date', 'close']].to_dict('records')]
+    latest = df.iloc[-1]
+    result = {
+        'last_close': latest['close'], 'sma_50': latest['sma_50'], 'sma_200': latest['sma_200'],
+        'rsi_14': latest['RSI_14'], 'macd_line': latest['MACD_12_26_9'],
+        'macd_hist': latest['MACDh_12_26_9'], 'macd_signal': latest['MACDs_12_26_9'],
+    }
+    return {'indicators': {k: (None if pd.isna(v) else float(v)) for k, v in result.items()},
+            'history': cleaned_history}
+
+
+def synthetic_history(bars, seed):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, bars)))
+    start = date(2000, 1, 3)
+    return [{'date': (start + timedelta(days=i)).isoformat(), 'close': float(c)} for i, c in enumerate(closes)]
+
+
+def _timeit(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def check_agreement(history, tolerance):
+    """Compares the full indicator arrays, not just the last values."""
+    close = pd.Series([h['close'] for h in history])
+    reference = {
+        'sma_50': close.rolling(50).mean().to_numpy(),
+        'rsi_14': _pandas_ta_rsi(close).to_numpy(),
+    }
+    line = _pandas_ta_ema(close, 12) - _pandas_ta_ema(close, 26)
+    reference['macd_line'] = line.to_numpy()
+    reference['macd_signal'] = _pandas_ta_ema(line, 9).to_numpy()
+
+    values = close.to_numpy()
+    kernel_line, kernel_signal, _ = indicators.macd(values)
+    kernel = {'sma_50': indicators.sma(values, 50), 'rsi_14': indicators.rsi(values),
+              'macd_line': kernel_line, 'macd_signal': kernel_signal}
+
+    ok = True
+    for name, ref in reference.items():
+        same_nan = np.array_equal(np.isnan(ref), np.isnan(kernel[name]))
+        diff = np.nanmax(np.abs(ref - kernel[name])) if (~np.isnan(ref)).any() else 0.0
+        passed = same_nan and diff <= tolerance
+        ok &= passed
+        logging.info(f"  {name:<12} max abs diff {diff:.2e}  warm-up NaNs match: {same_nan}  {'OK' if passed else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy indicator kernel.")
+    parser.add_argument('--bars', type=int, nargs='+', default=[250, 1300, 5000])
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--tolerance', type=float, default=1e-8)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    logging.info(f"--- Reference: {'pandas_ta' if PANDAS_TA_AVAILABLE else 'pandas ewm (pandas_ta formulas)'} ---")
+    all_ok = True
+    for bars in args.bars:
+        history = synthetic_history(bars, args.seed)
+        series = PriceSeries.from_records(history)
+
+        legacy = legacy_calculate_indicators(history)['indicators']
+        current = calculate_indicators(series)['indicators']
+        for key, value in legacy.items():
+            other = current[key]
+            if (value is None) != (other is None) or (value is not None and abs(value - other) > args.tolerance):
+                all_ok = False
+                logging.error(f"  {key}: legacy {value} != kernel {other}")
+
+        legacy_ms = _timeit(legacy_calculate_indicators, history, args.repeat)
+        records_ms = _timeit(calculate_indicators, history, args.repeat)
+        series_ms = _timeit(calculate_indicators, series, args.repeat)
+        logging.info(f"{bars} bars: legacy {legacy_ms:.2f} ms | kernel from records {records_ms:.2f} ms "
+                     f"| kernel from PriceSeries {series_ms:.2f} ms ({legacy_ms / series_ms:.1f}x)")
+        all_ok &= check_agreement(history, args.tolerance)
+
+    logging.info("All results agree." if all_ok else "Results DIFFER beyond tolerance.")
+    raise SystemExit(0 if all_ok else 1)
+
+
+if __name__ == '__main__':
+    main()
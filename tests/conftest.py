@@ -0,0 +1,27 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time: point it at throwaway databases and
+# keep the FMP client off the network before anything imports it.
+_tmp = tempfile.mkdtemp(prefix='tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'app.db')}"
+os.environ['FMP_SHARED_CACHE_PATH'] = os.path.join(_tmp, 'fmp_cache.sqlite3')
+os.environ['FMP_BASE_URL'] = 'http://127.0.0.1:9'
+os.environ.setdefault('FMP_API_KEY', 'test')
+os.environ.setdefault('SECRET_KEY', 'test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app_db():
+    """An application context over freshly created tables."""
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,146 @@
+# tests/test_backtest_optimizer.py
+import multiprocessing
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.services import backtest_optimizer
+from app.services.backtesting_engine import backtest_kpis, positions_from_signals, simulate_positions
+from app.services.price_series import PriceSeries
+from app.services.strategies import get_strategy
+
+
+def _try_slot(user_id, results):
+    # A forked child starts with a copy of the parent's in-process count; only the
+    # host-wide slot should decide here, as in a separate gunicorn worker
+    backtest_optimizer._active_sweeps.clear()
+    with backtest_optimizer.user_slot(user_id) as acquired:
+        results.put(acquired)
+
+
+def _slot_in_other_process(user_id):
+    results = multiprocessing.get_context('fork').Queue()
+    process = multiprocessing.get_context('fork').Process(target=_try_slot, args=(user_id, results))
+    process.start()
+    process.join(30)
+    return results.get(timeout=5)
+
+
+def test_user_slot_is_shared_across_processes():
+    with backtest_optimizer.user_slot(101) as acquired:
+        assert acquired
+        with backtest_optimizer.user_slot(101) as again:
+            assert not again
+        assert not _slot_in_other_process(101)
+        assert _slot_in_other_process(102)
+    assert _slot_in_other_process(101)
+
+
+def test_expand_grid_parses_lists_strings_and_ranges():
+    combinations = backtest_optimizer.expand_grid({'short_window': '10,20', 'long_window': '100:200:50'})
+    assert combinations == [{'short_window': s, 'long_window': l} for s in (10, 20) for l in (100, 150, 200)]
+    assert backtest_optimizer.expand_grid({'short_window': [10.0, 10], 'long_window': [50]}) == \
+        [{'short_window': 10, 'long_window': 50}]
+
+
+def test_expand_grid_drops_invalid_combinations():
+    combinations = backtest_optimizer.expand_grid({'short_window': [50, 100], 'long_window': [60, 100]})
+    assert combinations == [{'short_window': 50, 'long_window': 60}, {'short_window': 50, 'long_window': 100}]
+
+
+@pytest.mark.parametrize('grid', [
+    {'short_window': [10.5], 'long_window': [100]},
+    {'short_window': '10:12:0.5', 'long_window': [100]},
+    {'short_window': ['x']},
+    {'unknown': [1]},
+    {'short_window': [300], 'long_window': [100]},
+])
+def test_expand_grid_rejects_invalid_grids(grid):
+    with pytest.raises(ValueError):
+        backtest_optimizer.expand_grid(grid)
+
+
+def test_expand_grid_accepts_fractional_float_parameters():
+    combinations = backtest_optimizer.expand_grid({'num_std': '1.5:2.5:0.5'}, 'bollinger_breakout')
+    assert [c['num_std'] for c in combinations] == [1.5, 2.0, 2.5]
+
+
+# --- Walk-forward ---
+
+@pytest.mark.parametrize('anchored', [False, True])
+def test_walk_forward_windows_tile_the_test_period(anchored):
+    windows = backtest_optimizer.walk_forward_windows(10, 200, 50, 30, anchored=anchored)
+    assert windows[0][1] == 60 and windows[-1][2] == 200
+    for (_, _, previous_end), (_, test_start, _) in zip(windows, windows[1:]):
+        assert test_start == previous_end
+    for train_start, test_start, test_end in windows:
+        assert train_start == (10 if anchored else test_start - 50)
+        assert 0 < test_end - test_start <= 30
+    assert [w[2] - w[1] for w in windows] == [30, 30, 30, 30, 20]
+
+
+def test_walk_forward_windows_need_room_for_a_test_window():
+    assert backtest_optimizer.walk_forward_windows(0, 50, 50, 10) == []
+
+
+GRID = {'short_window': [5, 10], 'long_window': [20, 40]}
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """run_walk_forward reads 600 synthetic daily bars from 2015-01-01."""
+    rng = np.random.default_rng(5)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, 600)))
+    start = np.datetime64(date(2015, 1, 1), 'D').astype(np.int64)
+    series = PriceSeries(start + np.arange(600), close, close, close, close, np.ones(600), symbol='TEST')
+    monkeypatch.setattr(backtest_optimizer, 'load_backtest_series', lambda *args, **kwargs: series)
+    return series
+
+
+def _walk_forward(anchored=False, **kwargs):
+    return backtest_optimizer.run_walk_forward('TEST', '2015-01-01', '2016-08-22', GRID, train_bars=150,
+                                               test_bars=100, anchored=anchored, **kwargs)
+
+
+@pytest.mark.parametrize('anchored', [False, True])
+def test_walk_forward_picks_the_best_train_params(history, anchored):
+    result = _walk_forward(anchored)
+    strategy = get_strategy('sma_crossover')
+    dates = history.date_strings().tolist()
+    for window in result['windows']:
+        train = slice(dates.index(window['train_start']), dates.index(window['train_end']) + 1)
+        returns = {}
+        for params in backtest_optimizer.expand_grid(GRID):
+            entries, exits, _ = strategy.signals(history, {'name': 'sma_crossover', **params})
+            fills = simulate_positions(history.close[train], positions_from_signals(entries[train], exits[train]), 10000)
+            kpis = backtest_kpis(10000, float(fills['equity'][-1]), fills['pnl'].tolist())
+            returns[tuple(params.items())] = kpis['total_return_pct']
+        assert returns[tuple(window['params'].items())] == max(returns.values())
+        assert window['train_kpis']['total_return_pct'] == max(returns.values())
+
+
+def test_walk_forward_stitches_rescaled_windows(history):
+    result = _walk_forward()
+    curve = result['equity_curve']
+    dates = [point['date'] for point in curve]
+    values = np.array([point['value'] for point in curve])
+
+    # The out-of-sample curve runs from the first test bar to the last bar without gaps
+    assert dates[0] == result['windows'][0]['test_start'] and dates[-1] == history.date_strings()[-1]
+    assert len(curve) == sum(1 for d in history.date_strings() if d >= dates[0])
+
+    for window in result['windows']:
+        first, last = dates.index(window['test_start']), dates.index(window['test_end'])
+        # Each window starts flat with the equity the previous one ended with ...
+        starting_equity = values[first - 1] if first else 10000.0
+        assert values[first] == pytest.approx(starting_equity, rel=1e-12)
+        # ... and grows it as its own run from initial_capital did
+        growth = window['test_kpis']['final_equity'] / window['test_kpis']['initial_capital']
+        assert values[last] / starting_equity == pytest.approx(growth, rel=1e-12)
+    assert result['kpis']['final_equity'] == pytest.approx(values[-1], rel=1e-12)
+
+
+def test_walk_forward_rejects_too_short_history(history):
+    with pytest.raises(ValueError, match='Not enough history'):
+        backtest_optimizer.run_walk_forward('TEST', '2015-01-01', '2016-08-22', GRID, train_bars=590, test_bars=20)
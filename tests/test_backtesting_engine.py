@@ -0,0 +1,44 @@
+# tests/test_backtesting_engine.py
+# The cross-check from run_backtest_benchmark.py: the vectorized mode must agree exactly
+# with the bar-by-bar reference loop.
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.services.backtesting_engine import BacktestEngine
+from app.services.price_series import PriceSeries
+from app.services.strategies import STRATEGIES
+
+
+def _series(bars, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, bars)))
+    open_ = close * (1 + rng.normal(0, 0.003, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, bars)))
+    start = np.datetime64(date(2000, 1, 3), 'D').astype(np.int64)
+    return PriceSeries(start + np.arange(bars), open_, high, low, close, rng.uniform(1e5, 1e7, bars))
+
+
+def _run(series, strategy, mode):
+    return BacktestEngine('TEST', series, {'name': strategy}, initial_capital=10000, mode=mode).run()
+
+
+@pytest.mark.parametrize('strategy', sorted(STRATEGIES))
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_matches_loop(strategy, seed):
+    series = _series(3 * 252, seed)
+    reference = _run(series, strategy, 'loop')
+    vectorized = _run(series, strategy, 'vectorized')
+
+    assert 'error' not in reference
+    assert vectorized['price_data'] == reference['price_data']
+    assert vectorized['equity_curve'] == reference['equity_curve']
+    assert vectorized['trades'] == reference['trades']
+    assert vectorized['kpis'] == reference['kpis']
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        BacktestEngine('TEST', _series(100, 0), {'name': 'sma_crossover'}, mode='fast')
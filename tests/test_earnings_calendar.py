@@ -0,0 +1,90 @@
+# tests/test_earnings_calendar.py
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from app.services import earnings_calendar
+
+
+@pytest.fixture
+def stale_index(monkeypatch):
+    """A stale index plus an upstream that blocks until .release is set and counts its calls."""
+    yesterday = date.today() - timedelta(days=1)
+    monkeypatch.setattr(earnings_calendar, '_index', earnings_calendar.EarningsIndex(yesterday, yesterday, []))
+    monkeypatch.setattr(earnings_calendar, '_refreshing', False)
+    monkeypatch.setattr(earnings_calendar, '_refresh_started_at', 0.0)
+
+    class Upstream:
+        calls = 0
+        release = threading.Event()
+        done = threading.Event()
+        events = None
+
+        def __call__(self, from_date, to_date, fresh=False):
+            self.calls += 1
+            self.release.wait(5)
+            self.done.set()
+            return self.events
+
+    fake = Upstream()
+    monkeypatch.setattr(earnings_calendar.fmp_client, 'get_earnings_calendar', fake)
+    return fake
+
+
+def _wait_for_refresh_to_finish():
+    for _ in range(100):
+        if not earnings_calendar._refreshing:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("background refresh did not finish")
+
+
+def test_one_refresh_at_a_time(stale_index):
+    stale = earnings_calendar._index
+    for _ in range(5):
+        assert earnings_calendar.get_index() is stale
+
+    stale_index.events = [{'symbol': 'AAPL', 'date': date.today().isoformat()}]
+    stale_index.release.set()
+    assert stale_index.done.wait(5)
+    _wait_for_refresh_to_finish()
+    assert stale_index.calls == 1
+    assert earnings_calendar.get_index().start == date.today()
+
+
+def test_failing_upstream_is_not_retried_on_every_request(stale_index):
+    stale_index.release.set()
+    earnings_calendar.get_index()
+    assert stale_index.done.wait(5)
+    _wait_for_refresh_to_finish()
+
+    for _ in range(5):
+        earnings_calendar.get_index()
+    _wait_for_refresh_to_finish()
+    assert stale_index.calls == 1
+
+
+def test_refresh_reads_past_the_response_cache(monkeypatch):
+    calls = []
+
+    def fake_request(endpoint, params=None):
+        calls.append(endpoint)
+        return [{'symbol': 'AAPL', 'date': date.today().isoformat()}]
+
+    earnings_calendar.fmp_client.get_earnings_calendar.cache_clear()
+    monkeypatch.setattr(earnings_calendar.fmp_client, '_fmp_request', fake_request)
+    monkeypatch.setattr(earnings_calendar, '_index', None)
+    monkeypatch.setattr(earnings_calendar, '_refreshing', False)
+    monkeypatch.setattr(earnings_calendar, '_refresh_started_at', 0.0)
+
+    index = earnings_calendar.get_index()
+    assert calls == ['/earning_calendar']
+
+    # The index ages out while the cached payload it was built from is still fresh
+    index.built_at -= earnings_calendar.REFRESH_SECONDS + 1
+    assert earnings_calendar.get_index() is index
+    _wait_for_refresh_to_finish()
+    assert calls == ['/earning_calendar', '/earning_calendar']
+    assert earnings_calendar.get_index() is not index
+    earnings_calendar.fmp_client.get_earnings_calendar.cache_clear()
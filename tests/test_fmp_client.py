@@ -0,0 +1,76 @@
+# tests/test_fmp_client.py
+import pytest
+import requests
+
+from app.api_clients import circuit_breaker, fmp_client
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, bad_json=False):
+        self.status_code = status_code
+        self.body = body
+        self.bad_json = bad_json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error", response=self)
+
+    def json(self):
+        if self.bad_json:
+            raise ValueError("Expecting value")
+        return self.body
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """A fresh breaker per test and a settable .response for the next upstream GET."""
+    breaker = circuit_breaker.CircuitBreaker('test', failure_threshold=2, recovery_seconds=0)
+
+    class Upstream:
+        response = None
+
+    fake = Upstream()
+    fake.breaker = breaker
+    monkeypatch.setattr(fmp_client.circuit_breaker, 'get_breaker', lambda name: breaker)
+    monkeypatch.setattr(fmp_client.rate_limiter, 'acquire', lambda endpoint: True)
+    monkeypatch.setattr(fmp_client.http_session, 'get_with_retries', lambda *a, **kw: fake.response)
+    return fake
+
+
+def test_unparseable_body_counts_as_failure_only(upstream):
+    upstream.breaker.consecutive_failures = 1
+    upstream.response = FakeResponse(200, bad_json=True)
+
+    assert fmp_client._fetch('/quote/AAPL', {}, 'k') == (None, True)
+    assert upstream.breaker.state == circuit_breaker.OPEN
+    assert upstream.breaker.stats['failures'] == 1
+
+
+def test_client_error_does_not_close_or_trip_the_breaker(upstream):
+    upstream.breaker.consecutive_failures = 1
+    upstream.response = FakeResponse(404)
+
+    assert fmp_client._fetch('/quote/AAPL', {}, 'k') == (None, False)
+    assert upstream.breaker.state == circuit_breaker.CLOSED
+    assert upstream.breaker.consecutive_failures == 1
+
+
+def test_client_error_frees_the_half_open_probe(upstream):
+    upstream.breaker.record_failure('down')
+    upstream.breaker.record_failure('down')
+    upstream.response = FakeResponse(404)
+
+    assert fmp_client._fetch('/quote/AAPL', {}, 'k') == (None, False)
+    assert upstream.breaker.state == circuit_breaker.HALF_OPEN
+    assert upstream.breaker.probes_in_flight == 0
+    assert upstream.breaker.allow()
+
+
+def test_parsed_response_closes_the_breaker(upstream):
+    upstream.breaker.record_failure('down')
+    upstream.breaker.record_failure('down')
+    upstream.response = FakeResponse(200, body=[{'symbol': 'AAPL'}])
+
+    assert fmp_client._fetch('/quote/AAPL', {}, 'k') == ([{'symbol': 'AAPL'}], False)
+    assert upstream.breaker.state == circuit_breaker.CLOSED
+    assert upstream.breaker.consecutive_failures == 0
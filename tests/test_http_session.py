@@ -0,0 +1,111 @@
+# tests/test_http_session.py
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app.api_clients import http_session
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'[]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(http_session, '_session', None)
+    monkeypatch.setattr(http_session, '_session_pid', None)
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_pool_stats_count_requests_and_reuse(server):
+    assert http_session.get_pool_stats() == {}
+    for _ in range(3):
+        http_session.get_with_retries(f"{server}/quote/AAPL").json()
+
+    assert http_session.get_pool_stats() == {server: {'requests': 3, 'misses': 1, 'hits': 2}}
+
+
+class _FakeSession:
+    """Stands in for the pooled session: records each attempt's timeout and replays `outcomes`."""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def get(self, url, params=None, timeout=None):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            time.sleep(min(timeout[1], 0.2))
+            raise outcome
+        return outcome
+
+
+class _Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {'Retry-After': retry_after} if retry_after else {}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    monkeypatch.setattr(http_session, 'TOTAL_TIMEOUT', 0.5)
+    monkeypatch.setattr(http_session, 'MAX_RETRIES', 10)
+    monkeypatch.setattr(http_session, '_backoff_delay', lambda attempt, response=None: (
+        float(response.headers['Retry-After']) if response is not None and response.headers else 0.05))
+
+    def install(*outcomes):
+        session = _FakeSession(*outcomes)
+        monkeypatch.setattr(http_session, 'get_session', lambda: session)
+        return session
+    return install
+
+
+def test_retries_stop_at_the_total_timeout(fake_session):
+    session = fake_session(requests.exceptions.ReadTimeout('slow'))
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        http_session.get_with_retries('http://upstream/quote/AAPL', timeout=(3.05, 10))
+
+    assert time.monotonic() - started < 0.8
+    assert 1 < len(session.timeouts) < 10
+    # Each attempt gets at most the time left in the budget
+    assert all(connect <= 0.5 and read <= 0.5 for connect, read in session.timeouts)
+    assert session.timeouts[-1][1] < session.timeouts[0][1]
+
+
+def test_retry_after_beyond_the_budget_returns_the_response(fake_session):
+    session = fake_session(_Response(429, retry_after='4'), _Response(200))
+    started = time.monotonic()
+    response = http_session.get_with_retries('http://upstream/quote/AAPL')
+
+    assert response.status_code == 429
+    assert len(session.timeouts) == 1
+    assert time.monotonic() - started < 0.1
+
+
+def test_retries_within_the_budget(fake_session):
+    session = fake_session(_Response(503), _Response(200))
+    assert http_session.get_with_retries('http://upstream/quote/AAPL', timeout=2).status_code == 200
+    assert len(session.timeouts) == 2
@@ -0,0 +1,69 @@
+# tests/test_indicator_cache.py
+import json
+
+import numpy as np
+import pytest
+
+from app.services import indicator_cache
+from app.services.price_series import PriceSeries
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(indicator_cache, '_results', indicator_cache.ByteLRU(indicator_cache.MAX_BYTES))
+    monkeypatch.setattr(indicator_cache, '_recent', indicator_cache.OrderedDict())
+
+
+def _series(bars=50, last=1.0):
+    close = np.ones(bars)
+    close[-1] = last
+    return PriceSeries(19000 + np.arange(bars), close, close, close, close, np.ones(bars))
+
+
+def test_result_is_computed_once_per_history():
+    calls = []
+    compute = lambda: calls.append(1) or {'value': len(calls)}
+    series = _series()
+    assert json.loads(indicator_cache.get_or_compute('AAA', series, compute)) == {'value': 1}
+    assert json.loads(indicator_cache.get_or_compute('AAA', series, compute)) == {'value': 1}
+    assert indicator_cache.get_recent('AAA') == b'{"value":1}'
+    # A revised last bar changes the fingerprint
+    indicator_cache.get_or_compute('AAA', _series(last=2.0), compute)
+    assert len(calls) == 2
+
+
+def test_errors_are_not_cached():
+    body = indicator_cache.get_or_compute('AAA', _series(), lambda: {'error': 'boom'})
+    assert json.loads(body) == {'error': 'boom'}
+    assert indicator_cache.get_recent('AAA') is None
+
+
+def test_byte_lru_evicts_least_recently_used():
+    lru = indicator_cache.ByteLRU(10)
+    lru.set('a', b'1234')
+    lru.set('b', b'1234')
+    lru.get('a')
+    lru.set('c', b'1234')
+    assert 'a' in lru and 'c' in lru and 'b' not in lru
+    assert lru.nbytes == 8 and lru.stats['evictions'] == 1
+
+
+def test_recent_entries_are_bounded(monkeypatch):
+    monkeypatch.setattr(indicator_cache, 'RECENT_MAX_ENTRIES', 3)
+    series = _series()
+    for length in range(10):
+        indicator_cache.get_or_compute('AAA', series, dict, indicator_set=(f'sma_{length}',))
+    assert list(indicator_cache._recent) == [('AAA', 'daily', (f'sma_{n}',)) for n in (7, 8, 9)]
+
+
+def test_expired_recent_entries_are_dropped(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(indicator_cache.time, 'time', lambda: clock[0])
+    series = _series()
+    indicator_cache.get_or_compute('AAA', series, dict)
+    clock[0] += indicator_cache.REVALIDATE_SECONDS + 1
+    indicator_cache.get_or_compute('BBB', series, dict)
+    assert list(indicator_cache._recent) == [('BBB', 'daily', indicator_cache.DEFAULT_SET)]
+    clock[0] += indicator_cache.REVALIDATE_SECONDS + 1
+    assert indicator_cache.get_recent('BBB') is None
+    assert not indicator_cache._recent
@@ -0,0 +1,51 @@
+# tests/test_indicator_state.py
+import numpy as np
+import pytest
+
+from app.services.indicator_state import IndicatorState
+from app.services.price_series import PriceSeries
+from app.services.technical_analyzer import calculate_indicators
+
+
+def _series(bars, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, bars)))
+    return PriceSeries(19000 + np.arange(bars), close, close, close, close, np.ones(bars))
+
+
+def _assert_matches(values, expected):
+    for key, value in expected.items():
+        if value is None or isinstance(value, str):
+            assert values[key] == value, key
+        else:
+            assert values[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+
+
+@pytest.mark.parametrize('bars', [10, 30, 199, 200, 600])
+def test_streamed_values_match_kernels(bars):
+    series = _series(bars)
+    expected = calculate_indicators(series)['indicators']
+    state = IndicatorState.from_series(series)
+    _assert_matches(calculate_indicators(series, state=state)['indicators'], expected)
+
+
+def test_incremental_and_revised_bars_match_full_rebuild():
+    series = _series(400, seed=3)
+    state = IndicatorState.from_series(series[:300])
+    assert state.apply_series(series[:350]) == 50
+
+    # Today's bar revised intraday, then round-tripped through serialization
+    revised = PriceSeries(series.date[:350].copy(), *(series.close[:350].copy() for _ in range(4)),
+                          np.ones(350))
+    revised.close[-1] *= 1.02
+    assert state.apply_series(revised) == 1
+    state = IndicatorState.from_dict(state.to_dict())
+    _assert_matches(calculate_indicators(revised, state=state)['indicators'],
+                    calculate_indicators(revised)['indicators'])
+
+
+def test_adjusted_history_is_rejected():
+    series = _series(300, seed=5)
+    state = IndicatorState.from_series(series[:250])
+    adjusted = PriceSeries(series.date, *(series.close * 0.5 for _ in range(4)), np.ones(300))
+    assert state.apply_series(adjusted) is None
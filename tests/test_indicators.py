@@ -0,0 +1,103 @@
+# tests/test_indicators.py
+# The agreement checks from run_indicator_benchmark.py: the NumPy kernels against the
+# pandas formulas of the previous pandas_ta implementation.
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import indicators
+from app.services.price_series import PriceSeries
+from app.services.technical_analyzer import calculate_indicators
+
+TOLERANCE = 1e-8
+
+
+def _pandas_ta_ema(close, length):
+    """pandas_ta.ema with its defaults (SMA seed, adjust=False)."""
+    index = close.index
+    close = close.loc[close.first_valid_index():].copy()
+    if len(close) < length:
+        return pd.Series(np.nan, index=index)
+    close.iloc[length - 1] = close.iloc[:length].mean()
+    close.iloc[:length - 1] = np.nan
+    return close.ewm(span=length, adjust=False).mean().reindex(index)
+
+
+def _pandas_ta_rsi(close, length=14):
+    change = close.diff()
+    gain, loss = change.clip(lower=0), change.clip(upper=0).abs()
+    avg_gain = gain.ewm(alpha=1 / length, min_periods=length).mean()
+    avg_loss = loss.ewm(alpha=1 / length, min_periods=length).mean()
+    return 100 * avg_gain / (avg_gain + avg_loss)
+
+
+def _reference(close):
+    line = _pandas_ta_ema(close, 12) - _pandas_ta_ema(close, 26)
+    signal = _pandas_ta_ema(line, 9)
+    return {
+        'sma_50': close.rolling(50).mean().to_numpy(),
+        'sma_200': close.rolling(200).mean().to_numpy(),
+        'rsi_14': _pandas_ta_rsi(close).to_numpy(),
+        'macd_line': line.to_numpy(),
+        'macd_signal': signal.to_numpy(),
+        'macd_hist': (line - signal).to_numpy(),
+    }
+
+
+def _kernels(values):
+    line, signal, hist = indicators.macd(values)
+    return {'sma_50': indicators.sma(values, 50), 'sma_200': indicators.sma(values, 200),
+            'rsi_14': indicators.rsi(values), 'macd_line': line, 'macd_signal': signal, 'macd_hist': hist}
+
+
+def _history(bars, seed):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, bars)))
+    start = date(2000, 1, 3)
+    return [{'date': (start + timedelta(days=i)).isoformat(), 'close': float(c)} for i, c in enumerate(closes)]
+
+
+def _assert_arrays_match(name, expected, actual):
+    assert np.array_equal(np.isnan(expected), np.isnan(actual)), f"{name}: warm-up NaNs differ"
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE, equal_nan=True, err_msg=name)
+
+
+@pytest.mark.parametrize('bars', [250, 1300])
+@pytest.mark.parametrize('seed', [7, 11])
+def test_kernels_match_pandas_formulas(bars, seed):
+    close = pd.Series([h['close'] for h in _history(bars, seed)])
+    kernel = _kernels(close.to_numpy())
+    for name, expected in _reference(close).items():
+        _assert_arrays_match(name, expected, kernel[name])
+
+
+@pytest.mark.parametrize('bars', [10, 30, 40, 250, 1300])
+def test_calculate_indicators_matches_previous_implementation(bars):
+    history = _history(bars, seed=7)
+    close = pd.Series([h['close'] for h in history])
+    reference = {name: values[-1] for name, values in _reference(close).items()}
+    if bars < 35:
+        # The previous implementation skipped MACD below 35 bars
+        reference.update(macd_line=np.nan, macd_signal=np.nan, macd_hist=np.nan)
+
+    for data in (history, PriceSeries.from_records(history)):
+        result = calculate_indicators(data)['indicators']
+        assert result['last_close'] == history[-1]['close']
+        for name, expected in reference.items():
+            if np.isnan(expected):
+                assert result[name] is None, name
+            else:
+                assert result[name] == pytest.approx(expected, rel=0, abs=TOLERANCE), name
+
+
+def test_kernels_match_pandas_ta():
+    pytest.importorskip('pandas_ta')
+    df = pd.DataFrame({'close': [h['close'] for h in _history(1300, seed=7)]})
+    df.ta.rsi(length=14, append=True)
+    df.ta.macd(append=True)
+    kernel = _kernels(df['close'].to_numpy())
+    for name, column in (('rsi_14', 'RSI_14'), ('macd_line', 'MACD_12_26_9'),
+                         ('macd_signal', 'MACDs_12_26_9'), ('macd_hist', 'MACDh_12_26_9')):
+        _assert_arrays_match(name, df[column].to_numpy(), kernel[name])
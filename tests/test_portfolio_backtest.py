@@ -0,0 +1,195 @@
+# tests/test_portfolio_backtest.py
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.services import portfolio_backtest
+from app.services.portfolio_backtest import rebalance_bars, simulate_portfolio, target_weights
+from app.services.price_series import PriceSeries
+
+START = int(np.datetime64(date(2021, 1, 4), 'D').astype(np.int64))  # a Monday
+
+
+def _closes(bars, symbols, seed):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (bars, symbols)), axis=0))
+
+
+def _reference(closes, weights, rebalance, initial_capital):
+    """Bar-by-bar portfolio: trade to the target weights on rebalance bars, hold shares otherwise."""
+    shares = np.zeros(closes.shape[1])
+    cash = initial_capital
+    equity = []
+    for t in range(len(closes)):
+        prices = np.nan_to_num(closes[t])
+        if rebalance[t]:
+            value = cash + (shares * prices).sum()
+            shares = np.where(weights[t] > 0, value * weights[t] / np.where(prices > 0, prices, 1.0), 0.0)
+            cash = value * (1.0 - weights[t].sum())
+        equity.append(cash + (shares * prices).sum())
+    return np.array(equity)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_simulation_matches_reference_loop(seed):
+    rng = np.random.default_rng(seed)
+    closes = _closes(300, 4, seed)
+    closes[:40, 2] = np.nan  # listed later
+    weights = target_weights(closes, 'fixed', rng.uniform(0.1, 1.0, 4))
+    weights[100:150] *= 0.5  # part of the capital in cash
+    flags = rng.random(300) < 0.05
+    flags[0] = flags[40] = flags[100] = flags[150] = True
+
+    result = simulate_portfolio(closes, weights, flags, 10000.0)
+    expected = _reference(closes, weights, flags, 10000.0)
+    np.testing.assert_allclose(result['equity'], expected, rtol=1e-10)
+    assert result['rebalances'] == flags.sum()
+    assert result['contributions'].sum() == pytest.approx(expected[-1] - 10000.0, rel=1e-9)
+
+
+def test_without_rebalancing_the_weights_drift():
+    closes = np.array([[100.0, 100.0], [200.0, 100.0]])
+    flags = np.array([True, False])
+    result = simulate_portfolio(closes, np.full((2, 2), 0.5), flags, 1000.0)
+
+    assert result['equity'].tolist() == [1000.0, 1500.0]
+    np.testing.assert_allclose(result['weights'][-1], [2 / 3, 1 / 3])
+    assert result['turnover'] == 0.0
+
+
+# --- Weights ---
+
+def test_equal_weights_skip_symbols_without_a_price():
+    closes = np.array([[np.nan, 10.0, 20.0], [5.0, 10.0, 20.0]])
+    weights = target_weights(closes, 'equal')
+    np.testing.assert_allclose(weights, [[0, 0.5, 0.5], [1 / 3, 1 / 3, 1 / 3]])
+
+
+def test_fixed_weights_are_normalized():
+    closes = np.array([[np.nan, 10.0, 20.0], [5.0, 10.0, 20.0]])
+    weights = target_weights(closes, 'fixed', np.array([2.0, 1.0, 1.0]))
+    np.testing.assert_allclose(weights, [[0, 0.5, 0.5], [0.5, 0.25, 0.25]])
+
+
+def test_signal_weights_split_over_held_symbols():
+    closes = np.ones((3, 3))
+    held = np.array([[True, True, False], [False, False, False], [True, True, True]])
+    weights = target_weights(closes, 'signal', held=held)
+    np.testing.assert_allclose(weights, [[0.5, 0.5, 0], [0, 0, 0], [1 / 3, 1 / 3, 1 / 3]])
+
+
+@pytest.mark.parametrize('weights, message', [
+    ({'AAPL': 1, 'TSLA': 1}, 'not in the portfolio'),
+    ({'AAPL': 'heavy'}, 'must be numbers'),
+    ({'AAPL': -1, 'MSFT': 2}, 'non-negative'),
+    ({'AAPL': 0, 'MSFT': 0}, 'not all zero'),
+])
+def test_bad_weights_are_rejected(weights, message):
+    with pytest.raises(ValueError, match=message):
+        portfolio_backtest._fixed_weight_array(['AAPL', 'MSFT'], weights)
+
+
+# --- Rebalancing cadence ---
+
+@pytest.mark.parametrize('frequency, expected', [
+    ('daily', 130), ('weekly', 26), ('monthly', 7), ('quarterly', 3), ('none', 1),
+])
+def test_rebalance_cadence(frequency, expected):
+    # 26 weeks of weekdays, Monday 2021-01-04 to Friday 2021-07-02
+    dates = np.array([START + week * 7 + day for week in range(26) for day in range(5)])
+    flags = rebalance_bars(dates, frequency)
+    assert flags[0] and flags.sum() == expected
+    if frequency == 'monthly':
+        months = dates[flags].astype('datetime64[D]').astype(str)
+        assert [m[:7] for m in months] == ['2021-01', '2021-02', '2021-03', '2021-04',
+                                           '2021-05', '2021-06', '2021-07']
+
+
+def test_unknown_rebalance_frequency():
+    with pytest.raises(ValueError, match='rebalance frequency'):
+        rebalance_bars(np.arange(5), 'hourly')
+
+
+# --- Allocations end to end ---
+
+@pytest.fixture
+def prices(monkeypatch):
+    """Replaces the price store read with 120 bars of synthetic closes for AAPL and MSFT."""
+    closes = _closes(120, 2, seed=3)
+    dates = START + np.arange(120)
+    series = {symbol: PriceSeries(dates, closes[:, i], closes[:, i], closes[:, i], closes[:, i],
+                                  np.ones(120), symbol=symbol)
+              for i, symbol in enumerate(('AAPL', 'MSFT'))}
+    monkeypatch.setattr(portfolio_backtest, 'load_portfolio_series',
+                        lambda symbols, start, end, warmup_bars=0: {s: series[s] for s in symbols})
+    return closes
+
+
+def _run(**kwargs):
+    return portfolio_backtest.run_portfolio_backtest(['AAPL', 'MSFT'], '2021-01-04', '2021-05-03', **kwargs)
+
+
+def test_equal_allocation(prices):
+    result = _run(allocation='equal', rebalance='daily')
+    assert [a['final_weight_pct'] for a in result['assets']] == pytest.approx([50.0, 50.0])
+    assert result['kpis']['rebalances'] == 120
+
+
+def test_fixed_allocation(prices):
+    result = _run(allocation='fixed', weights={'aapl': 3, 'msft': 1}, rebalance='daily')
+    assert [a['average_weight_pct'] for a in result['assets']] == pytest.approx([75.0, 25.0])
+    expected = _reference(prices, np.tile([0.75, 0.25], (120, 1)), np.ones(120, bool), 10000.0)
+    assert result['kpis']['final_equity'] == pytest.approx(expected[-1], rel=1e-10)
+
+
+def test_signal_allocation_holds_only_long_symbols(prices):
+    result = _run(allocation='signal', rebalance='none',
+                  strategy_params={'name': 'sma_crossover', 'short_window': 5, 'long_window': 20})
+    assert result['strategy'] == 'sma_crossover'
+    # Flat until the long average is ready, so the capital sits in cash
+    assert result['equity_curve'][0]['value'] == 10000.0
+    assert result['kpis']['rebalances'] > 1
+
+
+def test_fixed_allocation_needs_weights(prices):
+    with pytest.raises(ValueError, match='needs weights'):
+        _run(allocation='fixed')
+
+
+# --- API ---
+
+@pytest.fixture
+def pro_client(app_db, prices):
+    from app import app
+    from app.models import User
+    user = User(email='pro@example.com', subscription_tier='pro')
+    app_db.session.add(user)
+    app_db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+
+def _post(client, **params):
+    body = {'start_date': '2021-01-04', 'end_date': '2021-05-03', 'symbols': ['AAPL', 'MSFT'],
+            'allocation': 'signal', 'strategy': 'sma_crossover', **params}
+    return client.post('/api/run-backtest/portfolio', json=body)
+
+
+@pytest.mark.parametrize('params', [
+    {'short_window': [5]}, {'short_window': 'five'}, {'short_window': 5.5},
+    {'short_window': 0}, {'long_window': True},
+])
+def test_api_rejects_bad_strategy_params(pro_client, params):
+    response = _post(pro_client, **{'short_window': 5, 'long_window': 20, **params})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_api_accepts_strategy_params(pro_client):
+    response = _post(pro_client, short_window=5.0, long_window='20')
+    assert response.status_code == 200
+    assert response.get_json()['strategy'] == 'sma_crossover'
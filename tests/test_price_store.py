@@ -0,0 +1,85 @@
+# tests/test_price_store.py
+from datetime import date, timedelta
+
+import pytest
+
+from app.models import DailyBar, PriceSyncState
+from app.services import price_store
+
+
+def _bars(start, days, scale=1.0):
+    """FMP-style bars, newest first, with close = (day number + 100) * scale."""
+    return [{'date': (start + timedelta(days=i)).isoformat(), 'open': 1, 'high': 1, 'low': 1,
+             'close': (i + 100) * scale, 'volume': 1000} for i in reversed(range(days))]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Replaces get_historical_prices; set .full / .delta to what the next calls return."""
+    class Upstream:
+        full = delta = None
+        calls = []
+
+        def __call__(self, symbol, from_date=None):
+            self.calls.append(from_date)
+            return self.delta if from_date else self.full
+
+    fake = Upstream()
+    monkeypatch.setattr(price_store.fmp_client, 'get_historical_prices', fake)
+    return fake
+
+
+def _stored_closes(db, symbol='TEST'):
+    return [close for close, in db.session.execute(
+        db.select(DailyBar.close).where(DailyBar.symbol == symbol).order_by(DailyBar.date))]
+
+
+def test_delta_sync_appends_new_bars(app_db, upstream):
+    start = date(2024, 1, 1)
+    upstream.full = _bars(start, 30)
+    assert price_store.sync_symbol('TEST', force=True) == 30
+
+    upstream.delta = _bars(start, 35)[:12]  # the overlap plus 5 new days, unchanged
+    assert price_store.sync_symbol('TEST', force=False) == 0  # still within SYNC_INTERVAL
+    app_db.session.get(PriceSyncState, 'TEST').synced_at = None
+    assert price_store._sync('TEST', force=False) == 5
+    assert upstream.calls[-1] == start + timedelta(days=29 - price_store.OVERLAP_DAYS)
+    assert _stored_closes(app_db) == [float(i + 100) for i in range(35)]
+
+
+def test_adjusted_history_is_replaced(app_db, upstream):
+    start = date(2024, 1, 1)
+    upstream.full = _bars(start, 30)
+    price_store.sync_symbol('TEST', force=True)
+
+    # A 2:1 split: the overlap no longer matches, so the whole series is refetched
+    upstream.full = _bars(start, 32, scale=0.5)
+    upstream.delta = upstream.full[:10]
+    app_db.session.get(PriceSyncState, 'TEST').synced_at = None
+    price_store._sync('TEST', force=False)
+
+    assert _stored_closes(app_db) == [(i + 100) * 0.5 for i in range(32)]
+    assert app_db.session.get(PriceSyncState, 'TEST').last_bar_date == start + timedelta(days=31)
+
+
+def test_failed_resync_keeps_stored_history(app_db, upstream):
+    start = date(2024, 1, 1)
+    upstream.full = _bars(start, 30)
+    price_store.sync_symbol('TEST', force=True)
+    state = app_db.session.get(PriceSyncState, 'TEST')
+    state.synced_at = None
+    app_db.session.commit()
+
+    # The overlap shows an adjustment, but the full refetch fails upstream
+    upstream.full = None
+    upstream.delta = _bars(start, 32, scale=0.5)[:10]
+    assert price_store._sync('TEST', force=False) == 0
+
+    assert _stored_closes(app_db) == [float(i + 100) for i in range(30)]
+    state = app_db.session.get(PriceSyncState, 'TEST')
+    assert state.last_bar_date == start + timedelta(days=29)
+    assert state.synced_at is None  # not marked fresh, so the next sync retries
+
+    upstream.full = _bars(start, 32, scale=0.5)
+    price_store._sync('TEST', force=False)
+    assert _stored_closes(app_db) == [(i + 100) * 0.5 for i in range(32)]
@@ -0,0 +1,109 @@
+# tests/test_rate_limiter.py
+import threading
+import time
+
+import pytest
+
+from app.api_clients import circuit_breaker, fmp_client, rate_limiter, shared_cache
+from app.api_clients.quote_batcher import QuoteBatcher
+
+
+@pytest.fixture
+def drained(monkeypatch):
+    """In-process buckets holding one token: below the warming reserve, enough for alerts."""
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_ENABLED', False)
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_BURST', 2.0)
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_PER_MINUTE', 0.001)
+    monkeypatch.setattr(rate_limiter, '_local_buckets', {'global': (1.0, time.time())})
+
+
+def _in_lane(lane, func, *args):
+    """Starts func(*args) in `lane` on a thread; join() it and read .result."""
+    def run():
+        with rate_limiter.priority(lane):
+            thread.result = func(*args)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_local_buckets_when_shared_cache_is_off(monkeypatch):
+    def no_shared_db():
+        raise AssertionError("rate limiter opened the shared cache while it is disabled")
+
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_ENABLED', False)
+    monkeypatch.setattr(shared_cache, 'get_connection', no_shared_db)
+    monkeypatch.setattr(rate_limiter, '_local_buckets', {})
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_BURST', 2.0)
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_PER_MINUTE', 0.001)
+
+    # 'warming' keeps 40% of the bucket in reserve and never waits
+    assert rate_limiter.acquire('/quote/AAPL', lane='warming')
+    assert not rate_limiter.acquire('/quote/AAPL', lane='warming')
+    assert rate_limiter.acquire('/quote/AAPL', lane='alerts')
+    assert rate_limiter.get_rate_limit_stats()['remaining']['global']['tokens'] == pytest.approx(0.0, abs=0.01)
+
+
+def test_profile_fallback_keeps_the_caller_lane(monkeypatch):
+    lanes = {}
+
+    def fake_request(endpoint, params=None):
+        symbols = endpoint.rsplit('/', 1)[1]
+        if ',' in symbols:
+            return None
+        lanes[symbols] = rate_limiter.current_lane()
+        return [{'symbol': symbols}]
+
+    monkeypatch.setattr(fmp_client, '_fmp_request', fake_request)
+    with rate_limiter.priority('backtest'):
+        profiles = fmp_client.get_company_profiles(['LANEA', 'LANEB', 'LANEC'])
+
+    assert sorted(profiles) == ['LANEA', 'LANEB', 'LANEC']
+    assert lanes == {'LANEA': 'backtest', 'LANEB': 'backtest', 'LANEC': 'backtest'}
+
+
+def test_batch_runs_in_the_highest_lane_of_its_callers(drained):
+    def fetch_batch(symbols):
+        granted = rate_limiter.acquire(f"/quote/{','.join(symbols)}")
+        return {s: granted for s in symbols}
+
+    batcher = QuoteBatcher(fetch_batch, window_ms=100)
+    leader = _in_lane('warming', batcher.get_quotes, ['AAPL'])
+    time.sleep(0.02)
+    follower = _in_lane('alerts', batcher.get_quotes, ['MSFT'])
+    leader.join()
+    follower.join()
+
+    assert batcher.stats['batches'] == 1
+    assert follower.result == {'MSFT': True}
+
+
+def test_alerts_caller_does_not_join_a_warming_request(drained, monkeypatch):
+    real_acquire = rate_limiter.acquire
+
+    def slow_acquire(endpoint, lane=None):
+        time.sleep(0.1)
+        return real_acquire(endpoint, lane)
+
+    class Response:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return [{'symbol': 'AAPL'}]
+
+    monkeypatch.setattr(fmp_client.rate_limiter, 'acquire', slow_acquire)
+    monkeypatch.setattr(fmp_client.circuit_breaker, 'get_breaker',
+                        lambda name: circuit_breaker.CircuitBreaker('test'))
+    monkeypatch.setattr(fmp_client.http_session, 'get_with_retries', lambda *a, **kw: Response())
+
+    leader = _in_lane('warming', fmp_client._fmp_request, '/quote/AAPL')
+    time.sleep(0.02)
+    follower = _in_lane('alerts', fmp_client._fmp_request, '/quote/AAPL')
+    leader.join()
+    follower.join()
+
+    assert leader.result is None
+    assert follower.result == [{'symbol': 'AAPL'}]